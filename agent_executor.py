@@ -1,16 +1,20 @@
+import asyncio
+import json
 import logging
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, Optional
 
 from a2a.server.agent_execution import AgentExecutor, RequestContext
 from a2a.server.events import EventQueue
 from a2a.server.tasks import TaskUpdater
 from a2a.types import (
     InternalError,
-    InvalidParamsError,
     Part,
-    Task,
+    TaskNotCancelableError,
     TaskState,
     TextPart,
-    UnsupportedOperationError,
 )
 from a2a.utils import (
     new_agent_text_message,
@@ -18,21 +22,109 @@ from a2a.utils import (
 )
 from a2a.utils.errors import ServerError
 
-from agents.planner_agent import PlannerAgent
-from agents.orchestrator_agent import OrchestratorAgent
+from agents.planner_agent import PlannerAgent, parse_plan
+from agents.orchestrator_agent import TERMINAL_TASK_STATES, OrchestratorAgent
 from agents.tool_agent import ToolAgent
-from agents.reflector_agent import ReflectorAgent
+from agents.reflector_agent import ReflectorAgent, parse_tool_results
+from utils.artifact_codec import decode_parts, encode_artifact
+from utils.logging_config import payload
+from utils.metrics import REGISTRY
+from utils.tracing import get_tracer, start_span
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+tracer = get_tracer(__name__)
+
+reflector_ttft = REGISTRY.histogram(
+    'reflector_time_to_first_token_seconds',
+    'Time from receiving a Reflector request to streaming the first summary token.',
+)
+
+# How long cancel() waits for the cancelled work (and its child cancellations) to unwind.
+CANCEL_GRACE_SECONDS = 5.0
+
+
+def _message_metadata(context: RequestContext) -> dict:
+    """Metadata of the incoming A2A message; carries the caller's trace context."""
+    message = context.message
+    return message.metadata if message and message.metadata else {}
+
+
+def _accepted_output_modes(context: RequestContext) -> Optional[list[str]]:
+    """Output modes the caller accepts; artifacts are sent as text when it names none."""
+    configuration = context.configuration
+    return configuration.acceptedOutputModes if configuration else None
+
+
+def _find_extracted_artifact(context: RequestContext, name: str) -> Optional[str]:
+    """
+    Text of the last artifact called name that the caller attached to the request.
+    Artifacts may arrive as a2a objects or as plain dicts; only their first part is read.
+    """
+    text = None
+    for artifact in getattr(context, 'artifacts', None) or []:
+        is_dict = isinstance(artifact, dict)
+        if (artifact.get('name') if is_dict else getattr(artifact, 'name', None)) != name:
+            continue
+        parts = artifact.get('parts') if is_dict else getattr(artifact, 'parts', None)
+        if not parts:
+            continue
+        part = parts[0]
+        root = part.get('root') if isinstance(part, dict) else getattr(part, 'root', None)
+        if root is not None and hasattr(root, 'text'):
+            text = root.text
+        elif isinstance(part, dict):
+            text = part.get('text') or (root.get('text') if isinstance(root, dict) else None)
+    return text
 
 
-class PlannerAgentExecutor(AgentExecutor):
+class CancellableAgentExecutor(AgentExecutor):
+    """
+    CancellableAgentExecutor: Tracks the asyncio task running each A2A task so that
+    cancel() can stop its in-flight MCP calls, sub-agent requests and LLM streams.
+    """
+    def __init__(self):
+        self._running: dict[str, asyncio.Task] = {}
+
+    @contextmanager
+    def track(self, task_id: str) -> Iterator[None]:
+        current = asyncio.current_task()
+        self._running[task_id] = current
+        try:
+            yield
+        except asyncio.CancelledError:
+            logger.info('[%s] Task %s cancelled', type(self).__name__, task_id)
+            raise
+        finally:
+            if self._running.get(task_id) is current:
+                del self._running[task_id]
+
+    async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
+        current_task = context.current_task
+        task_id = context.task_id or (current_task.id if current_task else None)
+        running = self._running.get(task_id) if task_id else None
+        if running is None:
+            # Not started yet (e.g. still waiting for admission): reporting it canceled lets the
+            # request handler cancel the producer, so the work never runs.
+            if not task_id or (current_task and current_task.status.state in TERMINAL_TASK_STATES):
+                raise ServerError(error=TaskNotCancelableError())
+        elif running.done():
+            raise ServerError(error=TaskNotCancelableError())
+        else:
+            running.cancel()
+            # Let the cancelled work unwind so child tasks are cancelled before we report back.
+            await asyncio.wait([running], timeout=CANCEL_GRACE_SECONDS)
+        context_id = context.context_id or (current_task.contextId if current_task else None)
+        updater = TaskUpdater(event_queue, task_id, context_id)
+        await updater.update_status(TaskState.canceled, final=True)
+
+
+class PlannerAgentExecutor(CancellableAgentExecutor):
     """
     PlannerAgentExecutor: Decomposes user input into a list of tasks (a2a-compliant).
     Now uses streaming from PlannerAgent.
     """
     def __init__(self, agent=None):
+        super().__init__()
         self.agent = agent or PlannerAgent()
 
     async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
@@ -42,31 +134,39 @@ class PlannerAgentExecutor(AgentExecutor):
             task = new_task(context.message)  # type: ignore
             await event_queue.enqueue_event(task)
         updater = TaskUpdater(event_queue, task.id, task.contextId)
-        try:
-            async for item in self.agent.stream(user_input):
-                await updater.update_status(
-                    TaskState.working if item['status'] == 'planning' else TaskState.completed,
-                    new_agent_text_message(item['message'], task.contextId, task.id),
-                )
-                if item['status'] == 'completed':
-                    await updater.add_artifact([
-                        Part(root=TextPart(text=str(item['message'])))
-                    ], name="planned_tasks")
-                    await updater.complete()
-                    break
-        except Exception as e:
-            logger.error(f"[PlannerAgentExecutor] Error: {e}")
-            raise ServerError(error=InternalError()) from e
+        with self.track(task.id), start_span(
+            tracer, 'PlannerAgentExecutor.execute', parent=_message_metadata(context),
+            attributes={'a2a.task_id': task.id, 'a2a.context_id': task.contextId},
+        ):
+            try:
+                # Follow-up turns in the same context revise the conversation's previous plan.
+                async for item in self.agent.stream(user_input, context_id=task.contextId):
+                    await updater.update_status(
+                        TaskState.working if item['status'] == 'planning' else TaskState.completed,
+                        new_agent_text_message(item['message'], task.contextId, task.id),
+                    )
+                    if item['status'] == 'completed':
+                        await updater.add_artifact([
+                            Part(root=TextPart(text=str(item['message'])))
+                        ], name="planned_tasks")
+                        if item.get('diff') is not None:
+                            await updater.add_artifact([
+                                Part(root=TextPart(text=json.dumps(item['diff'].to_dict())))
+                            ], name="plan_diff")
+                        await updater.complete()
+                        break
+            except Exception as e:
+                logger.error(f"[PlannerAgentExecutor] Error: {e}")
+                raise ServerError(error=InternalError()) from e
 
-    async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
-        raise ServerError(error=UnsupportedOperationError())
 
 
-class OrchestratorAgentExecutor(AgentExecutor):
+class OrchestratorAgentExecutor(CancellableAgentExecutor):
     """
     OrchestratorAgentExecutor: Orchestrates task execution and dependency resolution (a2a-compliant).
     """
     def __init__(self, agent=None):
+        super().__init__()
         self.agent = agent or OrchestratorAgent()
 
     async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
@@ -75,60 +175,67 @@ class OrchestratorAgentExecutor(AgentExecutor):
             task = new_task(context.message)  # type: ignore
             await event_queue.enqueue_event(task)
         updater = TaskUpdater(event_queue, task.id, task.contextId)
-        try:
-            # Debug print
-            print("DEBUG: context.artifacts =", getattr(context, 'artifacts', None))
-            print("DEBUG: context.get_user_input() =", context.get_user_input())
-            # Robust artifact extraction: handle both dict and object
-            planned_tasks = None
-            for artifact in getattr(context, 'artifacts', []):
-                name = getattr(artifact, 'name', None) or (artifact.get('name') if isinstance(artifact, dict) else None)
-                if name == 'planned_tasks':
-                    parts = getattr(artifact, 'parts', None) or (artifact.get('parts') if isinstance(artifact, dict) else None)
-                    if parts:
-                        part = parts[0]
-                        # Try object, then dict
-                        text = getattr(part, 'root', None)
-                        if text and hasattr(text, 'text'):
-                            planned_tasks = text.text
-                        else:
-                            planned_tasks = part.get('text') or (part.get('root', {}).get('text') if isinstance(part.get('root', {}), dict) else None)
-            if not planned_tasks:
-                # Fallback to user input
-                planned_tasks = context.get_user_input()
-                print("DEBUG: Fallback to user input for planned_tasks:", planned_tasks)
-            if not planned_tasks:
-                raise ValueError('No planned_tasks artifact found in context or user input.')
-            # Remove markdown code block if present
-            import re, json
-            planned_tasks_clean = re.sub(r'```json|```', '', planned_tasks, flags=re.IGNORECASE).strip()
-            print("DEBUG: planned_tasks_clean =", planned_tasks_clean)
-            planned_tasks_list = json.loads(planned_tasks_clean)
-            # Stream orchestration progress
-            async for item in self.agent.stream(planned_tasks_list):
-                await updater.update_status(
-                    TaskState.working if item['status'] == 'orchestrating' else TaskState.completed,
-                    new_agent_text_message(item['message'], task.contextId, task.id),
-                )
-                if item['status'] == 'completed':
+        with self.track(task.id), start_span(
+            tracer, 'OrchestratorAgentExecutor.execute', parent=_message_metadata(context),
+            attributes={'a2a.task_id': task.id, 'a2a.context_id': task.contextId},
+        ):
+            try:
+                if _message_metadata(context).get('prefetch'):
+                    # Speculative mode: the message is the raw user request, not a plan.
+                    await updater.update_status(
+                        TaskState.working,
+                        new_agent_text_message('Prefetching likely tool results...', task.contextId, task.id),
+                    )
+                    prefetched = await self.agent.prefetch(context.get_user_input())
                     await updater.add_artifact([
-                        Part(root=TextPart(text=str(item['results'])))
-                    ], name="orchestrated_results")
+                        Part(root=TextPart(text=json.dumps(prefetched)))
+                    ], name="prefetched_tasks")
                     await updater.complete()
-                    break
-        except Exception as e:
-            logger.error(f"[OrchestratorAgentExecutor] Error: {e}")
-            raise ServerError(error=InternalError()) from e
+                    return
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug('context.artifacts=%s user_input=%s',
+                                 payload(getattr(context, 'artifacts', None)), payload(context.get_user_input()))
+                planned_tasks = _find_extracted_artifact(context, 'planned_tasks')
+                if not planned_tasks:
+                    # Fallback to user input
+                    planned_tasks = context.get_user_input()
+                    logger.debug('Fallback to user input for planned_tasks: %s', payload(planned_tasks))
+                if not planned_tasks:
+                    raise ValueError('No planned_tasks artifact found in context or user input.')
+                planned_tasks_list = parse_plan(planned_tasks)
+                # Pipelined callers summarize each result as soon as it is sent (see test_client.py).
+                stream_results = bool(_message_metadata(context).get('stream_results'))
+                # Stream orchestration progress
+                # Tasks a follow-up turn did not change reuse the context's earlier results.
+                async for item in self.agent.stream(planned_tasks_list, context_id=task.contextId):
+                    await updater.update_status(
+                        TaskState.working if item['status'] == 'orchestrating' else TaskState.completed,
+                        new_agent_text_message(item['message'], task.contextId, task.id),
+                    )
+                    if stream_results and item.get('result') is not None:
+                        await updater.add_artifact(
+                            encode_artifact('orchestrated_result', item['result'], _accepted_output_modes(context)),
+                            name="orchestrated_result",
+                        )
+                    if item['status'] == 'completed':
+                        await updater.add_artifact(
+                            encode_artifact('orchestrated_results', item['results'], _accepted_output_modes(context)),
+                            name="orchestrated_results",
+                        )
+                        await updater.complete()
+                        break
+            except Exception as e:
+                logger.error(f"[OrchestratorAgentExecutor] Error: {e}")
+                raise ServerError(error=InternalError()) from e
 
-    async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
-        raise ServerError(error=UnsupportedOperationError())
 
 
-class ToolAgentExecutor(AgentExecutor):
+class ToolAgentExecutor(CancellableAgentExecutor):
     """
     ToolAgentExecutor: Executes a single tool task via MCP (a2a-compliant).
     """
     def __init__(self, agent=None):
+        super().__init__()
         self.agent = agent or ToolAgent()
 
     async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
@@ -137,107 +244,129 @@ class ToolAgentExecutor(AgentExecutor):
             task = new_task(context.message)  # type: ignore
             await event_queue.enqueue_event(task)
         updater = TaskUpdater(event_queue, task.id, task.contextId)
-        try:
-            # Robust artifact extraction: handle both dict and object
-            import json
-            tool_task = None
-            for artifact in getattr(context, 'artifacts', []):
-                name = getattr(artifact, 'name', None) or (artifact.get('name') if isinstance(artifact, dict) else None)
-                if name == 'tool_task':
-                    parts = getattr(artifact, 'parts', None) or (artifact.get('parts') if isinstance(artifact, dict) else None)
-                    if parts:
-                        part = parts[0]
-                        text = getattr(part, 'root', None)
-                        if text and hasattr(text, 'text'):
-                            tool_task = text.text
-                        else:
-                            tool_task = part.get('text') or (part.get('root', {}).get('text') if isinstance(part.get('root', {}), dict) else None)
-            if not tool_task:
-                # Fallback to user input
-                tool_task = context.get_user_input()
-            if not tool_task:
-                raise ValueError('No tool_task artifact found in context or user input.')
-            # Parse tool_task if it's a JSON string
-            if isinstance(tool_task, str):
-                try:
-                    tool_task_dict = json.loads(tool_task)
-                except Exception:
-                    tool_task_dict = tool_task  # fallback to string if not JSON
-            else:
-                tool_task_dict = tool_task
-            # Stream tool execution progress
-            async for item in self.agent.stream(tool_task_dict):
-                await updater.update_status(
-                    TaskState.working if item.get('status', '') != 'completed' else TaskState.completed,
-                    new_agent_text_message(item.get('message', ''), task.contextId, task.id),
-                )
-                if item.get('status', '') == 'completed':
-                    await updater.add_artifact([
-                        Part(root=TextPart(text=str(item.get('result', item.get('message', '')))))
-                    ], name="tool_result")
-                    await updater.complete()
-                    break
-        except Exception as e:
-            logger.error(f"[ToolAgentExecutor] Error: {e}")
-            raise ServerError(error=InternalError()) from e
+        with self.track(task.id), start_span(
+            tracer, 'ToolAgentExecutor.execute', parent=_message_metadata(context),
+            attributes={'a2a.task_id': task.id, 'a2a.context_id': task.contextId},
+        ):
+            try:
+                tool_task = _find_extracted_artifact(context, 'tool_task')
+                if not tool_task:
+                    # Fallback to user input
+                    tool_task = context.get_user_input()
+                if not tool_task:
+                    raise ValueError('No tool_task artifact found in context or user input.')
+                # Parse tool_task if it's a JSON string
+                if isinstance(tool_task, str):
+                    try:
+                        tool_task_dict = json.loads(tool_task)
+                    except Exception:
+                        tool_task_dict = tool_task  # fallback to string if not JSON
+                else:
+                    tool_task_dict = tool_task
+                # Stream tool execution progress
+                async for item in self.agent.stream(tool_task_dict):
+                    await updater.update_status(
+                        TaskState.working if item.get('status', '') != 'completed' else TaskState.completed,
+                        new_agent_text_message(item.get('message', ''), task.contextId, task.id),
+                    )
+                    if item.get('status', '') == 'completed':
+                        await updater.add_artifact(
+                            encode_artifact('tool_result', item.get('result', item.get('message', '')),
+                                            _accepted_output_modes(context)),
+                            name="tool_result",
+                        )
+                        await updater.complete()
+                        break
+            except Exception as e:
+                logger.error(f"[ToolAgentExecutor] Error: {e}")
+                raise ServerError(error=InternalError()) from e
 
-    async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
-        raise ServerError(error=UnsupportedOperationError())
 
 
-class ReflectorAgentExecutor(AgentExecutor):
+class ReflectorAgentExecutor(CancellableAgentExecutor):
     """
     ReflectorAgentExecutor: Summarizes all tool results into a final answer (a2a-compliant).
+    Pipelined callers instead send each result as it arrives (metadata reflect='section') and
+    then the section summaries to merge (reflect='merge').
     """
     def __init__(self, agent=None):
+        super().__init__()
         self.agent = agent or ReflectorAgent()
 
     async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
+        started = time.monotonic()
         task = context.current_task
         if not task:
             task = new_task(context.message)  # type: ignore
             await event_queue.enqueue_event(task)
         updater = TaskUpdater(event_queue, task.id, task.contextId)
-        try:
-            # Robust artifact extraction: handle both dict and object
-            orchestrated_results = None
-            for artifact in getattr(context, 'artifacts', []):
-                name = getattr(artifact, 'name', None) or (artifact.get('name') if isinstance(artifact, dict) else None)
-                if name == 'orchestrated_results':
-                    parts = getattr(artifact, 'parts', None) or (artifact.get('parts') if isinstance(artifact, dict) else None)
-                    if parts:
-                        part = parts[0]
-                        text = getattr(part, 'root', None)
-                        if text and hasattr(text, 'text'):
-                            orchestrated_results = text.text
-                        else:
-                            orchestrated_results = part.get('text') or (part.get('root', {}).get('text') if isinstance(part.get('root', {}), dict) else None)
+        with self.track(task.id), start_span(
+            tracer, 'ReflectorAgentExecutor.execute', parent=_message_metadata(context),
+            attributes={'a2a.task_id': task.id, 'a2a.context_id': task.contextId},
+        ):
+            try:
+                mode = _message_metadata(context).get('reflect')
+                if mode == 'section':
+                    # One result of a pipelined run, summarized while the Orchestrator works on the rest.
+                    result = decode_parts(context.message.parts if context.message else None, 'orchestrated_result')
+                    if result is None:
+                        results = parse_tool_results(context.get_user_input())
+                        result = results[0] if len(results) == 1 else results
+                    section = await self.agent.summarize_section(result)
+                    await updater.add_artifact([
+                        Part(root=TextPart(text=section))
+                    ], name="section_summary")
+                    await updater.complete()
+                    return
+                if mode == 'merge':
+                    # Section summaries as text; the raw results they cover as an encoded part.
+                    sections = parse_tool_results(context.get_user_input())
+                    results = decode_parts(context.message.parts if context.message else None, 'orchestrated_results')
+                    stream = self.agent.merge(sections, results, context_id=task.contextId)
+                else:
+                    stream = self.agent.stream(self._results(context), context_id=task.contextId)
+                # Stream reflection progress; 'streaming' items carry individual model tokens
+                # that are appended to the final_answer artifact as they arrive.
+                answer_artifact_id = str(uuid.uuid4())
+                streamed = False
+                async for item in stream:
+                    if item.get('status', '') == 'streaming':
+                        if not streamed:
+                            reflector_ttft.observe(time.monotonic() - started)
+                        await updater.add_artifact([
+                            Part(root=TextPart(text=item['message']))
+                        ], artifact_id=answer_artifact_id, name="final_answer", append=streamed)
+                        streamed = True
+                        continue
+                    await updater.update_status(
+                        TaskState.working if item.get('status', '') != 'completed' else TaskState.completed,
+                        new_agent_text_message(item.get('message', ''), task.contextId, task.id),
+                    )
+                    if item.get('status', '') == 'completed':
+                        # The last chunk replaces the streamed pieces with the complete answer,
+                        # so non-streaming clients still see a single-part artifact.
+                        await updater.add_artifact([
+                            Part(root=TextPart(text=str(item.get('final_answer', item.get('message', '')))))
+                        ], artifact_id=answer_artifact_id, name="final_answer", last_chunk=True)
+                        await updater.complete()
+                        break
+            except Exception as e:
+                logger.error(f"[ReflectorAgentExecutor] Error: {e}")
+                raise ServerError(error=InternalError()) from e
+
+    @staticmethod
+    def _results(context: RequestContext) -> list:
+        """The orchestrated results of a request: encoded parts, an artifact or the message text."""
+        # Callers that read our agent card send the results encoded (see utils/artifact_codec.py).
+        results_list = decode_parts(context.message.parts if context.message else None, 'orchestrated_results')
+        if results_list is None:
+            orchestrated_results = _find_extracted_artifact(context, 'orchestrated_results')
             if not orchestrated_results:
                 # Fallback to user input
                 orchestrated_results = context.get_user_input()
             if not orchestrated_results:
                 raise ValueError('No orchestrated_results artifact found in context or user input.')
-            # If orchestrated_results is a JSON string, parse it
-            import json
-            try:
-                results_list = json.loads(orchestrated_results)
-            except Exception:
-                results_list = orchestrated_results
-            # Stream reflection progress (assuming agent has a stream method)
-            async for item in self.agent.stream(results_list):
-                await updater.update_status(
-                    TaskState.working if item.get('status', '') != 'completed' else TaskState.completed,
-                    new_agent_text_message(item.get('message', ''), task.contextId, task.id),
-                )
-                if item.get('status', '') == 'completed':
-                    await updater.add_artifact([
-                        Part(root=TextPart(text=str(item.get('final_answer', item.get('message', '')))))
-                    ], name="final_answer")
-                    await updater.complete()
-                    break
-        except Exception as e:
-            logger.error(f"[ReflectorAgentExecutor] Error: {e}")
-            raise ServerError(error=InternalError()) from e
-
-    async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
-        raise ServerError(error=UnsupportedOperationError())
+            results_list = parse_tool_results(orchestrated_results)
+        elif not isinstance(results_list, list):
+            results_list = [results_list]
+        return results_list
@@ -0,0 +1,67 @@
+"""
+Cheap, rule-based extraction of trip entities from free text.
+
+Used to guess the tool calls of a plan before the Planner's LLM has produced it, and
+to fill in tool parameters when a planned task only describes them in words.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+# A place name: one or more capitalized words ("Rome", "New York", "São Paulo"). Words end in a
+# letter or digit, so sentence punctuation ("to Rome.") is not part of the name.
+_PLACE = r"[A-Z](?:[\w'.-]*\w)?(?:\s+[A-Z](?:[\w'.-]*\w)?)*"
+# Keywords match in any case ("From Paris to Rome"); place names must still be capitalized.
+_FROM_TO = re.compile(rf'\b(?i:from)\s+({_PLACE})\s+(?i:to)\s+({_PLACE})')
+_TO = re.compile(rf'\b(?i:to|towards)\s+({_PLACE})')
+_IN = re.compile(rf'\b(?i:in|at|around|visit|visiting|explore|near)\s+({_PLACE})')
+_SIGHTSEEING = re.compile(r'sightsee|sights|attraction|things to do|places to|visit|explore|tour', re.IGNORECASE)
+_BUS = re.compile(r'\bbus(es)?\b|coach', re.IGNORECASE)
+
+
+@dataclass
+class TripEntities:
+    source: Optional[str] = None
+    destination: Optional[str] = None
+    cities: list[str] = field(default_factory=list)
+
+
+def extract_trip(text: str) -> TripEntities:
+    """Source, destination and every mentioned city, in order of appearance."""
+    entities = TripEntities()
+    if not text:
+        return entities
+    match = _FROM_TO.search(text)
+    if match:
+        entities.source, entities.destination = match.group(1), match.group(2)
+    else:
+        match = _TO.search(text)
+        if match:
+            entities.destination = match.group(1)
+    mentions = [(m.start(1), m.group(1)) for pattern in (_FROM_TO, _TO, _IN) for m in pattern.finditer(text)]
+    mentions += [(m.start(2), m.group(2)) for m in _FROM_TO.finditer(text)]
+    for _, city in sorted(mentions):
+        if city not in entities.cities:
+            entities.cities.append(city)
+    return entities
+
+
+def predict_tasks(user_input: str) -> list[dict]:
+    """
+    Planner-shaped tasks ({task, mcp_server, depends, params}) that a plan for this request
+    is likely to contain: transport between the two cities and sightseeing at the destination.
+    """
+    trip = extract_trip(user_input)
+    tasks = []
+    if trip.source and trip.destination:
+        route = {'source': trip.source, 'destination': trip.destination}
+        tasks.append({'task': f'Find flights from {trip.source} to {trip.destination}',
+                      'mcp_server': 'TransportServer', 'depends': [], 'params': route})
+        if _BUS.search(user_input):
+            tasks.append({'task': f'Find buses from {trip.source} to {trip.destination}',
+                          'mcp_server': 'TransportServer', 'depends': [], 'params': route})
+    city = trip.destination or (trip.cities[0] if trip.cities else None)
+    if city and (_SIGHTSEEING.search(user_input) or trip.destination):
+        tasks.append({'task': f'Find sightseeing spots in {city}',
+                      'mcp_server': 'SightseeingServer', 'depends': [], 'params': {'query': city}})
+    return tasks
@@ -1,18 +1,45 @@
-import os
+import asyncio
+import logging
 import json
 from collections.abc import AsyncIterable
-from typing import Any, Literal
+from typing import Any, Literal, Optional
 from uuid import uuid4
 import httpx
-from langchain_core.messages import AIMessage
 from pydantic import BaseModel
-from a2a.client import A2ACardResolver, A2AClient
+from a2a.client import A2AClient
 from a2a.types import (
+    CancelTaskRequest,
+    JSONRPCErrorResponse,
     MessageSendParams,
-    SendMessageRequest,
     SendStreamingMessageRequest,
+    Task,
+    TaskArtifactUpdateEvent,
+    TaskIdParams,
+    TaskState,
+    TaskStatusUpdateEvent,
 )
 
+from agents.entities import predict_tasks
+from agents.plan_diff import diff_plans, rerun_keys, task_key
+from utils.artifact_codec import JSON, TEXT
+from utils.cache import conversation_cache
+from utils.registry import get_resolver
+from utils.tracing import get_tracer, start_span, trace_metadata
+
+logger = logging.getLogger(__name__)
+tracer = get_tracer(__name__)
+
+# Admission priority of speculative work; real requests default to 0 and are admitted first.
+PREFETCH_PRIORITY = -1
+
+# Tool results are embedded in orchestrated_results as-is, so ask for them as structured
+# JSON (a DataPart) rather than a compressed file the Reflector could not read.
+TOOL_RESULT_MODES = [JSON, TEXT]
+
+TERMINAL_TASK_STATES = {
+    TaskState.completed, TaskState.canceled, TaskState.failed, TaskState.rejected,
+}
+
 class ResponseFormat(BaseModel):
     status: Literal['orchestrating', 'completed', 'error'] = 'orchestrating'
     message: str
@@ -23,46 +50,56 @@ class OrchestratorAgent:
     OrchestratorAgent: Orchestrates task execution and dependency resolution.
     Acts as both a2a server and client to ToolAgent(s).
     """
+    TOOL_AGENT_SERVICE = 'Tool Agent'
+
     def __init__(self, tool_agent_base_url: str = "http://localhost:11002"):
-        self.tool_agent_base_url = tool_agent_base_url  # Base URL for ToolAgent's a2a endpoint
-        self.tool_agent_card_path = '/.well-known/agent.json'
+        # Used only when no Tool Agent is registered in the service registry.
+        self.tool_agent_base_url = tool_agent_base_url
+        self.resolver = get_resolver()
+        # Each conversation's last plan and its results by task_key, reused by follow-up turns.
+        self.conversations = conversation_cache('orchestrator_conversations')
 
-    async def stream(self, planned_tasks: list, context_id: str = 'orchestrator') -> AsyncIterable[dict[str, Any]]:
+    async def stream(self, planned_tasks: list, context_id: Optional[str] = None) -> AsyncIterable[dict[str, Any]]:
+        previous = self.conversations.get(context_id) if context_id else None
+        rerun, reusable = None, {}
+        if previous:
+            diff = diff_plans(previous['plan'], planned_tasks)
+            rerun, reusable = rerun_keys(diff, planned_tasks), previous['results']
         # Streaming progress message
         yield {
             'status': 'orchestrating',
-            'message': 'Orchestrating your travel tasks...'
+            'message': f'Updating your travel tasks ({diff.summary()})...' if previous else 'Orchestrating your travel tasks...'
         }
         results = []
+        results_by_key = {}
         async with httpx.AsyncClient() as httpx_client:
-            # Resolve ToolAgent's card
-            resolver = A2ACardResolver(
-                httpx_client=httpx_client,
-                base_url=self.tool_agent_base_url,
-            )
-            tool_agent_card = await resolver.get_agent_card()
-            client = A2AClient(httpx_client=httpx_client, agent_card=tool_agent_card)
-            for task in planned_tasks:
-                try:
-                    send_message_payload = {
-                        'message': {
-                            'role': 'user',
-                            'parts': [
-                                {'kind': 'text', 'text': json.dumps(task)}
-                            ],
-                            'messageId': uuid4().hex,
-                        },
+            for index, task in enumerate(planned_tasks):
+                key = task_key(task)
+                if rerun is not None and key not in rerun and key in reusable:
+                    # Unchanged by the follow-up and not depending on anything that changed.
+                    results.append(reusable[key])
+                    results_by_key[key] = reusable[key]
+                    yield {
+                        'status': 'orchestrating',
+                        'message': f"Reused result of task: {task['task']}",
+                        'results': results.copy(),
+                        'result': {'index': index, 'task': task['task'], 'result': reusable[key]}
                     }
-                    request = SendMessageRequest(
-                        id=str(uuid4()), params=MessageSendParams(**send_message_payload)
-                    )
-                    response = await client.send_message(request)
-                    tool_result = response.model_dump(mode='json', exclude_none=True)
+                    continue
+                try:
+                    with start_span(tracer, 'OrchestratorAgent.tool_task', attributes={'travel.task': str(task.get('task'))}):
+                        # Each task goes to the Tool Agent replica with the fewest tasks in flight.
+                        async with self.resolver.lease(self.TOOL_AGENT_SERVICE, self.tool_agent_base_url) as url:
+                            client = A2AClient(httpx_client=httpx_client, url=url)
+                            tool_result = await self._send_tool_task(client, task)
                     results.append(tool_result)
+                    results_by_key[key] = tool_result
                     yield {
                         'status': 'orchestrating',
                         'message': f"Completed task: {task['task']}",
-                        'results': results.copy()
+                        'results': results.copy(),
+                        # The finished result alone, for callers that summarize results as they arrive.
+                        'result': {'index': index, 'task': task['task'], 'result': tool_result}
                     }
                 except Exception as e:
                     yield {
@@ -71,8 +108,84 @@ class OrchestratorAgent:
                         'results': results.copy()
                     }
                     return
+        if context_id:
+            self.conversations.set(context_id, {'plan': planned_tasks, 'results': results_by_key})
         yield {
             'status': 'completed',
             'message': 'All tasks completed.',
             'results': results
         }
+
+    async def prefetch(self, user_input: str) -> list[dict]:
+        """
+        Speculatively run the tool tasks a plan for user_input is likely to contain, so the
+        Tool Agent's result cache is warm (or the calls are already in flight) by the time
+        the real plan arrives. Sent at low priority; failures are only logged.
+        """
+        tasks = predict_tasks(user_input)
+        if not tasks:
+            return []
+        async with httpx.AsyncClient() as httpx_client:
+            async def run(task: dict) -> None:
+                try:
+                    async with self.resolver.lease(self.TOOL_AGENT_SERVICE, self.tool_agent_base_url) as url:
+                        client = A2AClient(httpx_client=httpx_client, url=url)
+                        await self._send_tool_task(client, task, metadata={'priority': PREFETCH_PRIORITY})
+                except Exception as e:
+                    logger.info('Prefetch of %r failed: %s', task['task'], e)
+
+            with start_span(tracer, 'OrchestratorAgent.prefetch', attributes={'prefetch.tasks': len(tasks)}):
+                await asyncio.gather(*(run(task) for task in tasks))
+        return tasks
+
+    async def _send_tool_task(self, client: A2AClient, task: dict, metadata: Optional[dict] = None) -> dict:
+        """
+        Send one task to the ToolAgent and wait for its final state.
+        Streaming is used so the ToolAgent's task id is known while the call is in flight;
+        if this coroutine is cancelled, the ToolAgent task is cancelled too.
+        """
+        send_message_payload = {
+            'message': {
+                'role': 'user',
+                'parts': [
+                    {'kind': 'text', 'text': json.dumps(task)}
+                ],
+                'messageId': uuid4().hex,
+                'metadata': trace_metadata(metadata),
+            },
+            'configuration': {'acceptedOutputModes': TOOL_RESULT_MODES},
+        }
+        request = SendStreamingMessageRequest(
+            id=str(uuid4()), params=MessageSendParams(**send_message_payload)
+        )
+        tool_task = None
+        try:
+            async for response in client.send_message_streaming(request):
+                if isinstance(response.root, JSONRPCErrorResponse):
+                    raise RuntimeError(response.root.error.message)
+                event = response.root.result
+                if isinstance(event, Task):
+                    tool_task = event
+                elif tool_task is None:
+                    continue
+                elif isinstance(event, TaskStatusUpdateEvent):
+                    tool_task.status = event.status
+                elif isinstance(event, TaskArtifactUpdateEvent):
+                    tool_task.artifacts = (tool_task.artifacts or []) + [event.artifact]
+        except asyncio.CancelledError:
+            if tool_task is not None and tool_task.status.state not in TERMINAL_TASK_STATES:
+                await asyncio.shield(self._cancel_tool_task(client, tool_task.id))
+            raise
+        if tool_task is None:
+            raise RuntimeError('ToolAgent returned no task.')
+        # Same shape as a non-streaming SendMessageResponse.
+        return {'id': request.id, 'jsonrpc': '2.0', 'result': tool_task.model_dump(mode='json', exclude_none=True)}
+
+    async def _cancel_tool_task(self, client: A2AClient, task_id: str) -> None:
+        try:
+            await asyncio.wait_for(
+                client.cancel_task(CancelTaskRequest(id=str(uuid4()), params=TaskIdParams(id=task_id))),
+                timeout=5.0,
+            )
+        except Exception as e:
+            logger.warning('Could not cancel ToolAgent task %s: %s', task_id, e)
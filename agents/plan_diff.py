@@ -0,0 +1,82 @@
+"""
+Differences between two plans of the same conversation.
+
+A follow-up turn ("actually, go by bus instead") revises the previous plan instead of
+starting over. The diff tells the Orchestrator which tasks have to run again and which
+earlier results still hold.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+
+
+def task_key(task: dict) -> str:
+    """Identity of a task across plans: its description, ignoring case and whitespace."""
+    return re.sub(r'\s+', ' ', str(task.get('task', ''))).strip().lower()
+
+
+def _content(task: dict) -> str:
+    return json.dumps(task, sort_keys=True, default=str)
+
+
+@dataclass
+class PlanDiff:
+    added: list[dict] = field(default_factory=list)
+    changed: list[dict] = field(default_factory=list)
+    removed: list[dict] = field(default_factory=list)
+    unchanged: list[dict] = field(default_factory=list)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+    def summary(self) -> str:
+        return ', '.join(f'{len(tasks)} {name}' for name, tasks in (
+            ('added', self.added), ('changed', self.changed), ('removed', self.removed), ('unchanged', self.unchanged),
+        ))
+
+    def to_dict(self) -> dict:
+        return {'added': self.added, 'changed': self.changed, 'removed': self.removed, 'unchanged': self.unchanged}
+
+
+def diff_plans(old: list[dict], new: list[dict]) -> PlanDiff:
+    """Tasks of new that are added, changed (same description, other server/params/depends) or unchanged; tasks of old that are gone."""
+    previous = {task_key(task): task for task in old}
+    diff = PlanDiff()
+    for task in new:
+        before = previous.pop(task_key(task), None)
+        if before is None:
+            diff.added.append(task)
+        elif _content(before) != _content(task):
+            diff.changed.append(task)
+        else:
+            diff.unchanged.append(task)
+    diff.removed = list(previous.values())
+    return diff
+
+
+def _dependency_keys(task: dict, plan: list[dict]) -> set[str]:
+    """Keys of the tasks task depends on; dependencies name a task or give its index in the plan."""
+    keys = set()
+    for dependency in task.get('depends') or []:
+        if isinstance(dependency, int) and 0 <= dependency < len(plan):
+            keys.add(task_key(plan[dependency]))
+        elif isinstance(dependency, str):
+            keys.add(task_key({'task': dependency}))
+    return keys
+
+
+def rerun_keys(diff: PlanDiff, plan: list[dict]) -> set[str]:
+    """Keys of the plan's tasks that must run again: added and changed tasks, and everything depending on them or on a removed task."""
+    rerun = {task_key(task) for task in diff.added + diff.changed}
+    stale = rerun | {task_key(task) for task in diff.removed}
+    grew = True
+    while grew:
+        grew = False
+        for task in plan:
+            key = task_key(task)
+            if key not in rerun and _dependency_keys(task, plan) & stale:
+                rerun.add(key)
+                stale.add(key)
+                grew = True
+    return rerun
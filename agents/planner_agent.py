@@ -1,15 +1,24 @@
+import json
 import os
 from collections.abc import AsyncIterable
-from typing import Any, Literal
+from typing import Any, Literal, Optional
 from langchain_core.messages import AIMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import create_react_agent
 from pydantic import BaseModel
 import re
 
-memory = MemorySaver()
+from agents.plan_diff import diff_plans
+from utils.batching import batch_from_env
+from utils.cache import conversation_cache
+from utils.tracing import get_tracer, start_span
+
+tracer = get_tracer(__name__)
+
+def parse_plan(text: str) -> list:
+    """The Planner's task list; a surrounding markdown code fence is ignored."""
+    return json.loads(re.sub(r'```json|```', '', text, flags=re.IGNORECASE).strip())
 
 class ResponseFormat(BaseModel):
     """Respond to the user in this format."""
@@ -36,10 +45,19 @@ class PlannerAgent:
         'Set response status to error if there is an error while processing the request.'
         'Set response status to completed if the plan is complete.'
     )
+    REPLAN_INSTRUCTION = (
+        'This is a follow-up in a conversation whose current plan is:\n{plan}\n'
+        'Revise that plan for the follow-up below and output the complete revised plan. Copy every task '
+        'that is still needed exactly as it is (same task, mcp_server and depends); only add, change or '
+        'remove the tasks the follow-up affects.\n'
+        'Follow-up: {request}'
+    )
 
-    def __init__(self):
+    def __init__(self, llm=None):
         model_source = os.getenv('model_source', 'google')
-        if model_source == 'google':
+        if llm is not None:
+            self.model = llm
+        elif model_source == 'google':
             self.model = ChatGoogleGenerativeAI(model='gemini-2.0-flash')
         else:
             self.model = ChatOpenAI(
@@ -48,33 +66,58 @@ class PlannerAgent:
                 openai_api_base=os.getenv('TOOL_LLM_URL'),
                 temperature=0,
             )
+        # LLM_BATCHING sends concurrent requests' model calls to the provider in micro-batches.
+        self.model = batch_from_env(self.model, 'planner')
         self.graph = create_react_agent(
             self.model,
             tools=[],
-            checkpointer=memory,
             prompt=self.SYSTEM_INSTRUCTION,
             response_format=(self.FORMAT_INSTRUCTION, ResponseFormat),
         )
+        # The latest plan of each conversation, revised (not replaced) by follow-up turns.
+        self.plans = conversation_cache('planner_plans')
 
-    async def stream(self, user_input: str, context_id: str = 'planner') -> AsyncIterable[dict[str, Any]]:
+    async def stream(self, user_input: str, context_id: Optional[str] = None) -> AsyncIterable[dict[str, Any]]:
+        previous = self.plans.get(context_id) if context_id else None
         # Streaming progress message
         yield {
             'status': 'planning',
-            'message': 'Planning your trip...'
+            'message': 'Revising your plan...' if previous else 'Planning your trip...'
         }
+        if previous:
+            user_input = self.REPLAN_INSTRUCTION.format(plan=json.dumps(previous), request=user_input)
         inputs = {'messages': [('user', user_input)]}
-        config = {'configurable': {'thread_id': context_id}}
-        for item in self.graph.stream(inputs, config, stream_mode='values'):
-            message = item['messages'][-1]
-            if isinstance(message, AIMessage):
-                return_plan = message.content
-                # Remove markdown code block if present
-                return_plan_clean = re.sub(r'^```json\\s*|```$', '', return_plan.strip(), flags=re.MULTILINE)
-                yield {
-                    'status': 'completed',
-                    'message': return_plan_clean
-                }
-                return
+        thread_id = context_id or 'planner'
+        config = {'configurable': {'thread_id': thread_id}}
+        return_plan = None
+        with start_span(tracer, 'PlannerAgent.graph.astream', attributes={'langgraph.thread_id': thread_id}):
+            # astream keeps the event loop free and lets task cancellation abort the LLM call.
+            stream = self.graph.astream(inputs, config, stream_mode='values')
+            try:
+                async for item in stream:
+                    message = item['messages'][-1]
+                    if isinstance(message, AIMessage):
+                        return_plan = message.content
+                        break
+            finally:
+                await stream.aclose()
+        if return_plan is not None:
+            # Remove markdown code block if present
+            return_plan_clean = re.sub(r'^```json\\s*|```$', '', return_plan.strip(), flags=re.MULTILINE)
+            item = {
+                'status': 'completed',
+                'message': return_plan_clean
+            }
+            try:
+                plan = parse_plan(return_plan_clean)
+            except ValueError:
+                plan = None
+            if isinstance(plan, list) and context_id:
+                if previous:
+                    item['diff'] = diff_plans(previous, plan)
+                self.plans.set(context_id, plan)
+            yield item
+            return
         yield {
             'status': 'error',
             'message': 'Sorry, I could not generate a plan.'
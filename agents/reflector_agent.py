@@ -1,14 +1,71 @@
+import ast
+import hashlib
+import json
 import os
 from collections.abc import AsyncIterable
-from typing import Any, Literal
-from langchain_core.messages import AIMessage
+from typing import Any, Literal, Optional
+from langchain_core.messages import AIMessage, AIMessageChunk
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import create_react_agent
 from pydantic import BaseModel
 
-memory = MemorySaver()
+from utils.batching import batch_from_env
+from utils.cache import SqliteCacheStore, TTLCache, conversation_cache
+from utils.tracing import get_tracer, start_span
+
+tracer = get_tracer(__name__)
+
+# Bump when the summary prompt changes in a way SYSTEM_INSTRUCTION/FORMAT_INSTRUCTION do not show.
+SUMMARY_CACHE_VERSION = 1
+SUMMARY_CACHE_TTL = float(os.getenv('REFLECTOR_CACHE_TTL', '3600'))
+SUMMARY_CACHE_SIZE = int(os.getenv('REFLECTOR_CACHE_SIZE', '512'))
+# Per-request identifiers and timestamps that differ between otherwise identical tool results.
+VOLATILE_KEYS = frozenset({'id', 'jsonrpc', 'taskId', 'contextId', 'messageId', 'artifactId', 'timestamp', 'metadata'})
+
+def _content_text(content) -> str:
+    """Message content as plain text; some providers return a list of content blocks."""
+    if isinstance(content, str):
+        return content
+    return ''.join(
+        block if isinstance(block, str) else block.get('text', '')
+        for block in content
+    )
+
+def parse_tool_results(text: str) -> list:
+    """
+    The Orchestrator's results as a list. They arrive as JSON or as the repr of a Python list;
+    anything else is kept as a single result.
+    """
+    for parse in (json.loads, ast.literal_eval):
+        try:
+            results = parse(text)
+        except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+            continue
+        return results if isinstance(results, list) else [results]
+    return [text]
+
+def canonicalize(value: Any) -> Any:
+    """value without VOLATILE_KEYS; strings holding JSON or Python literals are parsed first."""
+    if isinstance(value, str):
+        stripped = value.strip()
+        if stripped[:1] in ('{', '['):
+            for parse in (json.loads, ast.literal_eval):
+                try:
+                    return canonicalize(parse(stripped))
+                except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+                    continue
+        return value
+    if isinstance(value, dict):
+        return {str(k): canonicalize(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+    if isinstance(value, (list, tuple)):
+        return [canonicalize(item) for item in value]
+    return value
+
+def result_digest(result: Any) -> str:
+    """Content hash of one tool result, ignoring request ids; identifies it across turns."""
+    canonical = json.dumps(canonicalize(result), sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
 
 class ResponseFormat(BaseModel):
     """Respond to the user in this format."""
@@ -18,7 +75,8 @@ class ResponseFormat(BaseModel):
 class ReflectorAgent:
     """
     ReflectorAgent: Summarizes all tool results into a final answer using an LLM.
-    Now supports streaming and structured responses.
+    Now supports streaming and structured responses. Pipelined runs summarize each result
+    as it arrives (summarize_section) and merge the section summaries at the end (merge).
     """
     SYSTEM_INSTRUCTION = (
         'You are a travel assistant. Given a list of tool results (e.g., flight details, sightseeing suggestions), '
@@ -29,10 +87,27 @@ class ReflectorAgent:
         'Set response status to error if there is an error while processing the request.'
         'Set response status to completed if the summary is complete.'
     )
+    UPDATE_INSTRUCTION = (
+        'Earlier in this conversation you summarized the tool results for the user as:\n{answer}\n\n'
+        'The user has since changed their request. Update that summary: keep what still applies, drop what '
+        'only concerned results that no longer apply, and work in the new results.\n'
+    )
+
+    SECTION_INSTRUCTION = (
+        'Summarize this one tool result in two or three sentences. It is one section of a larger answer '
+        'that is put together later, so leave out greetings and conclusions.\n'
+    )
+    MERGE_INSTRUCTION = (
+        'Combine these summaries of the tool results, one per task, into a single, user-friendly answer. '
+        'Tasks that were not summarized yet are given with their raw result. Keep every fact; do not '
+        'repeat yourself.\n'
+    )
 
     def __init__(self, llm=None):
         model_source = os.getenv('model_source', 'google')
-        if model_source == 'google':
+        if llm is not None:
+            self.model = llm
+        elif model_source == 'google':
             self.model = ChatGoogleGenerativeAI(model='gemini-2.0-flash')
         else:
             self.model = ChatOpenAI(
@@ -41,33 +116,171 @@ class ReflectorAgent:
                 openai_api_base=os.getenv('TOOL_LLM_URL'),
                 temperature=0,
             )
+        model_name = getattr(self.model, 'model_name', None) or getattr(self.model, 'model', '')
+        # LLM_BATCHING sends concurrent requests' model calls to the provider in micro-batches;
+        # the streamed summary itself is not batched, only capped.
+        self.model = batch_from_env(self.model, 'reflector')
         self.graph = create_react_agent(
             self.model,
             tools=[],
-            checkpointer=memory,
             prompt=self.SYSTEM_INSTRUCTION,
             response_format=(self.FORMAT_INSTRUCTION, ResponseFormat),
         )
+        self.prompt_version = hashlib.sha256(json.dumps(
+            [SUMMARY_CACHE_VERSION, model_name, self.SYSTEM_INSTRUCTION, self.FORMAT_INSTRUCTION,
+             self.SECTION_INSTRUCTION, self.MERGE_INSTRUCTION],
+        ).encode()).hexdigest()[:16]
+        # REFLECTOR_CACHE_DB names a SQLite file that keeps summaries across restarts and replicas.
+        self.summary_cache = TTLCache(
+            'reflector_summaries', ttl=SUMMARY_CACHE_TTL, max_entries=SUMMARY_CACHE_SIZE,
+            store=SqliteCacheStore.from_env('REFLECTOR_CACHE_DB'),
+        )
+        # Each conversation's last answer and the results it covered (by result_digest), so a
+        # follow-up turn updates the answer with what changed instead of summarizing everything again.
+        self.conversations = conversation_cache('reflector_conversations')
 
-    async def stream(self, tool_results: list, context_id: str = 'reflector') -> AsyncIterable[dict[str, Any]]:
-        user_prompt = "Summarize the following tool results for a user:\n"
-        for result in tool_results:
-            user_prompt += f"- {result}\n"
-        inputs = {'messages': [('user', user_prompt)]}
-        config = {'configurable': {'thread_id': context_id}}
-        # Streaming progress message
-        yield {
-            'status': 'summarizing',
-            'message': 'Summarizing your travel results...'
-        }
-        for item in self.graph.stream(inputs, config, stream_mode='values'):
-            message = item['messages'][-1]
-            if isinstance(message, AIMessage):
+    def summary_key(self, tool_results: list) -> str:
+        """Content hash of the tool results (ignoring request ids) under the current prompt."""
+        canonical = json.dumps(canonicalize(tool_results), sort_keys=True, separators=(',', ':'), default=str)
+        return f'{self.prompt_version}:{hashlib.sha256(canonical.encode()).hexdigest()}'
+
+    def _remember(self, context_id: Optional[str], answer: str, tool_results: Optional[list], digests: list[str]) -> None:
+        if context_id and tool_results is not None:
+            self.conversations.set(context_id, {'answer': answer, 'results': dict(zip(digests, tool_results))})
+
+    async def stream(self, tool_results: list, context_id: Optional[str] = None) -> AsyncIterable[dict[str, Any]]:
+        if isinstance(tool_results, str):
+            tool_results = [tool_results]
+        digests = [result_digest(result) for result in tool_results]
+        cache_key = self.summary_key(tool_results)
+        cached = self.summary_cache.lookup(cache_key)
+        if cached is not None:
+            self._remember(context_id, cached, tool_results, digests)
+            yield {
+                'status': 'completed',
+                'message': cached,
+                'cached': True
+            }
+            return
+        previous = self.conversations.get(context_id) if context_id else None
+        if previous:
+            known = previous['results']
+            new_results = [result for result, digest in zip(tool_results, digests) if digest not in known]
+            dropped = [result for digest, result in known.items() if digest not in set(digests)]
+            if not new_results and not dropped:
                 yield {
                     'status': 'completed',
-                    'message': message.content
+                    'message': previous['answer'],
+                    'cached': True
                 }
                 return
+            if len(new_results) == len(tool_results):
+                # Nothing carries over from the earlier answer; summarize from scratch.
+                previous = None
+        if previous:
+            user_prompt = self.UPDATE_INSTRUCTION.format(answer=previous['answer'])
+            if dropped:
+                user_prompt += "Results that no longer apply:\n" + ''.join(f"- {result}\n" for result in dropped)
+            if new_results:
+                user_prompt += "New results:\n" + ''.join(f"- {result}\n" for result in new_results)
+        else:
+            user_prompt = "Summarize the following tool results for a user:\n"
+            for result in tool_results:
+                user_prompt += f"- {result}\n"
+        # Streaming progress message
+        yield {
+            'status': 'summarizing',
+            'message': 'Updating your earlier answer...' if previous else 'Summarizing your travel results...'
+        }
+        async for item in self._stream_summary(user_prompt, context_id or 'reflector'):
+            if item['status'] == 'completed':
+                self.summary_cache.set(cache_key, item['message'])
+                self._remember(context_id, item['message'], tool_results, digests)
+            yield item
+
+    async def summarize_section(self, section: Any) -> str:
+        """
+        Short summary of one result of a pipelined run (an orchestrated_result, or a bare tool
+        result), written while the Orchestrator is still running the other tasks.
+        """
+        task, result = None, section
+        if isinstance(section, dict) and 'result' in section:
+            task, result = section.get('task'), section['result']
+        cache_key = f"section:{self.summary_key([result])}"
+        cached = self.summary_cache.lookup(cache_key)
+        if cached is not None:
+            return cached
+        user_prompt = self.SECTION_INSTRUCTION + (f"Task: {task}\n" if task else '') + f"Result: {result}\n"
+        with start_span(tracer, 'ReflectorAgent.summarize_section', attributes={'travel.task': str(task)}):
+            message = await self.model.ainvoke([('system', self.SYSTEM_INSTRUCTION), ('user', user_prompt)])
+        summary = _content_text(message.content)
+        self.summary_cache.set(cache_key, summary)
+        return summary
+
+    async def merge(self, sections: list, results: Optional[list] = None,
+                    context_id: Optional[str] = None) -> AsyncIterable[dict[str, Any]]:
+        """
+        The final answer of a pipelined run, streamed like stream(): the section summaries merged
+        into one. results are the raw tool results behind them; the conversation remembers those
+        (not the summaries), so a follow-up through stream() is diffed against what was run.
+        """
+        sections = [str(section) for section in sections]
+        cache_key = f"merge:{self.summary_key(sections)}"
+        digests = [result_digest(result) for result in results or []]
+        cached = self.summary_cache.lookup(cache_key)
+        if cached is not None:
+            self._remember(context_id, cached, results, digests)
+            yield {
+                'status': 'completed',
+                'message': cached,
+                'cached': True
+            }
+            return
+        user_prompt = self.MERGE_INSTRUCTION + ''.join(f"- {section}\n" for section in sections)
+        yield {
+            'status': 'summarizing',
+            'message': 'Merging the summaries of your travel results...'
+        }
+        async for item in self._stream_summary(user_prompt, context_id or 'reflector'):
+            if item['status'] == 'completed':
+                self.summary_cache.set(cache_key, item['message'])
+                self._remember(context_id, item['message'], results, digests)
+            yield item
+
+    async def _stream_summary(self, user_prompt: str, thread_id: str) -> AsyncIterable[dict[str, Any]]:
+        """Model tokens of the answer to user_prompt as 'streaming' items, then the whole answer (or an error)."""
+        inputs = {'messages': [('user', user_prompt)]}
+        config = {'configurable': {'thread_id': thread_id}}
+        summary = None
+        with start_span(tracer, 'ReflectorAgent.graph.astream', attributes={'langgraph.thread_id': thread_id}):
+            # 'messages' mode yields model tokens as they are generated, 'values' the finished message.
+            # astream keeps the event loop free and lets task cancellation abort the LLM call.
+            stream = self.graph.astream(inputs, config, stream_mode=['messages', 'values'])
+            try:
+                async for mode, data in stream:
+                    if mode == 'messages':
+                        chunk, metadata = data
+                        # Only the summarizing model call; skip the structured-response pass.
+                        if isinstance(chunk, AIMessageChunk) and metadata.get('langgraph_node') == 'agent':
+                            token = _content_text(chunk.content)
+                            if token:
+                                yield {
+                                    'status': 'streaming',
+                                    'message': token
+                                }
+                        continue
+                    message = data['messages'][-1]
+                    if isinstance(message, AIMessage):
+                        summary = _content_text(message.content)
+                        break
+            finally:
+                await stream.aclose()
+        if summary is not None:
+            yield {
+                'status': 'completed',
+                'message': summary
+            }
+            return
         yield {
             'status': 'error',
             'message': 'Sorry, I could not generate a summary.'
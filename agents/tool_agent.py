@@ -1,19 +1,36 @@
+import json
+import logging
 import os
-import requests
 from collections.abc import AsyncIterable
 from typing import Any, Literal
-from langchain_core.messages import AIMessage
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_openai import ChatOpenAI
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import create_react_agent
 from pydantic import BaseModel
-import asyncio
 from fastmcp import Client
 from fastmcp.client.transports import StreamableHttpTransport
 
+from agents.entities import extract_trip
+from agents.tool_router import ToolArgumentError, ToolRoute, ToolRouter, UnknownToolError
+from utils.cache import TTLCache
+from utils.logging_config import payload
+from utils.registry import get_resolver
+from utils.tracing import get_tracer, inject_trace_context, start_span
 
+logger = logging.getLogger(__name__)
 memory = MemorySaver()
+tracer = get_tracer(__name__)
+
+# Optional tool arguments that narrow MCP tool responses (see mcp_servers/transport_server.py).
+RESULT_SHAPING_PARAMS = (
+    'limit', 'cursor', 'fields', 'max_price', 'depart_after', 'depart_before', 'sort_by', 'category',
+)
+# Transport tasks that ask for a whole journey rather than a direct leg go to RouteSearchTool.
+ROUTE_SEARCH_KEYWORDS = ('route', 'itinerary', 'connection', 'journey')
+ROUTE_SEARCH_PARAMS = (
+    'k', 'optimize', 'depart_after', 'day', 'min_connection_min', 'max_connection_min', 'max_legs', 'modes',
+)
 
 class ResponseFormat(BaseModel):
     status: Literal['working', 'completed', 'error'] = 'working'
@@ -25,8 +42,8 @@ class ToolAgent:
     ToolAgent: Uses an LLM to select and call the correct tool on the specified MCP server, and summarizes results.
     """
     SYSTEM_INSTRUCTION = (
-        'You are a tool execution agent. Given a task description and an MCP server (TransportServer or SightseeingServer), '
-        'decide which tool to call (FlightDetailsTool, BusDetailsTool, PlacesToSee), '
+        'You are a tool execution agent. Given a task description and an MCP server (TransportServer, SightseeingServer or EmployeeServer), '
+        'decide which tool to call (FlightDetailsTool, BusDetailsTool, RouteSearchTool for multi-leg itineraries, PlacesToSee, employees, employees_batch), '
         'infer the required parameters from the task description, call the correct MCP server endpoint, and return the result.\n'
         'Example:\n'
         'Input: {"task": "Book a flight from Paris to Rome", "mcp_server": "TransportServer", "depends": []}\n'
@@ -58,33 +75,67 @@ class ToolAgent:
             prompt=self.SYSTEM_INSTRUCTION,
             response_format=(self.FORMAT_INSTRUCTION, ResponseFormat),
         )
-        self.transport_server_url = "http://127.0.0.1:9000/mcp"
-        self.sightseeing_server_url = "http://127.0.0.1:9002/mcp"
+        # MCP servers whose tools are routed; URLs are fallbacks for servers not in the service registry.
+        # Servers registered with kind "mcp" are discovered as well.
+        self.mcp_servers = {
+            "TransportServer": "http://127.0.0.1:9000/mcp",
+            "SightseeingServer": "http://127.0.0.1:9002/mcp",
+            "EmployeeServer": "http://127.0.0.1:8000/mcp",
+        }
+        self.resolver = get_resolver()
+        self.router = ToolRouter(
+            self.mcp_servers,
+            self.resolver,
+            refresh_interval=float(os.getenv('TOOL_ROUTER_REFRESH_INTERVAL', '60')),
+            headers_factory=inject_trace_context,
+        )
+        self.result_cache = TTLCache(
+            'tool_results',
+            ttl=float(os.getenv('TOOL_CACHE_TTL', '60')),
+            max_entries=int(os.getenv('TOOL_CACHE_SIZE', '1024')),
+        )
+        # Default top-k requested from MCP tools; 0 returns every option.
+        self.result_limit = int(os.getenv('TOOL_RESULT_LIMIT', '5'))
+
+    async def start(self) -> None:
+        """Discover the MCP servers' tools before the first request, and keep the index fresh."""
+        await self.router.start()
+
+    async def stop(self) -> None:
+        await self.router.stop()
 
     async def call_tool_via_mcp(self, tool_name: str, argument: dict) -> dict:
         """
         Call a tool on the MCP server using the fastmcp client (async).
         """
         try:
-            # Choose the correct MCP server URL based on the tool
-            if tool_name == "PlacesToSee":
-                mcp_url = self.sightseeing_server_url
-            else:
-                mcp_url = self.transport_server_url
-            transport = StreamableHttpTransport(mcp_url)
-            async with Client(transport=transport) as client:
-                tools = await client.list_tools()
-                print(f"Available tools: {tools}")
-                result = await client.call_tool(tool_name, argument)
-                return {"result": result}
+            route = await self.router.route(tool_name)
+            argument = self.router.prepare(route, argument)
+        except (UnknownToolError, ToolArgumentError) as e:
+            # Rejected before any MCP round trip.
+            logger.warning("Not calling %s: %s", tool_name, e)
+            return {"error": str(e)}
+        # Identical calls within TOOL_CACHE_TTL seconds (e.g. warmed by an Orchestrator prefetch)
+        # are answered from the cache, or wait for the identical call already in flight.
+        key = (tool_name, json.dumps(argument, sort_keys=True, default=str))
+        return await self.result_cache.get_or_compute(
+            key, lambda: self._call_mcp(route, tool_name, argument), should_cache=lambda r: 'error' not in r,
+        )
+
+    async def _call_mcp(self, route: ToolRoute, tool_name: str, argument: dict) -> dict:
+        try:
+            async with self.resolver.lease(route.server, route.default_url) as mcp_url:
+                with start_span(tracer, 'ToolAgent.call_tool_via_mcp', attributes={'mcp.tool': tool_name, 'mcp.url': mcp_url}):
+                    transport = StreamableHttpTransport(mcp_url, headers=inject_trace_context())
+                    async with Client(transport=transport) as client:
+                        result = await client.call_tool(tool_name, argument)
+                        return {"result": result}
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception("MCP call %s failed", tool_name)
             return {"error": str(e)}
 
     async def stream(self, task, context_id: str = 'tool') -> AsyncIterable[dict[str, Any]]:
-        print(f"[ToolAgent.stream] Received task: {task!r}")  # Debug print
-        import json
+        logger.debug("Received task: %s", payload(task))
         if isinstance(task, str):
             try:
                 task = json.loads(task)
@@ -103,17 +154,39 @@ class ToolAgent:
         tool_to_call = None
         params = task.get('params', {})
         argument = {}
+        # Planned tasks often only name the cities in their description.
+        trip = extract_trip(task.get('task', ''))
+        source = params.get('source') or trip.source or 'Paris'
+        destination = params.get('destination') or trip.destination or 'Rome'
         if task.get('mcp_server') == 'TransportServer':
-            if 'bus' in task.get('task', '').lower():
+            description = task.get('task', '').lower()
+            if any(word in description for word in ROUTE_SEARCH_KEYWORDS):
+                tool_to_call = 'RouteSearchTool'
+                argument = {"source": source, "destination": destination}
+                argument.update({k: params[k] for k in ROUTE_SEARCH_PARAMS if k in params})
+            elif 'bus' in description:
                 tool_to_call = 'BusDetailsTool'
-                argument = {"source": params.get('source', 'Paris'), "destination": params.get('destination', 'Rome')}
+                argument = {"source": source, "destination": destination}
             else:
                 tool_to_call = 'FlightDetailsTool'
-                argument = {"source": params.get('source', 'Paris'), "destination": params.get('destination', 'Rome')}
+                argument = {"source": source, "destination": destination}
         elif task.get('mcp_server') == 'SightseeingServer':
             tool_to_call = 'PlacesToSee'
-            argument = {"query": params.get('query', 'Rome')}
+            argument = {"query": params.get('query') or trip.destination or (trip.cities[0] if trip.cities else 'Rome')}
+        elif task.get('mcp_server') == 'EmployeeServer':
+            names = params.get('names') or ([params['name']] if params.get('name') else [])
+            if names:
+                # Resolve every name in one MCP call.
+                tool_to_call = 'employees_batch'
+                argument = {"names": names}
+            else:
+                tool_to_call = 'employees'
+                argument = {"location": params['location']} if params.get('location') else {}
         if tool_to_call:
+            # Let the MCP server filter, sort and trim results instead of shipping every option;
+            # the router drops the ones a tool does not accept.
+            argument.update({k: params[k] for k in RESULT_SHAPING_PARAMS if k in params})
+            argument.setdefault("limit", self.result_limit)
             result = await self.call_tool_via_mcp(tool_to_call, argument)
         else:
             result = {'error': 'Unknown tool'}
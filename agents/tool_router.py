@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from fastmcp import Client
+from fastmcp.client.transports import StreamableHttpTransport
+
+from utils.registry import EndpointResolver
+
+logger = logging.getLogger(__name__)
+
+_JSON_TYPES = {
+    'string': (str,),
+    'integer': (int,),
+    'number': (int, float),
+    'boolean': (bool,),
+    'array': (list,),
+    'object': (dict,),
+    'null': (type(None),),
+}
+
+
+class ToolArgumentError(ValueError):
+    pass
+
+
+class UnknownToolError(LookupError):
+    pass
+
+
+@dataclass(frozen=True)
+class ToolRoute:
+    tool: str
+    server: str
+    default_url: Optional[str]
+    input_schema: dict
+    description: str = ''
+
+
+def _schema_errors(value: Any, schema: dict, path: str) -> list[str]:
+    """
+    Check value against the subset of JSON Schema that MCP tool signatures produce
+    (type, enum, anyOf, items, required properties). Unsupported keywords such as
+    $ref are accepted as-is; the server still validates the call.
+    """
+    if 'anyOf' in schema:
+        if any(not _schema_errors(value, option, path) for option in schema['anyOf']):
+            return []
+        return [f'{path}: {value!r} does not match any allowed type']
+    if 'enum' in schema and value not in schema['enum']:
+        return [f'{path}: {value!r} is not one of {schema["enum"]}']
+    expected = schema.get('type')
+    if expected:
+        types = expected if isinstance(expected, list) else [expected]
+        python_types = tuple(t for name in types for t in _JSON_TYPES.get(name, (object,)))
+        # bool is an int subclass, but JSON Schema keeps them apart.
+        if not isinstance(value, python_types) or (isinstance(value, bool) and 'boolean' not in types):
+            return [f'{path}: expected {"/".join(types)}, got {type(value).__name__}']
+    if isinstance(value, list) and isinstance(schema.get('items'), dict):
+        return [e for i, item in enumerate(value) for e in _schema_errors(item, schema['items'], f'{path}[{i}]')]
+    if isinstance(value, dict) and 'properties' in schema:
+        errors = [f'{path}.{name}: required' for name in schema.get('required', []) if name not in value]
+        for name, item in value.items():
+            if name in schema['properties']:
+                errors += _schema_errors(item, schema['properties'][name], f'{path}.{name}')
+        return errors
+    return []
+
+
+class ToolRouter:
+    """
+    ToolRouter: Tool name → MCP server index built from each server's list_tools, including
+    the tools' JSON input schemas. Servers are the configured ones plus any registered in the
+    service registry with kind "mcp". start() builds the index and then rebuilds it every
+    refresh_interval seconds in the background; route() only reads the current index, and a
+    miss schedules an early rebuild (at most every miss_refresh_interval seconds) without
+    waiting for it. A server that cannot be reached keeps the tools it last reported.
+    """
+    def __init__(self, servers: dict[str, str], resolver: EndpointResolver, refresh_interval: float = 60.0,
+                 miss_refresh_interval: float = 5.0, headers_factory=None):
+        self.servers = dict(servers)
+        self.resolver = resolver
+        self.refresh_interval = refresh_interval
+        self.miss_refresh_interval = miss_refresh_interval
+        self.headers_factory = headers_factory or dict
+        self._routes: dict[str, ToolRoute] = {}
+        self._refreshed_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._refresher: Optional[asyncio.Task] = None
+        self._early_refresh: Optional[asyncio.Task] = None
+
+    async def _server_names(self) -> dict[str, Optional[str]]:
+        names: dict[str, Optional[str]] = dict(self.servers)
+        try:
+            # Reading the registry takes its file lock; keep that off the event loop.
+            for service in await asyncio.to_thread(self.resolver.registry.services, kind='mcp'):
+                names.setdefault(service, None)
+        except OSError:
+            logger.exception('Reading the service registry failed')
+        return names
+
+    async def _discover(self, server: str, default_url: Optional[str]) -> list[ToolRoute]:
+        async with self.resolver.lease(server, default_url) as url:
+            transport = StreamableHttpTransport(url, headers=self.headers_factory())
+            async with Client(transport=transport) as client:
+                tools = await client.list_tools()
+        return [
+            ToolRoute(tool.name, server, default_url, tool.inputSchema or {}, tool.description or '')
+            for tool in tools
+        ]
+
+    async def refresh(self) -> None:
+        servers = await self._server_names()
+        results = await asyncio.gather(
+            *(self._discover(server, url) for server, url in servers.items()), return_exceptions=True,
+        )
+        routes: dict[str, ToolRoute] = {}
+        for (server, _), result in zip(servers.items(), results):
+            if isinstance(result, BaseException):
+                logger.warning('Listing tools on %s failed: %s', server, result)
+                result = [route for route in self._routes.values() if route.server == server]
+            for route in result:
+                if route.tool in routes and routes[route.tool].server != server:
+                    logger.warning('Tool %s is offered by %s and %s; using %s',
+                                   route.tool, routes[route.tool].server, server, routes[route.tool].server)
+                    continue
+                routes[route.tool] = route
+        self._routes = routes
+        self._refreshed_at = time.monotonic()
+        logger.info('Routing %d MCP tools across %d servers', len(routes), len(servers))
+
+    async def _refresh_once(self) -> None:
+        async with self._lock:
+            await self.refresh()
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self._refresh_once()
+            except Exception:
+                logger.exception('Refreshing the MCP tool index failed')
+
+    async def start(self) -> None:
+        """Build the index and keep it fresh in the background; call once the event loop runs."""
+        if self._refresher is not None:
+            return
+        self._refresher = asyncio.create_task(self._refresh_periodically(), name='tool-router-refresh')
+        await self._refresh_once()
+
+    async def stop(self) -> None:
+        for task in (self._refresher, self._early_refresh):
+            if task is not None:
+                task.cancel()
+        self._refresher = self._early_refresh = None
+
+    def _refresh_soon(self) -> None:
+        if self._early_refresh is not None and not self._early_refresh.done():
+            return
+        if self._refreshed_at is not None and time.monotonic() - self._refreshed_at < self.miss_refresh_interval:
+            return
+        self._early_refresh = asyncio.create_task(self._refresh_once())
+
+    async def route(self, tool: str) -> ToolRoute:
+        if self._refresher is None:
+            # Used without start() (e.g. outside an agent app): discover on first use.
+            await self.start()
+        route = self._routes.get(tool)
+        if route is None:
+            # A server may have come up (or gained the tool) since the last refresh; look again,
+            # but fail this call now rather than holding it while every server is listed.
+            self._refresh_soon()
+            raise UnknownToolError(f'No MCP server offers tool {tool!r}')
+        return route
+
+    def prepare(self, route: ToolRoute, arguments: dict) -> dict:
+        """
+        Validate arguments against the tool's input schema. Optional arguments the tool does
+        not declare are dropped; missing required or mistyped arguments raise ToolArgumentError.
+        """
+        properties = route.input_schema.get('properties')
+        if properties is not None:
+            dropped = [name for name in arguments if name not in properties]
+            if dropped:
+                logger.debug('Dropping arguments %s not accepted by %s', dropped, route.tool)
+                arguments = {name: value for name, value in arguments.items() if name in properties}
+        errors = _schema_errors(arguments, route.input_schema, route.tool)
+        if errors:
+            raise ToolArgumentError('; '.join(errors))
+        return arguments
+
+    def tools(self) -> dict[str, str]:
+        return {name: route.server for name, route in self._routes.items()}
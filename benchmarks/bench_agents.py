@@ -0,0 +1,228 @@
+"""
+Micro and macro benchmarks of the agent stack, runnable offline.
+
+    python -m benchmarks.bench_agents --out baseline.json
+    python -m benchmarks.bench_agents --suite micro --iterations 2000 --out candidate.json
+    python -m benchmarks.compare baseline.json candidate.json
+
+Everything runs against benchmarks.stack.LocalStack: the real MCP servers and A2A agents on
+local ports with stubbed LLMs (--llm-latency adds a fixed delay per model call). The Tool
+Agent's and Reflector's result caches are disabled unless --warm-caches is given, so every
+iteration pays for the full path.
+
+Micro: artifact extraction in the executors, plan parsing, tool-result parsing, encoding and
+decoding orchestrated_results in each artifact encoding (with its size on the wire), the
+Orchestrator's fan-out over a plan and one call_tool_via_mcp round trip.
+Macro: the test_client Planner → Orchestrator → Reflector graph at each concurrency and plan size
+(with --pipeline, the Reflector summarizes tool results while the Orchestrator runs the rest).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from benchmarks.compare import latency_stats
+
+
+def time_sync(fn, iterations: int) -> list[float]:
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def run_concurrent(fn, total: int, concurrency: int) -> tuple[list[float], float]:
+    """Call the coroutine function fn total times, at most concurrency at once; latencies and wall time."""
+    latencies: list[float] = []
+    remaining = iter(range(total))
+
+    async def worker() -> None:
+        for _ in remaining:
+            started = time.perf_counter()
+            await fn()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+
+def micro_parsing(iterations: int, plan_sizes: list[int]) -> dict:
+    from a2a.types import Artifact, Part, TextPart
+
+    from agent_executor import _find_extracted_artifact
+    from agents.planner_agent import parse_plan
+    from benchmarks.stubs import stub_plan_text
+
+    results = {}
+    plan = stub_plan_text(max(plan_sizes))
+    objects = SimpleNamespace(artifacts=[
+        Artifact(artifactId=str(i), name=name, parts=[Part(root=TextPart(text=plan))])
+        for i, name in enumerate(['tool_task', 'orchestrated_results', 'planned_tasks'])
+    ])
+    dicts = SimpleNamespace(artifacts=[a.model_dump(mode='json') for a in objects.artifacts])
+    for shape, context in (('objects', objects), ('dicts', dicts)):
+        assert _find_extracted_artifact(context, 'planned_tasks') == plan
+        latencies = time_sync(lambda: _find_extracted_artifact(context, 'planned_tasks'), iterations)
+        results[f'micro.find_extracted_artifact[{shape}]'] = latency_stats(latencies)
+    for size in plan_sizes:
+        text = stub_plan_text(size, fenced=True)
+        results[f'micro.parse_plan[tasks={size}]'] = latency_stats(time_sync(lambda: parse_plan(text), iterations))
+    return results
+
+
+async def micro_stack(stack, iterations: int, plan_sizes: list[int]) -> dict:
+    from agents.orchestrator_agent import OrchestratorAgent
+    from agents.reflector_agent import parse_tool_results
+    from agents.tool_agent import ToolAgent
+    from benchmarks.stubs import stub_plan
+    from utils.artifact_codec import TEXT, decode_parts, encode_artifact, supported_modes
+
+    results = {}
+    tool_agent = ToolAgent()
+    arguments = {'source': 'Paris', 'destination': 'Rome', 'limit': 5}
+    assert 'error' not in await tool_agent.call_tool_via_mcp('FlightDetailsTool', arguments)
+    latencies, _ = await run_concurrent(
+        lambda: tool_agent.call_tool_via_mcp('FlightDetailsTool', arguments), iterations, 1,
+    )
+    results['micro.call_tool_via_mcp'] = latency_stats(latencies)
+
+    orchestrator = OrchestratorAgent(stack.urls['Tool Agent'].rstrip('/'))
+    fanout_iterations = max(1, iterations // 10)
+    for size in plan_sizes:
+        plan = stub_plan(size)
+        last = {}
+
+        async def orchestrate() -> None:
+            async for item in orchestrator.stream(plan):
+                last.update(item)
+            assert last['status'] == 'completed', last.get('message')
+
+        latencies, _ = await run_concurrent(orchestrate, fanout_iterations, 1)
+        results[f'micro.orchestrator_stream[tasks={size}]'] = latency_stats(latencies)
+        # Text-only Orchestrators from before artifact encoding sent the repr of this list.
+        text = str(last['results'])
+        results[f'micro.parse_tool_results[tasks={size}]'] = latency_stats(
+            time_sync(lambda: parse_tool_results(text), iterations)
+        )
+        for mode in supported_modes():
+            parts = encode_artifact('orchestrated_results', last['results'], [mode])
+            wire = len(parts[0].model_dump_json(exclude_none=True))
+            if mode == TEXT:
+                decode = lambda: parse_tool_results(parts[0].root.text)
+            else:
+                decode = lambda: decode_parts(parts)
+            encode = lambda: encode_artifact('orchestrated_results', last['results'], [mode])
+            for op, fn in (('encode', encode), ('decode', decode)):
+                results[f'micro.artifact_{op}[{mode},tasks={size}]'] = dict(
+                    latency_stats(time_sync(fn, iterations)), wire_bytes=wire,
+                )
+    return results
+
+
+async def macro(stack, requests: int, concurrencies: list[int], plan_sizes: list[int], prefetch: bool,
+                pipeline: bool = False) -> dict:
+    import httpx
+
+    from test_client import build_graph
+    from utils.registry import BalancedA2AClient
+
+    results = {}
+    async with httpx.AsyncClient(timeout=300.0) as httpx_client:
+        clients = [BalancedA2AClient(httpx_client, name) for name in ('Planner Agent', 'Orchestrator Agent', 'Reflector Agent')]
+        app = build_graph(*clients, prefetch=prefetch, pipeline=pipeline).compile()
+        for size in plan_sizes:
+            stack.set_plan_size(size)
+            for concurrency in concurrencies:
+                async def run_pipeline() -> None:
+                    state = await app.ainvoke({'user_input': 'Plan a trip from Paris to Rome with sightseeing.'})
+                    assert state.get('final_answer'), 'pipeline produced no final answer'
+
+                await run_pipeline()
+                latencies, wall = await run_concurrent(run_pipeline, max(requests, concurrency), concurrency)
+                results[f'macro.pipeline[concurrency={concurrency},tasks={size}]'] = latency_stats(latencies, wall)
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from benchmarks.stack import LocalStack
+
+    results = {}
+    if args.suite in ('micro', 'all'):
+        results.update(micro_parsing(args.iterations, args.plan_sizes))
+    async with LocalStack(args.base_port, llm_latency=args.llm_latency, token_delay=args.token_delay) as stack:
+        if args.suite in ('micro', 'all'):
+            results.update(await micro_stack(stack, args.iterations // 10, args.plan_sizes))
+        if args.suite in ('macro', 'all'):
+            results.update(await macro(stack, args.requests, args.concurrency, args.plan_sizes, args.prefetch,
+                                       args.pipeline))
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'args': {k: v for k, v in vars(args).items() if k != 'out'},
+        },
+        'results': results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the agent stack offline.')
+    parser.add_argument('--suite', choices=['micro', 'macro', 'all'], default='all')
+    parser.add_argument('--out', help='Write the results JSON here (default: print it).')
+    parser.add_argument('--iterations', type=int, default=1000, help='Iterations of each in-process micro benchmark.')
+    parser.add_argument('--requests', type=int, default=20, help='Pipeline runs per macro configuration.')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--plan-sizes', type=int, nargs='+', default=[3, 9])
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='Seconds each stubbed model call takes.')
+    parser.add_argument('--token-delay', type=float, default=0.0, help='Seconds between streamed summary tokens.')
+    parser.add_argument('--base-port', type=int, default=18000)
+    parser.add_argument('--prefetch', action='store_true', help='Run the speculative prefetch in the macro pipeline.')
+    parser.add_argument('--warm-caches', action='store_true', help='Keep the tool-result and summary caches on.')
+    parser.add_argument('--llm-batching', action='store_true', help='Micro-batch the Planner and Reflector model calls.')
+    parser.add_argument('--pipeline', action='store_true', help='Summarize tool results while the Orchestrator runs the rest.')
+    args = parser.parse_args()
+
+    # A private registry, so the stack neither joins nor resolves any real deployment.
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    os.environ['SERVICE_REGISTRY_FILE'] = os.path.join(workdir, 'registry.json')
+    os.environ['PUSH_CONFIG_DB'] = os.path.join(workdir, 'push.sqlite')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.pop('REFLECTOR_CACHE_DB', None)
+    if args.llm_batching:
+        os.environ['LLM_BATCHING'] = '1'
+    if not args.warm_caches:
+        os.environ['TOOL_CACHE_TTL'] = '0'
+        os.environ['REFLECTOR_CACHE_TTL'] = '0'
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        for name, stats in report['results'].items():
+            print(f"{name:<48} p50 {stats['p50_ms']:>10.3f} ms  p95 {stats['p95_ms']:>10.3f} ms")
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
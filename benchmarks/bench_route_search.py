@@ -0,0 +1,91 @@
+"""
+Benchmark RouteSearchTool's engine on a synthetic timetable.
+
+    python -m benchmarks.bench_route_search --legs 100000 --cities 400 --queries 500
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from mcp_servers.route_search import RouteNetwork
+
+
+def synthetic_legs(n_legs: int, n_cities: int, days: int = 2, seed: int = 7) -> list[dict]:
+    """Random flight and bus legs between cities placed on a plane; price and duration grow with distance."""
+    rng = random.Random(seed)
+    coords = [(rng.uniform(0, 5000), rng.uniform(0, 5000)) for _ in range(n_cities)]
+    # Each city serves a handful of hubs and neighbours, like a real network.
+    hubs = rng.sample(range(n_cities), max(1, n_cities // 20))
+    legs = []
+    for i in range(n_legs):
+        src = rng.randrange(n_cities)
+        dst = rng.choice(hubs) if rng.random() < 0.5 else rng.randrange(n_cities)
+        if dst == src:
+            dst = (src + 1) % n_cities
+        (x1, y1), (x2, y2) = coords[src], coords[dst]
+        distance = ((x1 - x2) ** 2 + (y1 - y2) ** 2) ** 0.5
+        is_bus = distance < 800 and rng.random() < 0.6
+        duration = int(distance / (70 if is_bus else 700) * 60) + (0 if is_bus else 45)
+        departure = rng.randrange(24 * 60)
+        legs.append({
+            'mode': 'bus' if is_bus else 'flight',
+            'source': f'City{src}',
+            'destination': f'City{dst}',
+            'day': rng.randrange(days),
+            'departure': f'{departure // 60:02d}:{departure % 60:02d}',
+            'duration_min': max(30, duration),
+            'price_usd': round(distance * (0.03 if is_bus else 0.12) * rng.uniform(0.7, 1.6) + 20, 2),
+            ('operator' if is_bus else 'airline'): f'Carrier{i % 50}',
+        })
+    return legs
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(legs: int, cities: int, queries: int, k: int, seed: int) -> dict:
+    records = synthetic_legs(legs, cities, seed=seed)
+    started = time.perf_counter()
+    network = RouteNetwork(records)
+    build_s = time.perf_counter() - started
+
+    rng = random.Random(seed + 1)
+    pairs = [rng.sample(range(cities), 2) for _ in range(queries)]
+    results = {}
+    for optimize in ('price', 'duration'):
+        # The first pass pays for each destination's heuristic table; the second reuses them.
+        for phase in ('cold', 'warm'):
+            latencies, found = [], 0
+            for src, dst in pairs:
+                started = time.perf_counter()
+                paths = network.search(f'City{src}', f'City{dst}', k=k, optimize=optimize)
+                latencies.append((time.perf_counter() - started) * 1000)
+                found += bool(paths)
+            results[f'{optimize}_{phase}'] = {
+                'p50_ms': round(statistics.median(latencies), 3),
+                'p95_ms': round(percentile(latencies, 95), 3),
+                'p99_ms': round(percentile(latencies, 99), 3),
+                'max_ms': round(max(latencies), 3),
+                'found_ratio': round(found / queries, 3),
+            }
+    return {'legs': len(network), 'cities': cities, 'queries': queries, 'k': k,
+            'build_s': round(build_s, 3), 'search': results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--legs', type=int, default=100_000)
+    parser.add_argument('--cities', type=int, default=400)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('-k', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(run(args.legs, args.cities, args.queries, args.k, args.seed), indent=2))
+
+
+if __name__ == '__main__':
+    main()
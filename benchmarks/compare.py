@@ -0,0 +1,85 @@
+"""
+Summarize benchmark timings and compare two result files.
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.10
+
+Each result file is {"meta": {...}, "results": {name: stats}}. A benchmark regresses when
+its p50 or p95 latency grows, or its throughput falls, by more than the threshold
+(relative) and by more than --min-delta-ms (absolute, to ignore timer noise on
+sub-millisecond benchmarks). Exits with status 1 when anything regressed.
+"""
+import argparse
+import json
+import statistics
+import sys
+
+# Stats compared between runs, and whether a larger value is better.
+COMPARED = {'p50_ms': False, 'p95_ms': False, 'throughput_per_s': True}
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def latency_stats(seconds: list[float], wall_s: float = 0.0) -> dict:
+    """Latency percentiles in milliseconds; with the wall time of the run, also its throughput."""
+    ms = [s * 1000 for s in seconds]
+    stats = {
+        'n': len(ms),
+        'mean_ms': round(statistics.fmean(ms), 4),
+        'p50_ms': round(statistics.median(ms), 4),
+        'p95_ms': round(percentile(ms, 95), 4),
+        'p99_ms': round(percentile(ms, 99), 4),
+        'max_ms': round(max(ms), 4),
+    }
+    if wall_s > 0:
+        stats['throughput_per_s'] = round(len(ms) / wall_s, 2)
+    return stats
+
+
+def compare(baseline: dict, candidate: dict, threshold: float, min_delta_ms: float) -> list[dict]:
+    """One row per benchmark and compared stat present in both result sets."""
+    rows = []
+    for name in sorted(baseline['results'].keys() & candidate['results'].keys()):
+        old, new = baseline['results'][name], candidate['results'][name]
+        for stat, higher_is_better in COMPARED.items():
+            if stat not in old or stat not in new or not old[stat]:
+                continue
+            change = (new[stat] - old[stat]) / old[stat]
+            worse = -change if higher_is_better else change
+            regressed = worse > threshold and (higher_is_better or new[stat] - old[stat] > min_delta_ms)
+            rows.append({'name': name, 'stat': stat, 'baseline': old[stat], 'candidate': new[stat],
+                         'change': change, 'regressed': regressed})
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files.')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Relative change counted as a regression.')
+    parser.add_argument('--min-delta-ms', type=float, default=0.001, help='Smallest latency increase counted.')
+    args = parser.parse_args()
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding='utf-8') as f:
+        candidate = json.load(f)
+
+    rows = compare(baseline, candidate, args.threshold, args.min_delta_ms)
+    width = max((len(row['name']) for row in rows), default=10)
+    for row in rows:
+        flag = 'REGRESSION' if row['regressed'] else ''
+        print(f"{row['name']:<{width}}  {row['stat']:<16} {row['baseline']:>12} -> {row['candidate']:>12}"
+              f"  {row['change']:+7.1%}  {flag}")
+    for name in sorted(baseline['results'].keys() - candidate['results'].keys()):
+        print(f'{name}: missing from {args.candidate}')
+    for name in sorted(candidate['results'].keys() - baseline['results'].keys()):
+        print(f'{name}: new in {args.candidate}')
+    regressions = [row for row in rows if row['regressed']]
+    print(f'{len(regressions)} regression(s) above {args.threshold:.0%}')
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
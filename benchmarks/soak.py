@@ -0,0 +1,366 @@
+"""
+Soak test: the agent stack under a steady load for hours, watched for leaks.
+
+    python -m benchmarks.soak --duration 4h --rate 2 --out soak-results/
+    python -m benchmarks.soak --duration 10m --rate 5 --sample-interval 5 --warmup 1m
+
+Each of the four main.py agents and the MCP servers (together) runs in its own child
+process, built by benchmarks.stack.LocalStack with stubbed LLMs and sharing a private
+service registry. The test_client Planner → Orchestrator → Reflector graph is started
+--rate times a second (open loop: a slow stack does not slow the arrivals, but no more than
+--max-in-flight pipelines run at once; arrivals beyond that are counted as skipped). Every
+pipeline asks for the same stubbed plan, so the Tool Agent's and Reflector's result caches are
+disabled unless --warm-caches is given: each pipeline then does the full work of a real one.
+
+Every --sample-interval seconds each process's RSS and open file descriptors are read from
+/proc, and its asyncio task count and A2A task-store size from its /debug/stats endpoint.
+Samples go to samples.jsonl and the report to report.json in --out. After --warmup, every
+metric of every process gets a least-squares slope per hour; a metric growing faster than its
+threshold with a steady trend (r² of at least --min-r2) is flagged as a leak, and the command
+exits with status 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from benchmarks.compare import latency_stats
+
+AGENTS = ['Planner Agent', 'Orchestrator Agent', 'Tool Agent', 'Reflector Agent']
+MCP_SERVICES = ['TransportServer', 'SightseeingServer', 'EmployeeServer']
+# The MCP child has no agent app; it serves /debug/stats here, relative to --base-port.
+MCP_STATS_OFFSET = 9
+METRICS = ['rss_bytes', 'open_fds', 'asyncio_tasks', 'task_store_tasks']
+# Where growth of a metric usually comes from, printed next to a flagged leak.
+SUSPECTS = {
+    'rss_bytes': 'objects kept per request: task store, conversation and result caches, checkpointer state',
+    'open_fds': 'httpx or MCP clients created per call and never closed',
+    'asyncio_tasks': 'background tasks never awaited or cancelled (push workers, batch timers, prefetches)',
+    'task_store_tasks': 'InMemoryTaskStore never evicts finished tasks',
+}
+
+
+def parse_duration(text: str) -> float:
+    """Seconds in '90', '90s', '30m' or '4h'."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smh]?)\s*', text)
+    if not match:
+        raise argparse.ArgumentTypeError(f'invalid duration: {text!r}')
+    return float(match.group(1)) * {'': 1, 's': 1, 'm': 60, 'h': 3600}[match.group(2)]
+
+
+def trend(points: list[tuple[float, float]]) -> tuple[float, float]:
+    """Least-squares slope (per second) and r² of (time, value) points."""
+    n = len(points)
+    if n < 2:
+        return 0.0, 0.0
+    mean_t = sum(t for t, _ in points) / n
+    mean_v = sum(v for _, v in points) / n
+    var_t = sum((t - mean_t) ** 2 for t, _ in points)
+    var_v = sum((v - mean_v) ** 2 for _, v in points)
+    if var_t == 0:
+        return 0.0, 0.0
+    slope = sum((t - mean_t) * (v - mean_v) for t, v in points) / var_t
+    r2 = slope * slope * var_t / var_v if var_v else 0.0
+    return slope, r2
+
+
+class ChildProcess:
+    """ChildProcess: A `benchmarks.soak --serve` child running part of the stack, and where to find its stats."""
+
+    def __init__(self, name: str, services: list[str], stats_url: str):
+        self.name = name
+        self.services = services
+        self.stats_url = stats_url
+        self.process: Optional[asyncio.subprocess.Process] = None
+
+    async def start(self, args: argparse.Namespace) -> None:
+        command = [sys.executable, '-m', 'benchmarks.soak', '--base-port', str(args.base_port),
+                   '--llm-latency', str(args.llm_latency), '--token-delay', str(args.token_delay)]
+        for service in self.services:
+            command += ['--serve', service]
+        self.process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE)
+        line = await asyncio.wait_for(self.process.stdout.readline(), timeout=60)
+        if line.strip() != b'ready':
+            raise RuntimeError(f'{self.name} failed to start (exit code {self.process.returncode})')
+
+    async def stop(self) -> None:
+        if self.process is None or self.process.returncode is not None:
+            return
+        self.process.send_signal(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=10)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+
+
+async def serve(args: argparse.Namespace) -> None:
+    """Child side: serve the --serve services until SIGTERM; prints 'ready' once they are up."""
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.routing import Route
+
+    from benchmarks.stack import LocalStack
+    from utils.process_stats import stats_endpoint
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    stats_server = None
+    async with LocalStack(args.base_port, llm_latency=args.llm_latency, token_delay=args.token_delay,
+                          services=args.serve):
+        if not set(args.serve) & set(AGENTS):
+            app = Starlette(routes=[Route('/debug/stats', stats_endpoint())])
+            stats_server = uvicorn.Server(uvicorn.Config(
+                app, host='127.0.0.1', port=args.base_port + MCP_STATS_OFFSET, log_config=None, log_level='warning',
+            ))
+            stats_server.install_signal_handlers = lambda: None
+            stats_task = asyncio.create_task(stats_server.serve())
+            while not stats_server.started:
+                await asyncio.sleep(0.01)
+        print('ready', flush=True)
+        await stop.wait()
+        if stats_server is not None:
+            stats_server.should_exit = True
+            await stats_task
+
+
+class Load:
+    """Load: Open-loop pipeline arrivals at a fixed rate, with a cap on pipelines in flight."""
+
+    def __init__(self, app, rate: float, max_in_flight: int):
+        self.app = app
+        self.rate = rate
+        self.max_in_flight = max_in_flight
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.latencies: list[float] = []
+        self.errors: dict[str, int] = {}
+        self._running: set[asyncio.Task] = set()
+
+    async def _pipeline(self, n: int) -> None:
+        started = time.perf_counter()
+        try:
+            state = await self.app.ainvoke({'user_input': f'Plan a trip from Paris to Rome with sightseeing ({n}).'})
+            if not state.get('final_answer'):
+                raise RuntimeError('pipeline produced no final answer')
+            self.completed += 1
+            self.latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            self.failed += 1
+            key = f'{type(e).__name__}: {e}'[:200]
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    async def run(self, until: float) -> None:
+        interval = 1.0 / self.rate
+        next_at = time.monotonic()
+        n = 0
+        while next_at < until:
+            await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+            next_at += interval
+            n += 1
+            if len(self._running) >= self.max_in_flight:
+                self.skipped += 1
+                continue
+            task = asyncio.create_task(self._pipeline(n))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+        await asyncio.gather(*self._running, return_exceptions=True)
+
+    def window(self) -> dict:
+        """Latency stats of the pipelines completed since the last call."""
+        latencies, self.latencies = self.latencies, []
+        return latency_stats(latencies) if latencies else {}
+
+
+async def sample(children: list[ChildProcess], httpx_client, started: float) -> list[dict]:
+    from utils.process_stats import open_fds, process_stats, rss_bytes
+
+    now = round(time.monotonic() - started, 3)
+    samples = []
+    for child in children:
+        pid = str(child.process.pid)
+        record = {'t': now, 'process': child.name, 'pid': child.process.pid,
+                  'rss_bytes': rss_bytes(pid), 'open_fds': open_fds(pid)}
+        try:
+            stats = (await httpx_client.get(child.stats_url, timeout=10)).json()
+            record['asyncio_tasks'] = stats.get('asyncio_tasks')
+            record['task_store_tasks'] = stats.get('task_store_tasks')
+            record['threads'] = stats.get('threads')
+        except Exception as e:
+            record['stats_error'] = repr(e)
+        samples.append(record)
+    own = process_stats()
+    samples.append({'t': now, 'process': 'driver', 'pid': own['pid'], 'rss_bytes': own['rss_bytes'],
+                    'open_fds': own['open_fds'], 'asyncio_tasks': own['asyncio_tasks'], 'threads': own['threads']})
+    return samples
+
+
+def analyse(samples: list[dict], warmup: float, thresholds: dict[str, float], min_r2: float,
+            request_rate: float) -> dict:
+    """Per process and metric: first/last value, slope per hour, r², growth per pipeline and whether it leaks."""
+    report = {}
+    for process in dict.fromkeys(s['process'] for s in samples):
+        report[process] = {}
+        for metric in METRICS:
+            points = [(s['t'], s[metric]) for s in samples
+                      if s['process'] == process and s['t'] >= warmup and s.get(metric) is not None]
+            if len(points) < 3:
+                continue
+            slope, r2 = trend(points)
+            per_hour = slope * 3600
+            if metric == 'rss_bytes':
+                per_hour /= 1024 * 1024
+            report[process][metric] = {
+                'first': points[0][1],
+                'last': points[-1][1],
+                'per_hour': round(per_hour, 3),
+                'r2': round(r2, 3),
+                'per_pipeline': round(slope / request_rate, 3) if request_rate else None,
+                'leak': per_hour > thresholds[metric] and r2 >= min_r2,
+            }
+    return report
+
+
+def print_report(report: dict, load: Load) -> None:
+    units = {'rss_bytes': 'MB/h', 'open_fds': 'fds/h', 'asyncio_tasks': 'tasks/h', 'task_store_tasks': 'stored/h'}
+    print(f'\nPipelines: {load.completed} completed, {load.failed} failed, {load.skipped} skipped (in-flight cap)')
+    for error, count in sorted(load.errors.items(), key=lambda item: -item[1])[:5]:
+        print(f'  {count:>6} × {error}')
+    print(f"\n{'process':<20} {'metric':<18} {'first':>12} {'last':>12} {'slope':>16} {'r2':>6}")
+    leaks = []
+    for process, metrics in report.items():
+        for metric, result in metrics.items():
+            first, last = result['first'], result['last']
+            if metric == 'rss_bytes':
+                first, last = f'{first / 2 ** 20:.1f}MB', f'{last / 2 ** 20:.1f}MB'
+            flag = '  LEAK' if result['leak'] else ''
+            print(f"{process:<20} {metric:<18} {first:>12} {last:>12} "
+                  f"{result['per_hour']:>9.2f} {units[metric]:<7}{result['r2']:>5.2f}{flag}")
+            if result['leak']:
+                leaks.append((process, metric, result['per_pipeline']))
+    print()
+    for process, metric, per_pipeline in leaks:
+        print(f'Leak in {process}: {metric} grows by {per_pipeline} per pipeline. Usual suspects: {SUSPECTS[metric]}.')
+    if not leaks:
+        print('No leaks above the thresholds.')
+
+
+async def run(args: argparse.Namespace) -> int:
+    import httpx
+
+    from test_client import build_graph
+    from utils.registry import BalancedA2AClient
+
+    host = '127.0.0.1'
+    children = [
+        ChildProcess('MCP servers', MCP_SERVICES, f'http://{host}:{args.base_port + MCP_STATS_OFFSET}/debug/stats'),
+    ] + [
+        ChildProcess(name, [name], f'http://{host}:{args.base_port + 10 + offset}/debug/stats')
+        for offset, name in enumerate(AGENTS)
+    ]
+    os.makedirs(args.out, exist_ok=True)
+    samples_path = os.path.join(args.out, 'samples.jsonl')
+    samples: list[dict] = []
+    try:
+        for child in children:
+            await child.start(args)
+        async with httpx.AsyncClient(timeout=300.0) as httpx_client:
+            clients = [BalancedA2AClient(httpx_client, name) for name in ('Planner Agent', 'Orchestrator Agent', 'Reflector Agent')]
+            load = Load(build_graph(*clients, prefetch=args.prefetch).compile(), args.rate, args.max_in_flight)
+            started = time.monotonic()
+            driving = asyncio.create_task(load.run(started + args.duration))
+            with open(samples_path, 'w', encoding='utf-8') as out:
+                while True:
+                    window = load.window()
+                    for record in await sample(children, httpx_client, started):
+                        samples.append(record)
+                        out.write(json.dumps(record) + '\n')
+                    out.flush()
+                    print(f"[{samples[-1]['t']:>8.0f}s] completed {load.completed} failed {load.failed} "
+                          f"skipped {load.skipped} p95 {window.get('p95_ms', 0):.0f} ms", flush=True)
+                    if driving.done():
+                        break
+                    await asyncio.wait({driving}, timeout=args.sample_interval)
+            driving.result()
+    finally:
+        for child in children:
+            await child.stop()
+
+    thresholds = {
+        'rss_bytes': args.rss_mb_per_hour,
+        'open_fds': args.fds_per_hour,
+        'asyncio_tasks': args.tasks_per_hour,
+        'task_store_tasks': args.stored_tasks_per_hour,
+    }
+    report = analyse(samples, args.warmup, thresholds, args.min_r2, args.rate)
+    print_report(report, load)
+    leaks = [f'{process}.{metric}' for process, metrics in report.items()
+             for metric, result in metrics.items() if result['leak']]
+    with open(os.path.join(args.out, 'report.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'meta': {
+                'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'args': {k: v for k, v in vars(args).items() if k not in ('out', 'serve')},
+            },
+            'pipelines': {'completed': load.completed, 'failed': load.failed, 'skipped': load.skipped,
+                          'errors': load.errors},
+            'leaks': leaks,
+            'processes': report,
+        }, f, indent=2)
+        f.write('\n')
+    return 1 if leaks else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Soak-test the agent stack and flag leaks.')
+    parser.add_argument('--duration', type=parse_duration, default='1h', help='How long to drive load, e.g. 90s, 30m, 4h.')
+    parser.add_argument('--rate', type=float, default=2.0, help='Pipelines started per second.')
+    parser.add_argument('--max-in-flight', type=int, default=64, help='Skip arrivals while this many pipelines run.')
+    parser.add_argument('--sample-interval', type=parse_duration, default='30s')
+    parser.add_argument('--warmup', type=parse_duration, default='5m', help='Samples before this are left out of the trends.')
+    parser.add_argument('--out', default='soak-results', help='Directory for samples.jsonl and report.json.')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='Seconds each stubbed model call takes.')
+    parser.add_argument('--token-delay', type=float, default=0.0, help='Seconds between streamed summary tokens.')
+    parser.add_argument('--base-port', type=int, default=18100)
+    parser.add_argument('--prefetch', action='store_true', help='Run the speculative prefetch in each pipeline.')
+    parser.add_argument('--warm-caches', action='store_true', help='Keep the tool-result and summary caches on.')
+    parser.add_argument('--rss-mb-per-hour', type=float, default=20.0)
+    parser.add_argument('--fds-per-hour', type=float, default=10.0)
+    parser.add_argument('--tasks-per-hour', type=float, default=50.0, help='Growth of asyncio tasks that counts as a leak.')
+    parser.add_argument('--stored-tasks-per-hour', type=float, default=100.0,
+                        help='Growth of the A2A task stores that counts as a leak.')
+    parser.add_argument('--min-r2', type=float, default=0.5, help='Only flag steady growth, not noise.')
+    parser.add_argument('--serve', action='append', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    if args.serve:
+        asyncio.run(serve(args))
+        return
+
+    # A private registry shared by the children, so the stack neither joins nor resolves any real deployment.
+    workdir = tempfile.mkdtemp(prefix='soak-')
+    os.environ['SERVICE_REGISTRY_FILE'] = os.path.join(workdir, 'registry.json')
+    os.environ['PUSH_CONFIG_DB'] = os.path.join(workdir, 'push.sqlite')
+    os.environ.pop('REFLECTOR_CACHE_DB', None)
+    os.environ.pop('CONVERSATION_CACHE_DB', None)
+    # The agents only serve /debug/stats when asked to.
+    os.environ['DEBUG_STATS'] = '1'
+    if not args.warm_caches:
+        os.environ['TOOL_CACHE_TTL'] = '0'
+        os.environ['REFLECTOR_CACHE_TTL'] = '0'
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+The whole agent stack served from one process on local ports, with stubbed LLMs.
+
+The real MCP servers and A2A agent apps are served by uvicorn on consecutive ports from
+base_port and registered in the service registry, so agents find each other the same way
+they do in production. Only the Planner's and Reflector's chat models are replaced (see
+benchmarks/stubs.py). SERVICE_REGISTRY_FILE must point at a private file before any agent
+module is imported; benchmarks.bench_agents takes care of that.
+"""
+import asyncio
+import importlib
+import logging
+from typing import Iterable, Optional
+
+import uvicorn
+
+from benchmarks.stubs import planner_llm, reflector_llm, stub_plan_text
+from utils.registry import Registration, get_registry
+
+logger = logging.getLogger(__name__)
+
+MCP_SERVERS = {
+    'TransportServer': 'mcp_servers.transport_server',
+    'SightseeingServer': 'mcp_servers.sightseeing_server',
+    'EmployeeServer': 'mcp_servers.employye',
+}
+
+
+class LocalStack:
+    """
+    LocalStack: Starts the MCP servers (base_port, +1, +2) and the Planner, Orchestrator,
+    Tool and Reflector agents (base_port + 10 .. +13) as uvicorn servers on the running loop.
+    With `services`, only those (MCP server or agent names) are started, on the same ports, so
+    the stack can be split over several processes sharing one registry.
+    """
+    def __init__(self, base_port: int = 18000, plan_size: int = 3, llm_latency: float = 0.0,
+                 token_delay: float = 0.0, summary_words: int = 60, host: str = '127.0.0.1',
+                 services: Optional[Iterable[str]] = None):
+        self.base_port = base_port
+        self.host = host
+        self.services = set(services) if services is not None else None
+        self.planner_model = planner_llm(plan_size, llm_latency)
+        self.reflector_model = reflector_llm(summary_words, llm_latency, token_delay)
+        self.urls: dict[str, str] = {}
+        self._servers: list[uvicorn.Server] = []
+        self._tasks: list[asyncio.Task] = []
+        self._registrations = []
+
+    def set_plan_size(self, plan_size: int) -> None:
+        plan = stub_plan_text(plan_size)
+        self.planner_model.reply = lambda messages: plan
+
+    async def _serve(self, app, port: int) -> None:
+        server = uvicorn.Server(uvicorn.Config(app, host=self.host, port=port, log_config=None, log_level='warning'))
+        # The stack shares the caller's loop; leave signal handling to the caller.
+        server.install_signal_handlers = lambda: None
+        self._servers.append(server)
+        self._tasks.append(asyncio.create_task(server.serve()))
+        while not server.started:
+            if self._tasks[-1].done():
+                self._tasks[-1].result()
+                raise RuntimeError(f'Server on port {port} exited during startup')
+            await asyncio.sleep(0.01)
+
+    def _register(self, service: str, url: str, capabilities: dict) -> None:
+        self._registrations.append(Registration(get_registry(), service, url, capabilities).start())
+        self.urls[service] = url
+
+    async def start(self) -> 'LocalStack':
+        # Imported here: building the agents reads the registry location from the environment.
+        from agent_executor import (
+            OrchestratorAgentExecutor, PlannerAgentExecutor, ReflectorAgentExecutor, ToolAgentExecutor,
+        )
+        from agents.orchestrator_agent import OrchestratorAgent
+        from agents.planner_agent import PlannerAgent
+        from agents.reflector_agent import ReflectorAgent
+        from agents.tool_agent import ToolAgent
+        from main import AGENT_CONFIGS, build_agent_app
+
+        for offset, (service, module_name) in enumerate(MCP_SERVERS.items()):
+            if self.services is not None and service not in self.services:
+                continue
+            module = importlib.import_module(module_name)
+            port = self.base_port + offset
+            await self._serve(module.mcp.http_app(path='/mcp', transport='streamable-http', stateless_http=True), port)
+            self._register(service, f'http://{self.host}:{port}/mcp', {'kind': 'mcp'})
+
+        tool_port = self.base_port + 12
+        executors = {
+            'Planner Agent': lambda: PlannerAgentExecutor(PlannerAgent(llm=self.planner_model)),
+            'Orchestrator Agent': lambda: OrchestratorAgentExecutor(OrchestratorAgent(f'http://{self.host}:{tool_port}')),
+            'Tool Agent': lambda: ToolAgentExecutor(ToolAgent()),
+            'Reflector Agent': lambda: ReflectorAgentExecutor(ReflectorAgent(llm=self.reflector_model)),
+        }
+        for offset, agent_cfg in enumerate(AGENT_CONFIGS):
+            if self.services is not None and agent_cfg['name'] not in self.services:
+                continue
+            port = self.base_port + 10 + offset
+            app, agent_card = build_agent_app(agent_cfg, self.host, port, executors[agent_cfg['name']]())
+            await self._serve(app, port)
+            self._register(agent_cfg['name'], agent_card.url, {'kind': 'a2a', 'skills': [agent_cfg['skill_id']]})
+        logger.info('Local stack up: %s', ', '.join(f'{name} at {url}' for name, url in self.urls.items()))
+        return self
+
+    async def stop(self) -> None:
+        for registration in self._registrations:
+            registration.stop()
+        for server in self._servers:
+            server.should_exit = True
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def __aenter__(self) -> 'LocalStack':
+        return await self.start()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
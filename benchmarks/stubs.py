@@ -0,0 +1,99 @@
+"""
+Offline stand-ins for the LLMs behind the Planner and Reflector agents.
+
+StubChatModel is a LangChain chat model that answers with canned text after a fixed
+latency and streams it word by word, so the agents' real LangGraph code runs unchanged.
+"""
+import asyncio
+import json
+import time
+from typing import Any, Callable, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+CITY_PAIRS = [('Paris', 'Rome'), ('Rome', 'Goa'), ('Goa', 'Paris'), ('Paris', 'Goa'), ('Rome', 'Paris')]
+
+
+def stub_plan(size: int) -> list[dict]:
+    """A Planner-shaped plan of `size` independent tasks: flights, buses and sightseeing in turn."""
+    tasks = []
+    for i in range(size):
+        source, destination = CITY_PAIRS[(i // 3) % len(CITY_PAIRS)]
+        kind = i % 3
+        if kind == 0:
+            tasks.append({'task': f'Find flights from {source} to {destination}',
+                          'mcp_server': 'TransportServer', 'depends': []})
+        elif kind == 1:
+            tasks.append({'task': f'Find buses from {source} to {destination}',
+                          'mcp_server': 'TransportServer', 'depends': []})
+        else:
+            tasks.append({'task': f'Find sightseeing spots in {destination}',
+                          'mcp_server': 'SightseeingServer', 'depends': [], 'params': {'query': destination}})
+    return tasks
+
+
+def stub_plan_text(size: int, fenced: bool = False) -> str:
+    """The Planner artifact for stub_plan(size), optionally wrapped in a markdown code fence."""
+    text = json.dumps(stub_plan(size))
+    return f'```json\n{text}\n```' if fenced else text
+
+
+def stub_summary(words: int) -> str:
+    return ' '.join(f'word{i}' for i in range(words))
+
+
+class StubChatModel(BaseChatModel):
+    """
+    StubChatModel: Replies with reply(messages) after `latency` seconds, streaming one word
+    every token_delay seconds. Structured output wraps the last reply in the requested schema
+    with status "completed", the way the agents' response_format pass expects.
+    """
+    reply: Callable[[list[BaseMessage]], str]
+    latency: float = 0.0
+    token_delay: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return 'stub'
+
+    def _generate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply(messages)))])
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply(messages)))])
+
+    async def _astream(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                       run_manager: Any = None, **kwargs: Any):
+        await asyncio.sleep(self.latency)
+        words = self.reply(messages).split(' ')
+        for i, word in enumerate(words):
+            if i and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            token = word if i == len(words) - 1 else f'{word} '
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(self, schema: Any, **kwargs: Any):
+        def structured(messages: Any) -> Any:
+            replies = [m.content for m in messages if isinstance(m, AIMessage)]
+            return schema(status='completed', message=replies[-1] if replies else '')
+        return RunnableLambda(structured)
+
+
+def planner_llm(plan_size: int, latency: float = 0.0) -> StubChatModel:
+    plan = stub_plan_text(plan_size)
+    return StubChatModel(reply=lambda messages: plan, latency=latency)
+
+
+def reflector_llm(words: int = 60, latency: float = 0.0, token_delay: float = 0.0) -> StubChatModel:
+    summary = stub_summary(words)
+    return StubChatModel(reply=lambda messages: summary, latency=latency, token_delay=token_delay)
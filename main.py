@@ -2,14 +2,15 @@ import logging
 import os
 import sys
 import subprocess
+from contextlib import asynccontextmanager
 
 import click
-import httpx
 import uvicorn
+from starlette.routing import Route
 
 from a2a.server.apps import A2AStarletteApplication
 from a2a.server.request_handlers import DefaultRequestHandler
-from a2a.server.tasks import InMemoryPushNotifier, InMemoryTaskStore
+from a2a.server.tasks import InMemoryTaskStore
 from a2a.types import AgentCapabilities, AgentCard, AgentSkill
 from dotenv import load_dotenv
 
@@ -23,18 +24,31 @@ from agent_executor import (
     ToolAgentExecutor,
     ReflectorAgentExecutor,
 )
+from utils.admission import AdmissionController, AdmissionControlledExecutor
+from utils.artifact_codec import TEXT, supported_modes
+from utils.logging_config import configure_logging
+from utils.metrics import metrics_endpoint
+from utils.process_stats import stats_endpoint
+from utils.profiling import ProfilingExecutor, RequestProfiler
+from utils.push import QueuedPushNotifier
+from utils.registry import register_service
+from utils.tracing import init_tracing
 
 load_dotenv()
 
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+# 'executor' is a factory, called when the agent's app is built: executors construct their agents
+# (and LLM clients), which must not happen just because this module was imported.
 AGENT_CONFIGS = [
     {
         'name': 'Planner Agent',
-        'executor': PlannerAgentExecutor(),
+        'executor': PlannerAgentExecutor,
         'class': PlannerAgent,
         'port': 11000,
+        'max_concurrency': 8,
+        'max_queue': 32,
         'description': 'Decomposes user input into a list of travel tasks',
         'skill_id': 'plan_travel',
         'skill_name': 'Travel Planning',
@@ -43,10 +57,14 @@ AGENT_CONFIGS = [
     },
     {
         'name': 'Orchestrator Agent',
-        'executor': OrchestratorAgentExecutor(),
+        'executor': OrchestratorAgentExecutor,
         'class': OrchestratorAgent,
         'port': 11001,
+        'max_concurrency': 8,
+        'max_queue': 32,
         'description': 'Orchestrates task execution and dependency resolution',
+        # orchestrated_results can be sent compressed/binary; see utils/artifact_codec.py.
+        'output_modes': supported_modes(),
         'skill_id': 'orchestrate_travel',
         'skill_name': 'Travel Orchestration',
         'skill_desc': 'Orchestrates and routes travel tasks to tool agents',
@@ -54,10 +72,13 @@ AGENT_CONFIGS = [
     },
     {
         'name': 'Tool Agent',
-        'executor': ToolAgentExecutor(),
+        'executor': ToolAgentExecutor,
         'class': ToolAgent,
         'port': 11002,
+        'max_concurrency': 32,
+        'max_queue': 128,
         'description': 'Executes travel tools (MCP servers)',
+        'output_modes': supported_modes(),
         'skill_id': 'tool_travel',
         'skill_name': 'Travel Tool Execution',
         'skill_desc': 'Executes travel-related tools and APIs',
@@ -65,10 +86,13 @@ AGENT_CONFIGS = [
     },
     {
         'name': 'Reflector Agent',
-        'executor': ReflectorAgentExecutor(),
+        'executor': ReflectorAgentExecutor,
         'class': ReflectorAgent,
         'port': 11003,
+        'max_concurrency': 8,
+        'max_queue': 32,
         'description': 'Summarizes tool results into a final answer',
+        'input_modes': supported_modes(),
         'skill_id': 'reflect_travel',
         'skill_name': 'Travel Reflection',
         'skill_desc': 'Summarizes and reflects on travel results',
@@ -104,6 +128,66 @@ def run_all_agents():
             p.terminate()
         print("All agents stopped.")
 
+def build_agent_app(agent_cfg: dict, host: str, port: int, executor=None):
+    """The agent's A2A app (behind admission control, with /metrics, /profiles and, with DEBUG_STATS=1, /debug/stats) and its agent card."""
+    capabilities = AgentCapabilities(streaming=True, pushNotifications=True)
+    skill = AgentSkill(
+        id=agent_cfg['skill_id'],
+        name=agent_cfg['skill_name'],
+        description=agent_cfg['skill_desc'],
+        tags=['travel', 'a2a'],
+        examples=agent_cfg['examples'],
+    )
+    agent_card = AgentCard(
+        name=agent_cfg['name'],
+        description=agent_cfg['description'],
+        url=f'http://{host}:{port}/',
+        version='1.0.0',
+        defaultInputModes=agent_cfg.get('input_modes', [TEXT]),
+        defaultOutputModes=agent_cfg.get('output_modes', [TEXT]),
+        capabilities=capabilities,
+        skills=[skill],
+    )
+    admission = AdmissionController(
+        agent_cfg['name'],
+        max_concurrency=int(os.getenv('ADMISSION_MAX_CONCURRENCY', agent_cfg['max_concurrency'])),
+        max_queue=int(os.getenv('ADMISSION_MAX_QUEUE', agent_cfg['max_queue'])),
+    )
+    # Profiles cover execute() only, not the time spent waiting for admission.
+    profiler = RequestProfiler.from_env(agent_cfg['name'])
+    task_store = InMemoryTaskStore()
+    executor = executor or agent_cfg['executor']()
+    request_handler = DefaultRequestHandler(
+        agent_executor=AdmissionControlledExecutor(
+            ProfilingExecutor(executor, profiler), admission,
+        ),
+        task_store=task_store,
+        push_notifier=QueuedPushNotifier.from_env(agent_cfg['name']),
+    )
+    server = A2AStarletteApplication(
+        agent_card=agent_card, http_handler=request_handler
+    )
+    routes = [Route('/metrics', metrics_endpoint)]
+    # Process internals (pid, memory, descriptors, task counts) are for soak runs and debugging only.
+    if os.getenv('DEBUG_STATS', '0').lower() in ('1', 'true', 'yes'):
+        routes.append(Route('/debug/stats', stats_endpoint(task_store)))
+    lifespan = _agent_lifespan(getattr(executor, 'agent', None))
+    return server.build(routes=routes + profiler.routes(), lifespan=lifespan), agent_card
+
+
+def _agent_lifespan(agent):
+    """Runs the agent's start()/stop(), if it has them, with the app (e.g. ToolAgent's tool discovery)."""
+    @asynccontextmanager
+    async def lifespan(app):
+        if hasattr(agent, 'start'):
+            await agent.start()
+        try:
+            yield
+        finally:
+            if hasattr(agent, 'stop'):
+                await agent.stop()
+    return lifespan
+
 for agent_cfg in AGENT_CONFIGS:
     @cli.command(name=agent_cfg['name'].replace(' ', '_').lower())
     @click.option('--host', default='localhost')
@@ -111,34 +195,13 @@ for agent_cfg in AGENT_CONFIGS:
     def run_agent(host, port, agent_cfg=agent_cfg):
         """Starts the {} server.""".format(agent_cfg['name'])
         try:
-            capabilities = AgentCapabilities(streaming=True, pushNotifications=True)
-            skill = AgentSkill(
-                id=agent_cfg['skill_id'],
-                name=agent_cfg['skill_name'],
-                description=agent_cfg['skill_desc'],
-                tags=['travel', 'a2a'],
-                examples=agent_cfg['examples'],
-            )
-            agent_card = AgentCard(
-                name=agent_cfg['name'],
-                description=agent_cfg['description'],
-                url=f'http://{host}:{port}/',
-                version='1.0.0',
-                defaultInputModes=['text/plain'],
-                defaultOutputModes=['text/plain'],
-                capabilities=capabilities,
-                skills=[skill],
-            )
-            httpx_client = httpx.AsyncClient()
-            request_handler = DefaultRequestHandler(
-                agent_executor=agent_cfg['executor'],
-                task_store=InMemoryTaskStore(),
-                push_notifier=InMemoryPushNotifier(httpx_client),
-            )
-            server = A2AStarletteApplication(
-                agent_card=agent_card, http_handler=request_handler
-            )
-            uvicorn.run(server.build(), host=host, port=port)
+            init_tracing(agent_cfg['name'])
+            app, agent_card = build_agent_app(agent_cfg, host, port)
+            # Replicas started with another --port register under the same name.
+            register_service(agent_cfg['name'], agent_card.url, {
+                'kind': 'a2a', 'skills': [agent_cfg['skill_id']], 'streaming': True,
+            })
+            uvicorn.run(app, host=host, port=port)
         except Exception as e:
             logger.error(f'An error occurred during server startup: {e}')
             sys.exit(1)
@@ -0,0 +1,372 @@
+"""
+Catalog data layer for the MCP servers.
+
+Catalogs are loaded once at startup from a JSONL (memory-mapped), JSON, CSV or
+SQLite file into in-memory indexes, and swapped atomically when the file changes.
+"""
+import base64
+import bisect
+import csv
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_FIELDS = {'price_usd', 'duration_min', 'day'}
+
+
+def normalize_city(name: str) -> str:
+    return ' '.join(str(name).casefold().split())
+
+
+def _coerce(record: dict) -> dict:
+    for field in NUMERIC_FIELDS & record.keys():
+        value = record[field]
+        if isinstance(value, str) and value.strip():
+            record[field] = float(value) if field == 'price_usd' else int(value)
+    return record
+
+
+NO_TIME = 24 * 60 * 1000
+
+
+def clock_minutes(value: Optional[str]) -> int:
+    """Minutes since midnight for an "HH:MM" string; NO_TIME when missing or malformed."""
+    try:
+        hours, minutes = str(value).split(':')[:2]
+        return int(hours) * 60 + int(minutes)
+    except (TypeError, ValueError):
+        return NO_TIME
+
+
+def _price(option: dict) -> float:
+    return option.get('price_usd', float('inf'))
+
+
+def _departure(option: dict) -> int:
+    return clock_minutes(option.get('departure'))
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({'offset': offset}).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    try:
+        return max(0, int(json.loads(base64.urlsafe_b64decode(cursor.encode()))['offset']))
+    except (ValueError, KeyError, TypeError):
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+
+
+def paginate(items: list, limit: Optional[int] = None, cursor: Optional[str] = None) -> tuple[list, Optional[str]]:
+    """Return one page of items and the cursor of the next page (None on the last page)."""
+    offset = decode_cursor(cursor)
+    if limit is None or limit <= 0:
+        return items[offset:], None
+    end = offset + limit
+    return items[offset:end], (encode_cursor(end) if end < len(items) else None)
+
+
+def project(items: list[dict], fields: Optional[list[str]] = None) -> list[dict]:
+    """Keep only the requested fields of each item."""
+    if not fields:
+        return items
+    return [{f: item[f] for f in fields if f in item} for item in items]
+
+
+def load_records(path: str, table: Optional[str] = None) -> list[dict]:
+    """Read catalog records from a .jsonl/.ndjson, .json, .csv or .sqlite/.db file."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.jsonl', '.ndjson'):
+        records = []
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return records
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for line in iter(mm.readline, b''):
+                    line = line.strip()
+                    if line:
+                        records.append(_coerce(json.loads(line)))
+        return records
+    if ext == '.json':
+        with open(path, encoding='utf-8') as f:
+            return [_coerce(r) for r in json.load(f)]
+    if ext == '.csv':
+        with open(path, newline='', encoding='utf-8') as f:
+            return [_coerce({k: v for k, v in row.items() if v != ''}) for row in csv.DictReader(f)]
+    if ext in ('.sqlite', '.sqlite3', '.db'):
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            conn.row_factory = sqlite3.Row
+            table = table or 'catalog'
+            rows = conn.execute(f'SELECT * FROM "{table}"').fetchall()
+            return [_coerce({k: row[k] for k in row.keys() if row[k] is not None}) for row in rows]
+        finally:
+            conn.close()
+    raise ValueError(f'Unsupported catalog format: {path}')
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CityIndex:
+    """
+    CityIndex: Exact, prefix and fuzzy lookup over a fixed set of normalized city names.
+    Prefix matches use a sorted key list; fuzzy matches use a precomputed trigram index.
+    """
+    def __init__(self, names: Iterable[str], min_similarity: float = 0.35):
+        self._names = set(names)
+        self._sorted = sorted(self._names)
+        self.min_similarity = min_similarity
+        self._trigrams: dict[str, list[str]] = defaultdict(list)
+        self._name_trigrams: dict[str, int] = {}
+        for name in self._sorted:
+            grams = _trigrams(name)
+            self._name_trigrams[name] = len(grams)
+            for gram in grams:
+                self._trigrams[gram].append(name)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def resolve(self, query: str) -> Optional[str]:
+        key = normalize_city(query)
+        if not key:
+            return None
+        if key in self._names:
+            return key
+        i = bisect.bisect_left(self._sorted, key)
+        if i < len(self._sorted) and self._sorted[i].startswith(key):
+            return self._sorted[i]
+        return self._fuzzy(key)
+
+    def _fuzzy(self, key: str) -> Optional[str]:
+        grams = _trigrams(key)
+        shared: dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for name in self._trigrams.get(gram, ()):
+                shared[name] += 1
+        best, best_score = None, self.min_similarity
+        for name, count in shared.items():
+            score = count / (len(grams) + self._name_trigrams[name] - count)
+            if score > best_score:
+                best, best_score = name, score
+        return best
+
+
+class ReloadingCatalog:
+    """
+    ReloadingCatalog: Holds an immutable index built from a catalog file and rebuilds it
+    in a background thread when the file's mtime changes. Readers always see either the
+    old or the new index, never a partially built one.
+    """
+    def __init__(self, path: Optional[str] = None, default_records: Optional[list[dict]] = None,
+                 reload_interval: float = 2.0):
+        self.path = path
+        self.default_records = default_records or []
+        self.reload_interval = reload_interval
+        self._mtime: Optional[float] = None
+        # mtime of a version of the file that failed to load; retried once the file changes again.
+        self._failed_mtime: Optional[float] = None
+        self._index = self._load()
+        self._watcher: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls, env_var: str, default_records: Optional[list[dict]] = None):
+        catalog = cls(
+            path=os.getenv(env_var) or None,
+            default_records=default_records,
+            reload_interval=float(os.getenv('CATALOG_RELOAD_INTERVAL', '2.0')),
+        )
+        catalog.start_watching()
+        return catalog
+
+    def _load(self):
+        if not self.path:
+            return self._build(self.default_records)
+        # Read before loading: a write during the load changes it again and triggers another reload.
+        mtime = os.stat(self.path).st_mtime
+        started = time.perf_counter()
+        try:
+            records = load_records(self.path)
+            index = self._build(records)
+        except Exception:
+            self._failed_mtime = mtime
+            raise
+        # Only now: if the load failed, the watcher must not take this version as loaded.
+        self._mtime = mtime
+        logger.info('Loaded %d records from %s in %.2fs', len(records), self.path, time.perf_counter() - started)
+        return index
+
+    def start_watching(self) -> None:
+        if not self.path or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, name=f'{type(self).__name__}-reload', daemon=True)
+        self._watcher.start()
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(self.reload_interval)
+            try:
+                if os.stat(self.path).st_mtime not in (self._mtime, self._failed_mtime):
+                    self._index = self._load()
+            except Exception:
+                logger.exception('Reloading catalog %s failed; keeping the previous index', self.path)
+
+    def _build(self, records: list[dict]):
+        raise NotImplementedError
+
+
+class PlacesCatalog(ReloadingCatalog):
+    """Points of interest indexed by city. Records: {city, name, category, notes, ...}."""
+
+    def _build(self, records: list[dict]):
+        by_city: dict[str, list[dict]] = defaultdict(list)
+        by_category: dict[tuple, list[dict]] = defaultdict(list)
+        for record in records:
+            place = dict(record)
+            city = normalize_city(place.pop('city'))
+            by_city[city].append(place)
+            if place.get('category'):
+                by_category[(city, place['category'].casefold())].append(place)
+        return {'by_city': dict(by_city), 'by_category': dict(by_category), 'cities': CityIndex(by_city)}
+
+    def lookup(self, query: str, category: Optional[str] = None) -> tuple[Optional[str], list[dict]]:
+        """Return (matched city key, places) for a city name, prefix or misspelling."""
+        index = self._index
+        city = index['cities'].resolve(query)
+        if city is None:
+            return None, []
+        if category:
+            return city, index['by_category'].get((city, category.casefold()), [])
+        return city, index['by_city'][city]
+
+
+class EmployeesCatalog(ReloadingCatalog):
+    """
+    Employee records indexed by case-folded name and by location.
+    Records: {emp_id, name, location, ...}. Names need not be unique.
+    """
+
+    def _build(self, records: list[dict]):
+        by_name: dict[str, list[dict]] = defaultdict(list)
+        by_location: dict[str, list[dict]] = defaultdict(list)
+        employees = [dict(record) for record in records]
+        for employee in employees:
+            by_name[normalize_city(employee.get('name', ''))].append(employee)
+            if employee.get('location'):
+                by_location[normalize_city(employee['location'])].append(employee)
+        return {'all': employees, 'by_name': dict(by_name), 'by_location': dict(by_location)}
+
+    def find(self, name: str) -> list[dict]:
+        return self._index['by_name'].get(normalize_city(name), [])
+
+    def find_many(self, names: Iterable[str]) -> dict[str, list[dict]]:
+        by_name = self._index['by_name']
+        return {name: by_name.get(normalize_city(name), []) for name in names}
+
+    def listing(self, location: Optional[str] = None) -> list[dict]:
+        index = self._index
+        if location:
+            return index['by_location'].get(normalize_city(location), [])
+        return index['all']
+
+
+class SortedOptions:
+    """
+    SortedOptions: The options for one route, pre-sorted by price and by departure time so
+    price ceilings and departure windows are answered with a binary search.
+    """
+    __slots__ = ('by_price', 'prices', 'by_departure', 'departures')
+
+    def __init__(self, options: list[dict]):
+        self.by_price = sorted(options, key=_price)
+        self.prices = [_price(o) for o in self.by_price]
+        self.by_departure = sorted(options, key=_departure)
+        self.departures = [_departure(o) for o in self.by_departure]
+
+    def __len__(self) -> int:
+        return len(self.by_price)
+
+    def select(self, sort_by: str = 'price', max_price: Optional[float] = None,
+               depart_after: Optional[str] = None, depart_before: Optional[str] = None) -> list[dict]:
+        after = clock_minutes(depart_after) if depart_after else None
+        before = clock_minutes(depart_before) if depart_before else None
+        if sort_by == 'departure':
+            lo = bisect.bisect_left(self.departures, after) if after is not None else 0
+            if before is not None:
+                hi = bisect.bisect_right(self.departures, before)
+            elif after is not None:
+                # Options without a departure time never match a departure window.
+                hi = bisect.bisect_left(self.departures, NO_TIME)
+            else:
+                hi = len(self.departures)
+            items = self.by_departure[lo:hi]
+            if max_price is not None:
+                items = [o for o in items if _price(o) <= max_price]
+            return items
+        hi = bisect.bisect_right(self.prices, max_price) if max_price is not None else len(self.prices)
+        items = self.by_price[:hi]
+        if after is not None or before is not None:
+            lo_min = after if after is not None else 0
+            hi_min = before if before is not None else NO_TIME - 1
+            items = [o for o in items if lo_min <= _departure(o) <= hi_min]
+        return items
+
+
+class RoutesCatalog(ReloadingCatalog):
+    """
+    Transport legs indexed by (mode, source, destination), sorted by price and departure.
+    Records: {mode: flight|bus, source, destination, departure, arrival, price_usd, ...}.
+    Records without source/destination are templates used for any pair when the
+    catalog has no entry for it (the built-in stub data).
+    """
+    ROUTE_KEYS = ('mode', 'source', 'destination')
+
+    def _build(self, records: list[dict]):
+        by_pair: dict[tuple, list[dict]] = defaultdict(list)
+        templates: dict[str, list[dict]] = defaultdict(list)
+        cities = set()
+        for record in records:
+            option = {k: v for k, v in record.items() if k not in self.ROUTE_KEYS}
+            mode = record.get('mode', 'flight')
+            if record.get('source') is None or record.get('destination') is None:
+                templates[mode].append(option)
+                continue
+            source, destination = normalize_city(record['source']), normalize_city(record['destination'])
+            cities.update((source, destination))
+            by_pair[(mode, source, destination)].append(option)
+        return {
+            'by_pair': {key: SortedOptions(options) for key, options in by_pair.items()},
+            'templates': {mode: SortedOptions(options) for mode, options in templates.items()},
+            'cities': CityIndex(cities),
+        }
+
+    def match(self, source: str, destination: str, index: Optional[dict] = None) -> tuple[str, str]:
+        """The catalog's city keys for source and destination (exact, prefix or misspelling); unknown names as given."""
+        cities = (index or self._index)['cities']
+        return (cities.resolve(source) or normalize_city(source),
+                cities.resolve(destination) or normalize_city(destination))
+
+    def routes(self, mode: str, source: str, destination: str, **filters) -> list[dict]:
+        """
+        Options for a route. filters are passed to SortedOptions.select: sort_by
+        ('price' or 'departure'), max_price, depart_after and depart_before ("HH:MM").
+        """
+        index = self._index
+        src, dst = self.match(source, destination, index)
+        options = index['by_pair'].get((mode, src, dst))
+        if options is None:
+            options = index['templates'].get(mode)
+        return options.select(**filters) if options is not None else []
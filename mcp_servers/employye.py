@@ -1,8 +1,26 @@
 # mcp_server.py
+from typing import Optional
+
 from fastmcp import FastMCP
-import json
+from fastmcp.server.dependencies import get_http_headers
+
+from mcp_servers.catalog import EmployeesCatalog, paginate, project
+from mcp_servers.runner import offload_sync
+from utils.logging_config import configure_logging
+from utils.registry import register_service
+from utils.tracing import get_tracer, init_tracing, start_span
 
 mcp = FastMCP("My MCP Server")
+tracer = get_tracer(__name__)
+
+DEFAULT_EMPLOYEES = [
+    {"emp_id": "E003", "name": "Alex", "location": "Texas"},
+    {"emp_id": "E002", "name": "Coop", "location": "California"},
+    {"emp_id": "E009", "name": "Steve", "location": "Hawkins"}
+]
+
+# EMPLOYEES_CATALOG points at a JSONL/JSON/CSV/SQLite HR export of {emp_id, name, location, ...} records.
+employee_index = EmployeesCatalog.from_env("EMPLOYEES_CATALOG", default_records=DEFAULT_EMPLOYEES)
 
 @mcp.tool()
 def addition(a: int, b: int) -> int:
@@ -11,20 +29,49 @@ def addition(a: int, b: int) -> int:
     return c
 
 @mcp.tool()
-def employees(name: str = "") -> str:
-    """This tool provides you with information about the employees"""
-    emp_data = [
-        {"emp_id": "E003", "name": "Alex", "location": "Texas"},
-        {"emp_id": "E002", "name": "Coop", "location": "California"},
-        {"emp_id": "E009", "name": "Steve", "location": "Hawkins"}
-    ]
-    if name:
-        for employee in emp_data:
-            if employee["name"].lower() == name.lower():
-                return json.dumps(employee)
-        return "Employee not found"
-
-    return json.dumps(emp_data)
-
-if _name_ == "_main_":
-    mcp.run(transport="http", host="127.0.0.1", port=8000, path="/mcp")
\ No newline at end of file
+@offload_sync
+def employees(
+    name: str = "",
+    location: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[list[str]] = None,
+) -> dict:
+    """
+    This tool provides you with information about the employees.
+    With a name, returns the employees with that name (case-insensitive). Without one, lists
+    employees (optionally only those at a location) a page at a time: pass limit, then the
+    returned next_cursor to fetch the following page.
+    """
+    with start_span(tracer, "employees", parent=get_http_headers()):
+        if name:
+            matches = employee_index.find(name)
+            if not matches:
+                return {"name": name, "error": "Employee not found"}
+            return {"name": name, "employees": project(matches, fields)}
+        listing = employee_index.listing(location)
+        page, next_cursor = paginate(listing, limit, cursor)
+        response = {"employees": project(page, fields), "total": len(listing)}
+        if next_cursor:
+            response["next_cursor"] = next_cursor
+        return response
+
+@mcp.tool()
+@offload_sync
+def employees_batch(names: list[str], fields: Optional[list[str]] = None) -> dict:
+    """
+    Look up many employees by name in one call (case-insensitive).
+    Returns the matching employees per requested name and the names that were not found.
+    """
+    with start_span(tracer, "employees_batch", parent=get_http_headers()):
+        matches = employee_index.find_many(names)
+        return {
+            "employees": {name: project(found, fields) for name, found in matches.items() if found},
+            "not_found": [name for name, found in matches.items() if not found],
+        }
+
+if __name__ == "__main__":
+    configure_logging("EmployeeServer")
+    init_tracing("EmployeeServer")
+    register_service("EmployeeServer", "http://127.0.0.1:8000/mcp", {"kind": "mcp"})
+    mcp.run(transport="http", host="127.0.0.1", port=8000, path="/mcp", stateless_http=True)
@@ -0,0 +1,229 @@
+"""
+Multi-leg itinerary search over the transport catalog.
+
+Legs form a time-expanded graph: a leg can follow another when it leaves the
+arrival city within the allowed connection window. Searches run a k-best A*
+over that graph, with admissible heuristics from a reverse Dijkstra over the
+static city graph (cheapest leg price or shortest leg duration per city pair).
+"""
+import bisect
+import heapq
+from collections import defaultdict
+from typing import Optional
+
+from mcp_servers.catalog import NO_TIME, CityIndex, RoutesCatalog, clock_minutes, normalize_city
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class RouteNetwork:
+    """
+    RouteNetwork: Adjacency index over timetable legs. Legs are stored in parallel lists
+    and each city keeps its outgoing legs sorted by absolute departure minute, so the
+    connections out of an arrival are found with one binary search.
+    """
+    def __init__(self, records: list[dict]):
+        self.city_ids: dict[str, int] = {}
+        self.city_names: list[str] = []
+        self.dep: list[int] = []
+        self.arr: list[int] = []
+        self.src: list[int] = []
+        self.dst: list[int] = []
+        self.price: list[float] = []
+        self.records: list[dict] = []
+        for record in records:
+            if record.get('source') is None or record.get('destination') is None:
+                continue
+            dep_clock = clock_minutes(record.get('departure'))
+            if dep_clock == NO_TIME:
+                continue
+            day = int(record.get('day', 0) or 0)
+            departure = day * MINUTES_PER_DAY + dep_clock
+            if record.get('duration_min') is not None:
+                arrival = departure + int(record['duration_min'])
+            else:
+                arr_clock = clock_minutes(record.get('arrival'))
+                if arr_clock == NO_TIME:
+                    continue
+                arrival = day * MINUTES_PER_DAY + arr_clock
+                if arrival < departure:
+                    arrival += MINUTES_PER_DAY
+            self.dep.append(departure)
+            self.arr.append(arrival)
+            self.src.append(self._city_id(record['source']))
+            self.dst.append(self._city_id(record['destination']))
+            self.price.append(float(record.get('price_usd', 0.0)))
+            self.records.append(record)
+
+        outgoing: dict[int, list[int]] = defaultdict(list)
+        for leg in range(len(self.dep)):
+            outgoing[self.src[leg]].append(leg)
+        self.out_legs: dict[int, list[int]] = {}
+        self.out_deps: dict[int, list[int]] = {}
+        for city, legs in outgoing.items():
+            legs.sort(key=self.dep.__getitem__)
+            self.out_legs[city] = legs
+            self.out_deps[city] = [self.dep[leg] for leg in legs]
+
+        # Cheapest price and shortest duration per directed city pair, for the heuristics.
+        self._min_edge = {'price': {}, 'duration': {}}
+        for leg in range(len(self.dep)):
+            edge = (self.src[leg], self.dst[leg])
+            for metric, value in (('price', self.price[leg]), ('duration', self.arr[leg] - self.dep[leg])):
+                best = self._min_edge[metric].get(edge)
+                if best is None or value < best:
+                    self._min_edge[metric][edge] = value
+        # Reverse adjacency with edge weights, per metric: incoming[metric][city] = [(prev, weight), ...].
+        self._incoming: dict[str, dict[int, list[tuple[int, float]]]] = {}
+        for metric, edges in self._min_edge.items():
+            incoming = defaultdict(list)
+            for (src, dst), weight in edges.items():
+                incoming[dst].append((src, weight))
+            self._incoming[metric] = dict(incoming)
+        self._heuristics: dict[tuple, dict[int, float]] = {}
+        self.cities = CityIndex(self.city_ids)
+
+    def __len__(self) -> int:
+        return len(self.dep)
+
+    def _city_id(self, name: str) -> int:
+        key = normalize_city(name)
+        city = self.city_ids.get(key)
+        if city is None:
+            city = self.city_ids[key] = len(self.city_names)
+            self.city_names.append(name)
+        return city
+
+    def _lower_bounds(self, target: int, metric: str) -> dict[int, float]:
+        """Reverse Dijkstra from target: a lower bound on the remaining cost from every city."""
+        key = (target, metric)
+        bounds = self._heuristics.get(key)
+        if bounds is not None:
+            return bounds
+        incoming = self._incoming[metric]
+        bounds = {target: 0.0}
+        heap = [(0.0, target)]
+        inf = float('inf')
+        while heap:
+            cost, city = heapq.heappop(heap)
+            if cost > bounds[city]:
+                continue
+            for prev, weight in incoming.get(city, ()):
+                candidate = cost + weight
+                if candidate < bounds.get(prev, inf):
+                    bounds[prev] = candidate
+                    heapq.heappush(heap, (candidate, prev))
+        if len(self._heuristics) > 1024:
+            self._heuristics.clear()
+        self._heuristics[key] = bounds
+        return bounds
+
+    def search(
+        self,
+        source: str,
+        destination: str,
+        k: int = 3,
+        optimize: str = 'price',
+        depart_after: int = 0,
+        min_connection: int = 45,
+        max_connection: int = 360,
+        max_legs: int = 3,
+        modes: Optional[set[str]] = None,
+    ) -> list[list[int]]:
+        """Return up to k itineraries (lists of leg ids), best first by price or duration."""
+        origin_key, target_key = self.cities.resolve(source), self.cities.resolve(destination)
+        if origin_key is None or target_key is None or origin_key == target_key:
+            return []
+        origin, target = self.city_ids[origin_key], self.city_ids[target_key]
+        bounds = self._lower_bounds(target, optimize)
+        if origin not in bounds:
+            return []
+        by_price = optimize == 'price'
+
+        dep, arr, dst, price, records = self.dep, self.arr, self.dst, self.price, self.records
+        heap: list[tuple] = []
+        counter = 0
+
+        deps = self.out_deps.get(origin, [])
+        legs = self.out_legs.get(origin, [])
+        first = bisect.bisect_left(deps, depart_after)
+        last = bisect.bisect_right(deps, depart_after + MINUTES_PER_DAY)
+        for i in range(first, last):
+            leg = legs[i]
+            remaining = bounds.get(dst[leg])
+            if remaining is None or (modes and records[leg].get('mode', 'flight') not in modes):
+                continue
+            cost = price[leg] if by_price else arr[leg] - dep[leg]
+            counter += 1
+            heapq.heappush(heap, (cost + remaining, counter, cost, dep[leg], (leg,)))
+
+        # Labels settled per leg, as the number of legs used to reach it. Costs never decrease
+        # along the search, so once k labels reached a leg with no more legs used, a new label on
+        # that leg cannot lead to anything better than what they lead to.
+        settled: dict[int, list[int]] = defaultdict(list)
+        results: list[list[int]] = []
+        while heap and len(results) < k:
+            _, _, cost, start, path = heapq.heappop(heap)
+            leg = path[-1]
+            city = dst[leg]
+            if city == target:
+                results.append(list(path))
+                continue
+            hops = len(path)
+            labels = settled[leg]
+            if len(labels) >= k and sum(1 for h in labels if h <= hops) >= k:
+                continue
+            labels.append(hops)
+            if len(path) >= max_legs:
+                continue
+            last_hop = len(path) + 1 == max_legs
+            visited = {self.src[p] for p in path}
+            deps = self.out_deps.get(city, [])
+            legs = self.out_legs.get(city, [])
+            arrival = arr[leg]
+            lo = bisect.bisect_left(deps, arrival + min_connection)
+            hi = bisect.bisect_right(deps, arrival + max_connection)
+            for i in range(lo, hi):
+                nxt = legs[i]
+                nxt_city = dst[nxt]
+                if (last_hop and nxt_city != target) or nxt_city in visited:
+                    continue
+                remaining = bounds.get(nxt_city)
+                if remaining is None or (modes and records[nxt].get('mode', 'flight') not in modes):
+                    continue
+                next_cost = cost + price[nxt] if by_price else arr[nxt] - start
+                counter += 1
+                heapq.heappush(heap, (next_cost + remaining, counter, next_cost, start, path + (nxt,)))
+        return results
+
+    def describe(self, path: list[int]) -> dict:
+        legs = []
+        for leg in path:
+            record = self.records[leg]
+            legs.append({
+                **{k: v for k, v in record.items() if k not in ('source', 'destination', 'day')},
+                'mode': record.get('mode', 'flight'),
+                'source': self.city_names[self.src[leg]],
+                'destination': self.city_names[self.dst[leg]],
+                'departure_day': self.dep[leg] // MINUTES_PER_DAY,
+                'arrival_day': self.arr[leg] // MINUTES_PER_DAY,
+            })
+        return {
+            'legs': legs,
+            'connections': len(path) - 1,
+            'total_price_usd': round(sum(self.price[leg] for leg in path), 2),
+            'duration_min': self.arr[path[-1]] - self.dep[path[0]],
+        }
+
+
+class RouteSearchCatalog(RoutesCatalog):
+    """RoutesCatalog that also maintains a RouteNetwork for multi-leg searches."""
+
+    def _build(self, records: list[dict]):
+        index = super()._build(records)
+        index['network'] = RouteNetwork(records)
+        return index
+
+    @property
+    def network(self) -> RouteNetwork:
+        return self._index['network']
@@ -0,0 +1,263 @@
+"""
+Run an MCP server as several worker processes sharing one listening socket.
+
+    python -m mcp_servers.runner mcp_servers.transport_server --port 9000 --workers 4
+
+The parent binds the port and forks the workers; each worker imports the server
+module, builds its streamable-HTTP app and serves it with uvicorn on the shared
+socket, so the kernel spreads connections across workers. The app is stateless
+(stateless_http=True), since consecutive requests of a session may reach different
+workers. Sending SIGHUP to the parent restarts the workers one at a time (each
+replacement re-imports the module, picking up code and catalog changes) without
+closing the port; SIGTERM/SIGINT stops them all.
+"""
+import argparse
+import asyncio
+import functools
+import importlib
+import logging
+import os
+import select
+import signal
+import socket
+import time
+from typing import Callable, Optional
+
+import anyio
+
+from utils.logging_config import configure_logging, flush_logging
+from utils.registry import register_service
+from utils.tracing import init_tracing
+
+logger = logging.getLogger(__name__)
+
+# Registry names of the bundled servers, as ToolAgent resolves them (employye's FastMCP is "My MCP Server").
+SERVICE_NAMES = {
+    'mcp_servers.transport_server': 'TransportServer',
+    'mcp_servers.sightseeing_server': 'SightseeingServer',
+    'mcp_servers.employye': 'EmployeeServer',
+}
+
+_tool_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+def offload_sync(fn: Callable) -> Callable:
+    """
+    Run a synchronous tool in a worker thread so it never blocks the event loop.
+    Apply it below @mcp.tool(); the wrapper keeps fn's signature, so the tool schema is unchanged.
+    The number of threads per process is MCP_TOOL_THREADS (default 32).
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        global _tool_limiter
+        if _tool_limiter is None:
+            _tool_limiter = anyio.CapacityLimiter(int(os.getenv('MCP_TOOL_THREADS', '32')))
+        return await anyio.to_thread.run_sync(functools.partial(fn, *args, **kwargs), limiter=_tool_limiter)
+    return wrapper
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+async def _serve(server, sock: socket.socket, ready_fd: Optional[int]) -> None:
+    serving = asyncio.create_task(server.serve(sockets=[sock]))
+    if ready_fd is not None:
+        while not server.started and not serving.done():
+            await asyncio.sleep(0.05)
+        if server.started:
+            try:
+                os.write(ready_fd, b'1')
+            except OSError:
+                pass  # Nobody is waiting for this worker.
+        os.close(ready_fd)
+    await serving
+
+
+def serve_worker(module_name: str, sock: socket.socket, path: str, ready_fd: Optional[int] = None) -> None:
+    """
+    Worker process body: import the server module and serve its MCP app on the inherited socket.
+    A byte is written to ready_fd once the server accepts connections.
+    """
+    import uvicorn
+
+    for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+    module = importlib.import_module(module_name)
+    name = module.mcp.name
+    configure_logging(name)
+    init_tracing(name)
+    app = module.mcp.http_app(path=path, transport='streamable-http', stateless_http=True)
+    config = uvicorn.Config(app, log_config=None, timeout_graceful_shutdown=30)
+    asyncio.run(_serve(uvicorn.Server(config), sock, ready_fd))
+
+
+class Supervisor:
+    """
+    Supervisor: Forks and watches the worker processes of one MCP server. Workers that
+    exit unexpectedly are replaced, with exponential backoff while they keep crashing soon
+    after starting; a reload replaces them one at a time, stopping the old worker only once
+    its replacement is serving, so the port always has a live worker and a broken module
+    never takes down the healthy ones.
+    """
+    def __init__(self, module_name: str, sock: socket.socket, workers: int, path: str = '/mcp',
+                 startup_seconds: float = 30.0, stop_timeout: float = 35.0, backoff_base: float = 0.5,
+                 backoff_max: float = 60.0, healthy_seconds: float = 30.0):
+        self.module_name = module_name
+        self.sock = sock
+        self.workers = workers
+        self.path = path
+        self.startup_seconds = startup_seconds
+        self.stop_timeout = stop_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.healthy_seconds = healthy_seconds
+        # One slot per worker: its pid, or None while a crashed worker waits to be respawned.
+        self.pids: list[Optional[int]] = []
+        self._started_at: dict[int, float] = {}
+        self._respawn_at: dict[int, float] = {}
+        self._crash_streak = 0
+        self._reload = False
+        self._stopping = False
+
+    def spawn(self, ready_fd: Optional[int] = None) -> int:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                serve_worker(self.module_name, self.sock, self.path, ready_fd)
+            except BaseException:
+                logger.exception('Worker for %s crashed', self.module_name)
+                code = 1
+            finally:
+                # os._exit skips atexit; deliver the records still queued (the crash above included).
+                flush_logging()
+                os._exit(code)
+        self._started_at[pid] = time.monotonic()
+        logger.info('Started %s worker %d', self.module_name, pid)
+        return pid
+
+    def spawn_ready(self) -> Optional[int]:
+        """Spawn a worker and wait until it serves; None (and the worker stopped) if it does not in startup_seconds."""
+        read_fd, write_fd = os.pipe()
+        try:
+            pid = self.spawn(write_fd)
+            os.close(write_fd)
+            ready, _, _ = select.select([read_fd], [], [], self.startup_seconds)
+            signal_byte = os.read(read_fd, 1) if ready else None
+        finally:
+            os.close(read_fd)
+        if signal_byte == b'1':
+            return pid
+        if signal_byte == b'':
+            # The worker closed the pipe without serving: it is exiting.
+            _, status = os.waitpid(pid, 0)
+            self._started_at.pop(pid, None)
+            logger.error('New %s worker %d exited with status %d during startup', self.module_name, pid, status)
+        else:
+            logger.error('New %s worker %d did not start serving in %.0fs', self.module_name, pid, self.startup_seconds)
+            self.stop(pid)
+        return None
+
+    def stop(self, pid: int) -> None:
+        self._started_at.pop(pid, None)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        deadline = time.monotonic() + self.stop_timeout
+        while time.monotonic() < deadline:
+            done, _ = os.waitpid(pid, os.WNOHANG)
+            if done:
+                return
+            time.sleep(0.1)
+        logger.warning('Worker %d did not stop in %.0fs; killing it', pid, self.stop_timeout)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+    def rolling_restart(self) -> None:
+        logger.info('Reloading %d %s workers', len(self.pids), self.module_name)
+        for i, old in enumerate(list(self.pids)):
+            if self._stopping:
+                return
+            new = self.spawn_ready()
+            if new is None:
+                logger.error('Reload of %s aborted; the remaining workers keep running the old code', self.module_name)
+                return
+            self.pids[i] = new
+            self._respawn_at.pop(i, None)
+            if old is not None:
+                self.stop(old)
+
+    def reap(self) -> None:
+        """Schedule the replacement of workers that exited on their own."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            started_at = self._started_at.pop(pid, None)
+            if pid not in self.pids or self._stopping:
+                continue
+            now = time.monotonic()
+            if started_at is not None and now - started_at >= self.healthy_seconds:
+                self._crash_streak = 0
+            delay = min(self.backoff_max, self.backoff_base * 2 ** self._crash_streak) if self._crash_streak else 0.0
+            self._crash_streak += 1
+            logger.warning('Worker %d exited with status %d; restarting it in %.1fs', pid, status, delay)
+            slot = self.pids.index(pid)
+            self.pids[slot] = None
+            self._respawn_at[slot] = now + delay
+
+    def respawn_due(self) -> None:
+        now = time.monotonic()
+        for slot, due in list(self._respawn_at.items()):
+            if due <= now:
+                del self._respawn_at[slot]
+                self.pids[slot] = self.spawn()
+
+    def run(self) -> None:
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, '_reload', True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, '_stopping', True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, '_stopping', True))
+        self.pids = [self.spawn() for _ in range(self.workers)]
+        while not self._stopping:
+            time.sleep(0.5)
+            if self._reload:
+                self._reload = False
+                self.rolling_restart()
+            self.reap()
+            self.respawn_due()
+        logger.info('Stopping %d %s workers', len(self.pids), self.module_name)
+        for pid in self.pids:
+            if pid is not None:
+                self.stop(pid)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Run an MCP server with several worker processes.')
+    parser.add_argument('module', help='Server module defining `mcp`, e.g. mcp_servers.transport_server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, required=True)
+    parser.add_argument('--path', default='/mcp')
+    parser.add_argument('--service', help='Name in the service registry (default: e.g. TransportServer, or the server\'s mcp.name)')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('MCP_WORKERS', str(os.cpu_count() or 1))))
+    args = parser.parse_args()
+    configure_logging('mcp_runner')
+    sock = bind_socket(args.host, args.port)
+    logger.info('Serving %s on %s:%d%s with %d workers', args.module, args.host, args.port, args.path, args.workers)
+    # Registered under the name ToolAgent resolves; other servers under the name they give themselves.
+    service = args.service or SERVICE_NAMES.get(args.module) or importlib.import_module(args.module).mcp.name
+    register_service(service, f'http://{args.host}:{args.port}{args.path}', {'kind': 'mcp', 'workers': args.workers})
+    Supervisor(args.module, sock, args.workers, path=args.path).run()
+
+
+if __name__ == '__main__':
+    main()
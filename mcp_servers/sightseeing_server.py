@@ -1,42 +1,66 @@
+from typing import Optional
+
 from fastmcp import FastMCP
+from fastmcp.server.dependencies import get_http_headers
+
+from mcp_servers.catalog import PlacesCatalog, normalize_city, paginate, project
+from mcp_servers.runner import offload_sync
+from utils.logging_config import configure_logging
+from utils.registry import register_service
+from utils.tracing import get_tracer, init_tracing, start_span
 
 mcp = FastMCP("SightseeingServer")
+tracer = get_tracer(__name__)
+
+DEFAULT_PLACES = [
+    {"city": "Paris", "name": "Eiffel Tower", "category": "Landmark", "notes": "Book tickets in advance"},
+    {"city": "Paris", "name": "Louvre Museum", "category": "Museum", "notes": "Closed Tuesdays"},
+    {"city": "Paris", "name": "Montmartre", "category": "Neighborhood", "notes": "Great for sunset views"},
+    {"city": "Rome", "name": "Colosseum", "category": "Landmark", "notes": "Try the underground tour"},
+    {"city": "Rome", "name": "Pantheon", "category": "Historic Temple", "notes": "Free entry"},
+    {"city": "Rome", "name": "Trastevere", "category": "Neighborhood", "notes": "Charming evening vibe"},
+    {"city": "Goa", "name": "Baga Beach", "category": "Beach", "notes": "Water-sports hub"},
+    {"city": "Goa", "name": "Basilica of Bom Jesus", "category": "UNESCO Church", "notes": "Baroque architecture"},
+    {"city": "Goa", "name": "Dudhsagar Falls", "category": "Waterfall", "notes": "Best just after monsoon"},
+]
+
+GENERIC_RECOMMENDATIONS = [
+    {"name": "Central Park", "category": "Park", "notes": "Iconic urban green space"},
+    {"name": "City Museum", "category": "Museum", "notes": "Check special exhibits"},
+    {"name": "Old Town Market", "category": "Market", "notes": "Local crafts & street food"},
+]
+
+# SIGHTSEEING_CATALOG points at a JSONL/JSON/CSV/SQLite file of {city, name, category, notes} records.
+places = PlacesCatalog.from_env("SIGHTSEEING_CATALOG", default_records=DEFAULT_PLACES)
 
 @mcp.tool(name="PlacesToSee")
-def places_to_see(query: str) -> dict:
+@offload_sync
+def places_to_see(
+    query: str,
+    category: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[list[str]] = None,
+) -> dict:
     """
     Return a curated list of must-visit places for the given query.
+    City names are matched exactly, by prefix or approximately (e.g. "Rom" or "Paaris").
+    Optional: category filter, limit/cursor for paging and fields to return only some keys.
     """
-    key = query.lower()
-    hardcoded = {
-        "paris": [
-            {"name": "Eiffel Tower", "category": "Landmark", "notes": "Book tickets in advance"},
-            {"name": "Louvre Museum", "category": "Museum", "notes": "Closed Tuesdays"},
-            {"name": "Montmartre", "category": "Neighborhood", "notes": "Great for sunset views"},
-        ],
-        "rome": [
-            {"name": "Colosseum", "category": "Landmark", "notes": "Try the underground tour"},
-            {"name": "Pantheon", "category": "Historic Temple", "notes": "Free entry"},
-            {"name": "Trastevere", "category": "Neighborhood", "notes": "Charming evening vibe"},
-        ],
-        "goa": [
-            {"name": "Baga Beach", "category": "Beach", "notes": "Water-sports hub"},
-            {"name": "Basilica of Bom Jesus", "category": "UNESCO Church", "notes": "Baroque architecture"},
-            {"name": "Dudhsagar Falls", "category": "Waterfall", "notes": "Best just after monsoon"},
-        ],
-    }
-    recommendations = hardcoded.get(
-        key,
-        [
-            {"name": "Central Park", "category": "Park", "notes": "Iconic urban green space"},
-            {"name": "City Museum", "category": "Museum", "notes": "Check special exhibits"},
-            {"name": "Old Town Market", "category": "Market", "notes": "Local crafts & street food"},
-        ],
-    )
-    return {"query": query, "recommendations": recommendations}
+    with start_span(tracer, "PlacesToSee", parent=get_http_headers()):
+        city, recommendations = places.lookup(query, category)
+        if city is None:
+            recommendations = GENERIC_RECOMMENDATIONS
+        page, next_cursor = paginate(recommendations, limit, cursor)
+        response = {"query": query, "recommendations": project(page, fields), "total": len(recommendations)}
+        if next_cursor:
+            response["next_cursor"] = next_cursor
+        if city and city != normalize_city(query):
+            response["matched_city"] = city
+        return response
 
 if __name__ == "__main__":
-    mcp.run(transport="streamable-http", host="127.0.0.1", port=9002)
-
-
-
+    configure_logging("SightseeingServer")
+    init_tracing("SightseeingServer")
+    register_service("SightseeingServer", "http://127.0.0.1:9002/mcp", {"kind": "mcp"})
+    mcp.run(transport="streamable-http", host="127.0.0.1", port=9002, stateless_http=True)
@@ -1,56 +1,154 @@
+from typing import Literal, Optional
+
 from fastmcp import FastMCP
+from fastmcp.server.dependencies import get_http_headers
+
+from mcp_servers.catalog import clock_minutes, normalize_city, paginate, project
+from mcp_servers.route_search import MINUTES_PER_DAY, RouteSearchCatalog
+from mcp_servers.runner import offload_sync
+from utils.logging_config import configure_logging
+from utils.registry import register_service
+from utils.tracing import get_tracer, init_tracing, start_span
+
+mcp = FastMCP("TransportServer")
+tracer = get_tracer(__name__)
+
+# Stub options returned for any pair when no TRANSPORT_CATALOG is configured.
+DEFAULT_ROUTES = [
+    {"mode": "flight", "airline": "Air Sample", "flight_no": "AS123", "departure": "09:00", "arrival": "11:30", "price_usd": 150.0},
+    {"mode": "flight", "airline": "Demo Air", "flight_no": "DA456", "departure": "18:45", "arrival": "21:15", "price_usd": 175.0},
+    {"mode": "bus", "operator": "Sample Travels", "departure": "07:00", "arrival": "13:00", "price_usd": 35.0},
+    {"mode": "bus", "operator": "Demo Bus Co.", "departure": "23:00", "arrival": "05:30", "price_usd": 32.0},
+]
+
+# TRANSPORT_CATALOG points at a JSONL/JSON/CSV/SQLite file of
+# {mode, source, destination, departure, arrival, price_usd, airline/flight_no or operator} records.
+routes = RouteSearchCatalog.from_env("TRANSPORT_CATALOG", default_records=DEFAULT_ROUTES)
 
-mcp = FastMCP("TransportServer",stateless_http=True)
+def _options_response(mode: str, source: str, destination: str, limit: Optional[int], cursor: Optional[str],
+                      max_price: Optional[float], depart_after: Optional[str], depart_before: Optional[str],
+                      sort_by: str, fields: Optional[list[str]]) -> tuple[list[dict], dict]:
+    options = routes.routes(
+        mode, source, destination,
+        sort_by=sort_by, max_price=max_price, depart_after=depart_after, depart_before=depart_before,
+    )
+    page, next_cursor = paginate(options, limit, cursor)
+    extra = {"total": len(options)}
+    if next_cursor:
+        extra["next_cursor"] = next_cursor
+    extra.update(_matched(source, destination, *routes.match(source, destination)))
+    return project(page, fields), extra
+
+def _matched(source: str, destination: str, matched_source: Optional[str], matched_destination: Optional[str]) -> dict:
+    """The cities actually used, where a prefix or misspelling resolved to a different one (as PlacesToSee's matched_city)."""
+    matched = {}
+    if matched_source and matched_source != normalize_city(source):
+        matched["matched_source"] = matched_source
+    if matched_destination and matched_destination != normalize_city(destination):
+        matched["matched_destination"] = matched_destination
+    return matched
 
 @mcp.tool(name="FlightDetailsTool")
-def flight_details(source: str, destination: str) -> dict:
+@offload_sync
+def flight_details(
+    source: str,
+    destination: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    max_price: Optional[float] = None,
+    depart_after: Optional[str] = None,
+    depart_before: Optional[str] = None,
+    sort_by: Literal["price", "departure"] = "price",
+    fields: Optional[list[str]] = None,
+) -> dict:
     """
-    Stub endpoint for flight options between two cities.
+    Flight options between two cities, cheapest (or earliest, with sort_by="departure") first.
+    Optional: limit/cursor for paging, max_price, a departure window ("HH:MM") and
+    fields to return only some keys of each flight.
     """
-    return {
-        "source": source,
-        "destination": destination,
-        "flights": [
-            {
-                "airline": "Air Sample",
-                "flight_no": "AS123",
-                "departure": "09:00",
-                "arrival": "11:30",
-                "price_usd": 150.0,
-            },
-            {
-                "airline": "Demo Air",
-                "flight_no": "DA456",
-                "departure": "18:45",
-                "arrival": "21:15",
-                "price_usd": 175.0,
-            },
-        ],
-    }
+    with start_span(tracer, "FlightDetailsTool", parent=get_http_headers()):
+        flights, extra = _options_response(
+            "flight", source, destination, limit, cursor, max_price, depart_after, depart_before, sort_by, fields,
+        )
+        return {
+            "source": source,
+            "destination": destination,
+            "flights": flights,
+            **extra,
+        }
 
 @mcp.tool(name="BusDetailsTool")
-def bus_details(source: str, destination: str) -> dict:
+@offload_sync
+def bus_details(
+    source: str,
+    destination: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    max_price: Optional[float] = None,
+    depart_after: Optional[str] = None,
+    depart_before: Optional[str] = None,
+    sort_by: Literal["price", "departure"] = "price",
+    fields: Optional[list[str]] = None,
+) -> dict:
+    """
+    Inter-city bus options, cheapest (or earliest, with sort_by="departure") first.
+    Optional: limit/cursor for paging, max_price, a departure window ("HH:MM") and
+    fields to return only some keys of each bus.
+    """
+    with start_span(tracer, "BusDetailsTool", parent=get_http_headers()):
+        buses, extra = _options_response(
+            "bus", source, destination, limit, cursor, max_price, depart_after, depart_before, sort_by, fields,
+        )
+        return {
+            "source": source,
+            "destination": destination,
+            "buses": buses,
+            **extra,
+        }
+
+@mcp.tool(name="RouteSearchTool")
+@offload_sync
+def route_search(
+    source: str,
+    destination: str,
+    k: int = 3,
+    optimize: Literal["price", "duration"] = "price",
+    depart_after: Optional[str] = None,
+    day: int = 0,
+    min_connection_min: int = 45,
+    max_connection_min: int = 360,
+    max_legs: int = 3,
+    modes: Optional[list[Literal["flight", "bus"]]] = None,
+) -> dict:
     """
-    Stub endpoint for inter-city bus options.
+    Multi-leg itineraries between two cities combining flight and bus legs, e.g. Paris to Goa.
+    Returns the k cheapest (optimize="price") or fastest (optimize="duration") itineraries
+    departing on or after day/depart_after ("HH:MM"), with each connection between
+    min_connection_min and max_connection_min minutes and at most max_legs legs.
     """
-    return {
-        "source": source,
-        "destination": destination,
-        "buses": [
-            {
-                "operator": "Sample Travels",
-                "departure": "07:00",
-                "arrival": "13:00",
-                "price_usd": 35.0,
-            },
-            {
-                "operator": "Demo Bus Co.",
-                "departure": "23:00",
-                "arrival": "05:30",
-                "price_usd": 32.0,
-            },
-        ],
-    }
+    with start_span(tracer, "RouteSearchTool", parent=get_http_headers()):
+        start = day * MINUTES_PER_DAY + (clock_minutes(depart_after) if depart_after else 0)
+        network = routes.network
+        paths = network.search(
+            source, destination,
+            k=max(1, min(k, 20)),
+            optimize=optimize,
+            depart_after=start,
+            min_connection=min_connection_min,
+            max_connection=max_connection_min,
+            max_legs=max(1, min(max_legs, 6)),
+            modes=set(modes) if modes else None,
+        )
+        return {
+            "source": source,
+            "destination": destination,
+            **_matched(source, destination, network.cities.resolve(source), network.cities.resolve(destination)),
+            "optimize": optimize,
+            "itineraries": [network.describe(path) for path in paths],
+        }
 
 if __name__ == "__main__":
-    mcp.run(transport="streamable-http", host="127.0.0.1", port=9000)
+    configure_logging("TransportServer")
+    init_tracing("TransportServer")
+    register_service("TransportServer", "http://127.0.0.1:9000/mcp", {"kind": "mcp"})
+    mcp.run(transport="streamable-http", host="127.0.0.1", port=9000, stateless_http=True)
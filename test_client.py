@@ -1,56 +1,75 @@
 import logging
 import asyncio
-from typing import Any, TypedDict, Optional, List, Dict
+import operator
+import os
+from typing import Annotated, Any, AsyncIterator, TypedDict, Optional, List, Dict
 from uuid import uuid4
+import json
+import click
 import httpx
 
-from a2a.client import A2ACardResolver, A2AClient
 from a2a.types import (
-    AgentCard,
+    JSONRPCErrorResponse,
+    MessageSendConfiguration,
     MessageSendParams,
+    Part,
     SendMessageRequest,
     SendMessageResponse,
+    SendStreamingMessageRequest,
+    TaskArtifactUpdateEvent,
+    TaskState,
+    TaskStatusUpdateEvent,
 )
 
-from langgraph.graph import StateGraph, END
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.graph import StateGraph, START
+
+from utils.artifact_codec import JSON, TEXT, choose_mode, decode_parts, encode_artifact, supported_modes
+from utils.logging_config import configure_logging, payload
+from utils.registry import BalancedA2AClient
+from utils.tracing import get_tracer, init_tracing, start_span, trace_metadata
 
 PLANNER_URL = 'http://localhost:11000'
 ORCHESTRATOR_URL = 'http://localhost:11001'
 REFLECTOR_URL = 'http://localhost:11003'
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
+tracer = get_tracer(__name__)
 
-class NodeOutput(TypedDict, total=False):
-    node_name: str
-    raw_response: SendMessageResponse
-    extracted_artifact_name: Optional[str]
-    extracted_artifact_text: Optional[str]
+# State artifact fields in pipeline order, with the node that produces each.
+ARTIFACT_NODES = {
+    'planned_tasks': 'planner',
+    'orchestrated_results': 'orchestrator',
+    'final_answer': 'reflector',
+}
 
-class AgentState(TypedDict):
+class AgentState(TypedDict, total=False):
     user_input: str
-    history: List[NodeOutput]
-
-async def fetch_agent_card(httpx_client: httpx.AsyncClient, base_url: str) -> AgentCard:
-    logger.debug(f"Fetching agent card from {base_url}...")
-    resolver = A2ACardResolver(httpx_client=httpx_client, base_url=base_url)
-    card = await resolver.get_agent_card()
-    logger.debug(f"Agent card fetched for {base_url}: {card.name}")
-    return card
+    # A2A contextId shared by every turn of a conversation; follow-ups are replanned incrementally.
+    context_id: Optional[str]
+    planned_tasks: Optional[str]
+    orchestrated_results: Optional[str]
+    final_answer: Optional[str]
+    # Raw A2A responses per node, as JSON; only filled when KEEP_RAW_RESPONSES is set.
+    raw_responses: Annotated[Dict[str, Any], operator.or_]
 
-async def call_a2a_agent(
-    client: A2AClient,
+def _message_params(
     text: str,
     artifact_name: Optional[str] = None,
     artifact_text: Optional[str] = None,
     context_id: Optional[str] = None,
     task_id: Optional[str] = None,
-) -> SendMessageResponse:
-    message_parts = [{'kind': 'text', 'text': text}]
+    metadata: Optional[dict] = None,
+    blocking: bool = True,
+    parts: Optional[List[Part]] = None,
+    accepted_output_modes: Optional[List[str]] = None,
+) -> MessageSendParams:
+    message_parts = [{'kind': 'text', 'text': text}] + list(parts or [])
     message = {
         'role': 'user',
         'parts': message_parts,
         'messageId': uuid4().hex,
+        'metadata': trace_metadata(metadata),
     }
     if context_id:
         message['contextId'] = context_id
@@ -63,168 +82,355 @@ async def call_a2a_agent(
             'parts': [{'kind': 'text', 'text': artifact_text}]
         }]
     params = MessageSendParams(message=message, artifacts=artifacts_list) if artifacts_list else MessageSendParams(message=message)
-    request = SendMessageRequest(id=str(uuid4()), params=params)
+    if not blocking:
+        # Return as soon as the agent has accepted the task.
+        params.configuration = MessageSendConfiguration(acceptedOutputModes=accepted_output_modes or [TEXT], blocking=False)
+    elif accepted_output_modes:
+        params.configuration = MessageSendConfiguration(acceptedOutputModes=accepted_output_modes, blocking=True)
+    return params
+
+async def call_a2a_agent(client: BalancedA2AClient, text: str, **kwargs: Any) -> SendMessageResponse:
+    """Send text (plus the options of _message_params) and wait for the agent's final task."""
+    request = SendMessageRequest(id=str(uuid4()), params=_message_params(text, **kwargs))
     response = await client.send_message(request)
-    logger.debug(f"Received response from agent.")
+    logger.debug("Received response from agent.")
     return response
 
-def _find_extracted_artifact(
-    history: List[NodeOutput], 
-    source_node_name: str, 
-    artifact_name: str
-) -> Optional[str]:
-    for entry in reversed(history):
-        if entry.get('node_name') == source_node_name and \
-           entry.get('extracted_artifact_name') == artifact_name:
-            return entry.get('extracted_artifact_text')
+async def stream_a2a_agent(client: BalancedA2AClient, text: str, **kwargs: Any) -> AsyncIterator[Any]:
+    """Send text like call_a2a_agent, yielding the task and its status and artifact updates as they arrive."""
+    request = SendStreamingMessageRequest(id=str(uuid4()), params=_message_params(text, **kwargs))
+    async for response in client.send_message_streaming(request):
+        if isinstance(response.root, JSONRPCErrorResponse):
+            raise RuntimeError(f"Agent error: {response.root.error.message}")
+        yield response.root.result
+
+def _artifact_text(artifact) -> str:
+    """The artifact as text; encoded artifacts (see utils/artifact_codec.py) are decoded to compact JSON."""
+    value = decode_parts(artifact.parts, artifact.name)
+    if value is not None:
+        return json.dumps(value, separators=(',', ':'))
+    return artifact.parts[0].root.text
+
+def _extract_artifact(response: SendMessageResponse, artifact_name: str) -> Optional[str]:
+    for artifact in getattr(response.root.result, 'artifacts', None) or []:
+        if artifact.name == artifact_name:
+            return _artifact_text(artifact)
     return None
 
+def _node_update(node_name: str, artifact_name: str, artifact_text: Optional[str],
+                 response: SendMessageResponse, keep_raw: bool) -> AgentState:
+    """The node's partial state update; the raw response is included only in debug mode."""
+    update: AgentState = {artifact_name: artifact_text}
+    if keep_raw:
+        update['raw_responses'] = {node_name: response.model_dump(mode='json', exclude_none=True)}
+    return update
+
+class PrefetchNode:
+    """
+    Runs alongside the Planner: asks the Orchestrator to speculatively run the tool calls the
+    plan will probably contain, so their results are cached by the time the plan arrives.
+    The request is non-blocking and best effort; it never fails the run.
+    """
+    def __init__(self, client: BalancedA2AClient):
+        self.client = client
+        self.node_name = 'prefetch'
+    async def __call__(self, state: AgentState) -> AgentState:
+        try:
+            with start_span(tracer, f'{self.node_name}_node'):
+                await call_a2a_agent(
+                    self.client, state['user_input'],
+                    metadata={'prefetch': True, 'priority': -1}, blocking=False,
+                )
+        except Exception as e:
+            logger.info("Prefetch request failed: %s", e)
+        return {}
+
 class PlannerNode:
-    def __init__(self, client: A2AClient):
+    def __init__(self, client: BalancedA2AClient, keep_raw: bool = False):
         self.client = client
+        self.keep_raw = keep_raw
         self.node_name = 'planner'
     async def __call__(self, state: AgentState) -> AgentState:
         logger.info(f'--- Node: Calling {self.node_name.capitalize()}Agent ---')
         user_input = state['user_input']
-        response = await call_a2a_agent(self.client, user_input)
+        with start_span(tracer, f'{self.node_name}_node'):
+            response = await call_a2a_agent(self.client, user_input, context_id=state.get('context_id'))
         if not hasattr(response.root, "result"):
             logger.error(f"{self.node_name.capitalize()}Agent returned error: {getattr(response.root, 'error', 'Unknown error')}")
             raise RuntimeError(f"{self.node_name.capitalize()}Agent error: {getattr(response.root, 'error', 'Unknown error')}")
-        planned_tasks = None
-        for artifact in getattr(response.root.result, 'artifacts', []):
-            if artifact.name == 'planned_tasks':
-                planned_tasks = artifact.parts[0].root.text
-                break
+        planned_tasks = _extract_artifact(response, 'planned_tasks')
         if not planned_tasks:
             logger.error(f'Error: No "planned_tasks" artifact found in {self.node_name.capitalize()}Agent response.')
             raise RuntimeError(f'No "planned_tasks" artifact found in {self.node_name.capitalize()}Agent response. Cannot proceed.')
-        node_output: NodeOutput = {
-            'node_name': self.node_name,
-            'raw_response': response,
-            'extracted_artifact_name': 'planned_tasks',
-            'extracted_artifact_text': planned_tasks
-        }
-        state['history'].append(node_output)
-        logger.info(f"{self.node_name.capitalize()}Agent returned planned_tasks: {planned_tasks[::]}...")
-        return state
+        logger.info("%sAgent returned planned_tasks: %s", self.node_name.capitalize(), payload(planned_tasks))
+        return _node_update(self.node_name, 'planned_tasks', planned_tasks, response, self.keep_raw)
 
 class OrchestratorNode:
-    def __init__(self, client: A2AClient):
+    def __init__(self, client: BalancedA2AClient, keep_raw: bool = False):
         self.client = client
+        self.keep_raw = keep_raw
         self.node_name = 'orchestrator'
     async def __call__(self, state: AgentState) -> AgentState:
         logger.info(f'--- Node: Calling {self.node_name.capitalize()}Agent ---')
-        planned_tasks = _find_extracted_artifact(state['history'], 'planner', 'planned_tasks')
+        planned_tasks = state.get('planned_tasks')
         if not planned_tasks:
-            logger.error(f'Error: "planned_tasks" not available in history for {self.node_name.capitalize()}Agent.')
+            logger.error(f'Error: "planned_tasks" not available in state for {self.node_name.capitalize()}Agent.')
             raise RuntimeError(f'"planned_tasks" not available for {self.node_name.capitalize()}Agent. Cannot proceed.')
-        response = await call_a2a_agent(
-            self.client, 
-            text=planned_tasks,
-            artifact_name='planned_tasks', 
-            artifact_text=planned_tasks
-        )
+        with start_span(tracer, f'{self.node_name}_node'):
+            response = await call_a2a_agent(
+                self.client, 
+                text=planned_tasks,
+                artifact_name='planned_tasks', 
+                artifact_text=planned_tasks,
+                context_id=state.get('context_id'),
+                accepted_output_modes=supported_modes(),
+            )
         if not hasattr(response.root, "result"):
             logger.error(f"{self.node_name.capitalize()}Agent returned error: {getattr(response.root, 'error', 'Unknown error')}")
             raise RuntimeError(f"{self.node_name.capitalize()}Agent error: {getattr(response.root, 'error', 'Unknown error')}")
-        orchestrated_results = None
-        for artifact in getattr(response.root.result, 'artifacts', []):
-            if artifact.name == 'orchestrated_results':
-                orchestrated_results = artifact.parts[0].root.text
-                break
+        orchestrated_results = _extract_artifact(response, 'orchestrated_results')
         if not orchestrated_results:
             logger.error(f'Error: No "orchestrated_results" artifact found in {self.node_name.capitalize()}Agent response.')
             raise RuntimeError(f'No "orchestrated_results" artifact found in {self.node_name.capitalize()}Agent response. Cannot proceed.')
-        node_output: NodeOutput = {
-            'node_name': self.node_name,
-            'raw_response': response,
-            'extracted_artifact_name': 'orchestrated_results',
-            'extracted_artifact_text': orchestrated_results
-        }
-        state['history'].append(node_output)
-        logger.info(f"{self.node_name.capitalize()}Agent returned orchestrated_results (first 100 chars): {orchestrated_results[:100]}...")
-        return state
+        logger.info("%sAgent returned orchestrated_results: %s", self.node_name.capitalize(), payload(orchestrated_results, 100))
+        return _node_update(self.node_name, 'orchestrated_results', orchestrated_results, response, self.keep_raw)
 
 class ReflectorNode:
-    def __init__(self, client: A2AClient):
+    def __init__(self, client: BalancedA2AClient, keep_raw: bool = False):
         self.client = client
+        self.keep_raw = keep_raw
         self.node_name = 'reflector'
     async def __call__(self, state: AgentState) -> AgentState:
         logger.info(f'--- Node: Calling {self.node_name.capitalize()}Agent ---')
-        orchestrated_results = _find_extracted_artifact(state['history'], 'orchestrator', 'orchestrated_results')
+        orchestrated_results = state.get('orchestrated_results')
         if not orchestrated_results:
-            logger.error(f'Error: "orchestrated_results" not available in history for {self.node_name.capitalize()}Agent.')
+            logger.error(f'Error: "orchestrated_results" not available in state for {self.node_name.capitalize()}Agent.')
             raise RuntimeError(f'"orchestrated_results" not available for {self.node_name.capitalize()}Agent. Cannot proceed.')
-        response = await call_a2a_agent(self.client, orchestrated_results)
-        node_output: NodeOutput = {
-            'node_name': self.node_name,
-            'raw_response': response,
-        }
-        state['history'].append(node_output)
+        with start_span(tracer, f'{self.node_name}_node'):
+            text, parts = await self._encode(orchestrated_results)
+            response = await call_a2a_agent(self.client, text, parts=parts, context_id=state.get('context_id'))
+        if not hasattr(response.root, "result"):
+            logger.error(f"{self.node_name.capitalize()}Agent returned error: {getattr(response.root, 'error', 'Unknown error')}")
+            raise RuntimeError(f"{self.node_name.capitalize()}Agent error: {getattr(response.root, 'error', 'Unknown error')}")
+        final_answer = _extract_artifact(response, 'final_answer')
         logger.info(f"{self.node_name.capitalize()}Agent response received. Processing complete.")
-        return state
+        return _node_update(self.node_name, 'final_answer', final_answer, response, self.keep_raw)
+    async def _encode(self, orchestrated_results: str) -> tuple[str, Optional[List[Part]]]:
+        """Message text and extra parts: the results encoded in a mode the Reflector's agent card accepts, if any."""
+        try:
+            input_modes = (await self.client.agent_card()).defaultInputModes
+        except Exception as e:
+            logger.info("Could not read the %sAgent card, sending text: %s", self.node_name.capitalize(), e)
+            return orchestrated_results, None
+        if choose_mode(input_modes) == TEXT:
+            return orchestrated_results, None
+        try:
+            results = json.loads(orchestrated_results)
+        except ValueError:
+            # Checkpointed before results were encoded (a Python repr); the Reflector still parses that.
+            return orchestrated_results, None
+        return 'orchestrated_results', encode_artifact('orchestrated_results', results, input_modes)
 
-async def main():
-    user_input = 'Plan a trip from Paris to Rome with sightseeing.'
-    async with httpx.AsyncClient(timeout=120.0) as httpx_client:
-        logger.info("Initializing A2A clients for Planner, Orchestrator, and Reflector...")
-        planner_card = await fetch_agent_card(httpx_client, PLANNER_URL)
-        planner_client = A2AClient(httpx_client=httpx_client, agent_card=planner_card)
-        logger.info(f"PlannerAgent client initialized for {PLANNER_URL}")
-        orchestrator_card = await fetch_agent_card(httpx_client, ORCHESTRATOR_URL)
-        orchestrator_client = A2AClient(httpx_client=httpx_client, agent_card=orchestrator_card)
-        logger.info(f"OrchestratorAgent client initialized for {ORCHESTRATOR_URL}")
-        reflector_card = await fetch_agent_card(httpx_client, REFLECTOR_URL)
-        reflector_client = A2AClient(httpx_client=httpx_client, agent_card=reflector_card)
-        logger.info(f"ReflectorAgent client initialized for {REFLECTOR_URL}")
-        graph = StateGraph(AgentState) 
-        graph.add_node('planner', PlannerNode(planner_client))
-        graph.add_node('orchestrator', OrchestratorNode(orchestrator_client))
-        graph.add_node('reflector', ReflectorNode(reflector_client))
+class PipelinedNode:
+    """
+    Orchestrator and Reflector overlapped: the Orchestrator streams each tool result as it
+    finishes, the Reflector summarizes it right away (one section per task, concurrently), and
+    once the last result is in, the Reflector merges the section summaries (and any results not
+    summarized yet) into the final answer. The slow tool calls then overlap the summarizing
+    instead of preceding all of it. Section calls still running at the merge are cancelled.
+    """
+    def __init__(self, orchestrator_client: BalancedA2AClient, reflector_client: BalancedA2AClient,
+                 keep_raw: bool = False):
+        self.orchestrator_client = orchestrator_client
+        self.reflector_client = reflector_client
+        self.keep_raw = keep_raw
+        self.node_name = 'pipelined'
+    async def __call__(self, state: AgentState) -> AgentState:
+        logger.info('--- Node: Calling OrchestratorAgent and ReflectorAgent, pipelined ---')
+        planned_tasks = state.get('planned_tasks')
+        if not planned_tasks:
+            raise RuntimeError('"planned_tasks" not available for OrchestratorAgent. Cannot proceed.')
+        sections: dict[int, tuple[dict, asyncio.Task]] = {}
+        orchestrated_results = None
+        try:
+            with start_span(tracer, f'{self.node_name}_node'):
+                async for event in stream_a2a_agent(
+                    self.orchestrator_client,
+                    text=planned_tasks,
+                    artifact_name='planned_tasks',
+                    artifact_text=planned_tasks,
+                    context_id=state.get('context_id'),
+                    metadata={'stream_results': True},
+                    accepted_output_modes=supported_modes(),
+                ):
+                    if isinstance(event, TaskArtifactUpdateEvent):
+                        if event.artifact.name == 'orchestrated_result':
+                            section = decode_parts(event.artifact.parts, 'orchestrated_result')
+                            if section is None:
+                                section = json.loads(event.artifact.parts[0].root.text)
+                            sections[section['index']] = (section, asyncio.create_task(self._summarize_section(section)))
+                        elif event.artifact.name == 'orchestrated_results':
+                            orchestrated_results = _artifact_text(event.artifact)
+                    elif isinstance(event, TaskStatusUpdateEvent) and event.status.state == TaskState.failed:
+                        raise RuntimeError('OrchestratorAgent failed the task.')
+                if not orchestrated_results:
+                    raise RuntimeError('No "orchestrated_results" artifact found in OrchestratorAgent response. Cannot proceed.')
+                # Results whose section is still being summarized go into the merge as they are,
+                # so the last (slowest) tool call is followed by the merge alone.
+                summaries = [
+                    task.result() if task.done() and not task.exception() else f"Task: {section['task']}\nResult: {section['result']}"
+                    for section, task in (sections[index] for index in sorted(sections))
+                ]
+                # The raw results go along, so a follow-up turn can be diffed against them.
+                response = await call_a2a_agent(
+                    self.reflector_client, json.dumps(summaries), context_id=state.get('context_id'),
+                    metadata={'reflect': 'merge'}, parts=await self._encode_results(orchestrated_results),
+                )
+        finally:
+            for _, task in sections.values():
+                task.cancel()
+            # Wait for the Reflector to be told about the cancelled section tasks.
+            await asyncio.gather(*(task for _, task in sections.values()), return_exceptions=True)
+        if not hasattr(response.root, "result"):
+            raise RuntimeError(f"ReflectorAgent error: {getattr(response.root, 'error', 'Unknown error')}")
+        logger.info("OrchestratorAgent returned orchestrated_results: %s", payload(orchestrated_results, 100))
+        update = _node_update('reflector', 'final_answer', _extract_artifact(response, 'final_answer'), response, self.keep_raw)
+        update['orchestrated_results'] = orchestrated_results
+        return update
+    async def _summarize_section(self, section: dict) -> str:
+        # Streamed, so that cancelling this coroutine cancels the Reflector task as well.
+        summary = None
+        async for event in stream_a2a_agent(self.reflector_client, json.dumps(section), metadata={'reflect': 'section'}):
+            if isinstance(event, TaskArtifactUpdateEvent) and event.artifact.name == 'section_summary':
+                summary = _artifact_text(event.artifact)
+            elif isinstance(event, TaskStatusUpdateEvent) and event.status.state == TaskState.failed:
+                raise RuntimeError('ReflectorAgent failed the task.')
+        logger.info("ReflectorAgent summarized task %d: %s", section['index'], payload(summary, 100))
+        return summary or ''
+    async def _encode_results(self, orchestrated_results: str) -> List[Part]:
+        """The results as an encoded part the Reflector reads next to the summaries; plain JSON if its card is unreadable."""
+        try:
+            input_modes = (await self.reflector_client.agent_card()).defaultInputModes
+        except Exception as e:
+            logger.info("Could not read the ReflectorAgent card, sending JSON: %s", e)
+            input_modes = []
+        # A text part would be read as part of the summaries.
+        accepted = [mode for mode in input_modes if mode != TEXT] or [JSON]
+        return encode_artifact('orchestrated_results', json.loads(orchestrated_results), accepted)
+
+def build_graph(planner_client, orchestrator_client, reflector_client, keep_raw: bool = False,
+                prefetch: bool = True, pipeline: bool = False) -> StateGraph:
+    graph = StateGraph(AgentState)
+    graph.add_node('planner', PlannerNode(planner_client, keep_raw))
+    if pipeline:
+        # One node runs both agents, overlapped; it fills orchestrated_results and final_answer.
+        graph.add_node('orchestrator', PipelinedNode(orchestrator_client, reflector_client, keep_raw))
+    else:
+        graph.add_node('orchestrator', OrchestratorNode(orchestrator_client, keep_raw))
+        graph.add_node('reflector', ReflectorNode(reflector_client, keep_raw))
+    graph.add_edge(START, 'planner')
+    if prefetch:
+        # Same superstep as the planner; it returns once the Orchestrator accepted the prefetch.
+        graph.add_node('prefetch', PrefetchNode(orchestrator_client))
+        graph.add_edge(START, 'prefetch')
+        graph.add_edge(['planner', 'prefetch'], 'orchestrator')
+    else:
         graph.add_edge('planner', 'orchestrator')
+    if pipeline:
+        graph.set_finish_point('orchestrator')
+    else:
         graph.add_edge('orchestrator', 'reflector')
-        graph.set_entry_point('planner')
         graph.set_finish_point('reflector')
-        app = graph.compile()
+    return graph
+
+def print_results(result_state: AgentState) -> None:
+    print("\n--- Final Results ---")
+    print(f"Original User Input: {result_state['user_input']}")
+    for artifact_name, node_name in ARTIFACT_NODES.items():
+        if artifact_name == 'final_answer':
+            continue
+        print(f"\n--- Output from Node: {node_name.capitalize()} ---")
+        artifact_text = result_state.get(artifact_name)
+        if artifact_text:
+            print(f"Extracted Artifact ('{artifact_name}'):\n{artifact_text}")
+        else:
+            print(f"Artifact '{artifact_name}' was requested but not extracted/found.")
+        raw_response = result_state.get('raw_responses', {}).get(node_name)
+        if raw_response:
+            logger.debug("Raw A2A Response from %s: %s", node_name, payload(raw_response))
+    final_answer = result_state.get('final_answer')
+    if final_answer:
+        print(f"\nReflector Agent's Final Message:\n{final_answer}")
+    else:
+        print("\nNo 'final_answer' artifact found in ReflectorAgent response.")
+    if result_state.get('context_id'):
+        print(f"\nFollow up on this trip with: --context-id {result_state['context_id']}")
+    print("\n------------------------------------------------------")
+
+async def main(user_input: str, run_id: Optional[str] = None, resume: bool = False,
+               checkpoint_db: str = 'checkpoints.sqlite', keep_raw: bool = False, prefetch: bool = True,
+               context_id: Optional[str] = None, pipeline: bool = False):
+    configure_logging('test_client')
+    init_tracing('test_client')
+    run_id = run_id or uuid4().hex
+    # Each finished node is checkpointed under the run id, so a failed run resumes after its last finished node,
+    # from this or any other process that can open the same database.
+    config = {'configurable': {'thread_id': run_id}}
+    async with httpx.AsyncClient(timeout=120.0) as httpx_client, \
+            AsyncSqliteSaver.from_conn_string(checkpoint_db) as checkpointer:
+        logger.info("Initializing A2A clients for Planner, Orchestrator, and Reflector...")
+        # Agents are resolved through the service registry; the URLs above are fallbacks.
+        planner_client = BalancedA2AClient(httpx_client, 'Planner Agent', PLANNER_URL)
+        orchestrator_client = BalancedA2AClient(httpx_client, 'Orchestrator Agent', ORCHESTRATOR_URL)
+        reflector_client = BalancedA2AClient(httpx_client, 'Reflector Agent', REFLECTOR_URL)
+        app = build_graph(
+            planner_client, orchestrator_client, reflector_client, keep_raw, prefetch, pipeline,
+        ).compile(checkpointer=checkpointer)
         logger.info("LangGraph workflow compiled successfully.")
-        initial_state: AgentState = {'user_input': user_input, 'history': []}
-        logger.info(f"\n--- Starting LangGraph execution for user input: '{user_input}' ---")
+        # Each turn is its own run; turns of one conversation share the agents' contextId.
+        graph_input: Optional[AgentState] = {'user_input': user_input, 'context_id': context_id or uuid4().hex}
+        if resume:
+            snapshot = await app.aget_state(config)
+            if not snapshot.values:
+                logger.error(f"No checkpoint found for run {run_id} in {checkpoint_db}.")
+                return
+            if not snapshot.next:
+                logger.info(f"Run {run_id} already completed.")
+                print_results(snapshot.values)
+                return
+            user_input = snapshot.values['user_input']
+            # A None input continues the checkpointed run at its next node.
+            graph_input = None
+            logger.info(f"\n--- Resuming run {run_id} at {', '.join(snapshot.next)} ---")
+        else:
+            logger.info(f"\n--- Starting LangGraph run {run_id} for user input: '{user_input}' ---")
         try:
-            result_state = await app.ainvoke(initial_state)
+            with start_span(tracer, 'trip_plan', attributes={'travel.user_input': user_input, 'travel.run_id': run_id}):
+                result_state = await app.ainvoke(graph_input, config)
             logger.info("\n--- LangGraph execution completed successfully! ---")
-            print("\n--- Final Results from LangGraph History ---")
-            print(f"Original User Input: {result_state['user_input']}")
-            for entry in result_state['history']:
-                print(f"\n--- Output from Node: {entry.get('node_name').capitalize()} ---")
-                raw_response = entry.get('raw_response')
-                if raw_response:
-                    print(f"Raw A2A Response:\n{raw_response.model_dump(mode='json', exclude_none=True)}")
-                extracted_artifact_name = entry.get('extracted_artifact_name')
-                extracted_artifact_text = entry.get('extracted_artifact_text')
-                if extracted_artifact_name and extracted_artifact_text:
-                    print(f"Extracted Artifact ('{extracted_artifact_name}'):\n{extracted_artifact_text}")
-                elif extracted_artifact_name:
-                    print(f"Artifact '{extracted_artifact_name}' was requested but not extracted/found.")
-            # After the loop, print only the last Reflector message
-            for entry in reversed(result_state['history']):
-                if entry.get('node_name') == 'reflector':
-                    raw_response = entry.get('raw_response')
-                    if raw_response:
-                        final_answer = None
-                        for artifact in getattr(raw_response.root.result, 'artifacts', []):
-                            if artifact.name == 'final_answer':
-                                final_answer = artifact.parts[0].root.text
-                                break
-                        if final_answer:
-                            print(f"\nReflector Agent's Final Message:\n{final_answer}")
-                        else:
-                            print("\nNo 'final_answer' artifact found in ReflectorAgent response.")
-                    break
-            print("\n------------------------------------------------------")
+            print_results(result_state)
         except RuntimeError as e:
             logger.error(f"Workflow failed due to a crucial step: {e}")
-        except Exception as e:
+            logger.error(f"Resume with: python test_client.py --run-id {run_id} --resume")
+        except Exception:
             logger.exception("An unexpected error occurred during workflow execution.")
+            logger.error(f"Resume with: python test_client.py --run-id {run_id} --resume")
+
+@click.command()
+@click.option('--input', 'user_input', default='Plan a trip from Paris to Rome with sightseeing.', help='Trip request.')
+@click.option('--run-id', default=None, help='Run ID to checkpoint under (default: a new one).')
+@click.option('--resume', is_flag=True, help='Continue the checkpointed run given by --run-id.')
+@click.option('--checkpoint-db', default=lambda: os.getenv('CHECKPOINT_DB', 'checkpoints.sqlite'), help='SQLite checkpoint file.')
+@click.option('--keep-raw', is_flag=True, default=lambda: bool(os.getenv('KEEP_RAW_RESPONSES')),
+              help='Also keep the raw A2A responses in the run state (debugging; default KEEP_RAW_RESPONSES).')
+@click.option('--prefetch/--no-prefetch', default=True, help='Speculatively warm tool results while the Planner runs.')
+@click.option('--context-id', default=None, help='Conversation to follow up on (printed by its previous turn).')
+@click.option('--pipeline', is_flag=True, help='Summarize each tool result while the Orchestrator runs the rest.')
+def cli(user_input, run_id, resume, checkpoint_db, keep_raw, prefetch, context_id, pipeline):
+    """Runs the Planner → Orchestrator → Reflector workflow."""
+    if resume and not run_id:
+        raise click.UsageError('--resume requires --run-id')
+    asyncio.run(main(user_input, run_id, resume, checkpoint_db, keep_raw, prefetch, context_id, pipeline))
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    cli()
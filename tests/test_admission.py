@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from utils.admission import AdmissionController, AdmissionRejected
+
+
+async def _hold(controller, order, label, priority=0, release=None):
+    async with controller.admit(priority):
+        order.append(label)
+        if release is not None:
+            await release.wait()
+
+
+def test_admits_up_to_max_concurrency_without_waiting():
+    async def main():
+        controller = AdmissionController('test', max_concurrency=2, max_queue=4)
+        order, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(_hold(controller, order, i, release=release)) for i in range(3)]
+        await asyncio.sleep(0)
+        assert order == [0, 1]
+        assert controller.queue_depth == 1
+        release.set()
+        await asyncio.gather(*tasks)
+        assert order == [0, 1, 2]
+        assert controller.queue_depth == 0
+    asyncio.run(main())
+
+
+def test_higher_priority_first_and_fifo_within_a_priority():
+    async def main():
+        controller = AdmissionController('test', max_concurrency=1, max_queue=10)
+        order, release = [], asyncio.Event()
+        blocker = asyncio.create_task(_hold(controller, order, 'blocker', release=release))
+        await asyncio.sleep(0)
+        waiters = []
+        for label, priority in [('low-1', 0), ('high-1', 5), ('low-2', 0), ('high-2', 5), ('mid', 1)]:
+            waiters.append(asyncio.create_task(_hold(controller, order, label, priority)))
+            await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(blocker, *waiters)
+        assert order == ['blocker', 'high-1', 'high-2', 'mid', 'low-1', 'low-2']
+    asyncio.run(main())
+
+
+def test_rejects_when_queue_is_full():
+    async def main():
+        controller = AdmissionController('test', max_concurrency=1, max_queue=1, min_retry_after=2.0)
+        order, release = [], asyncio.Event()
+        running = asyncio.create_task(_hold(controller, order, 'running', release=release))
+        queued = asyncio.create_task(_hold(controller, order, 'queued'))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.admit():
+                pass
+        assert rejected.value.retry_after >= 2.0
+        release.set()
+        await asyncio.gather(running, queued)
+        assert order == ['running', 'queued']
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        controller = AdmissionController('test', max_concurrency=1, max_queue=4)
+        order, release = [], asyncio.Event()
+        running = asyncio.create_task(_hold(controller, order, 'running', release=release))
+        cancelled = asyncio.create_task(_hold(controller, order, 'cancelled'))
+        after = asyncio.create_task(_hold(controller, order, 'after'))
+        await asyncio.sleep(0)
+        assert controller.queue_depth == 2
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        assert controller.queue_depth == 1
+        release.set()
+        await asyncio.gather(running, after)
+        assert order == ['running', 'after']
+        # Every slot was given back.
+        assert controller._active == 0
+    asyncio.run(main())
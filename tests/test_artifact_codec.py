@@ -0,0 +1,123 @@
+import base64
+import datetime
+import gzip
+
+import pytest
+from a2a.types import DataPart, FilePart, FileWithBytes, Part, TextPart
+
+import utils.artifact_codec as codec
+from utils.artifact_codec import (
+    JSON, JSON_GZIP, JSON_ZSTD, MSGPACK, MSGPACK_GZIP, MSGPACK_ZSTD, TEXT,
+    choose_mode, decode_parts, encode_artifact, supported_modes,
+)
+
+needs_msgpack = pytest.mark.skipif(codec.msgpack is None, reason='msgpack is not installed')
+needs_zstd = pytest.mark.skipif(codec.zstandard is None, reason='zstandard is not installed')
+
+# Large enough to be compressed (COMPRESS_MIN_BYTES) in every mode.
+RESULTS = {
+    'flights': [{'from': 'Paris', 'to': 'Rome', 'price': 120 + i, 'stops': []} for i in range(100)],
+    'summary': 'Trip to Rome',
+    'nested': {'ok': True, 'score': 0.5, 'missing': None},
+}
+
+
+@pytest.fixture(autouse=True)
+def all_encodings(monkeypatch):
+    monkeypatch.delenv('ARTIFACT_ENCODINGS', raising=False)
+
+
+def only_part(parts: list[Part]):
+    assert len(parts) == 1
+    return parts[0].root
+
+
+@pytest.mark.parametrize('mode', [
+    JSON,
+    JSON_GZIP,
+    pytest.param(JSON_ZSTD, marks=needs_zstd),
+    pytest.param(MSGPACK, marks=needs_msgpack),
+    pytest.param(MSGPACK_GZIP, marks=needs_msgpack),
+    pytest.param(MSGPACK_ZSTD, marks=[needs_msgpack, needs_zstd]),
+])
+def test_round_trip(mode):
+    parts = encode_artifact('results', RESULTS, [mode, TEXT])
+    part = only_part(parts)
+    if mode == JSON:
+        assert isinstance(part, DataPart)
+    else:
+        assert isinstance(part, FilePart)
+        assert part.file.mimeType == mode
+    assert decode_parts(parts) == RESULTS
+
+
+def test_text_only_peers_get_compact_json_text():
+    part = only_part(encode_artifact('results', {'a': [1, 2]}, [TEXT]))
+    assert isinstance(part, TextPart)
+    assert part.text == '{"a":[1,2]}'
+    assert decode_parts([Part(root=part)]) is None
+
+
+def test_values_json_cannot_represent_are_sent_as_strings():
+    value = {'day': datetime.date(2026, 5, 1)}
+    assert decode_parts(encode_artifact('results', value, [JSON])) == {'day': '2026-05-01'}
+
+
+def test_small_payloads_are_not_compressed():
+    assert choose_mode([JSON_GZIP, JSON], size=10) == JSON
+    assert choose_mode([JSON_GZIP], size=10) == TEXT
+    assert choose_mode([JSON_GZIP, JSON], size=codec.COMPRESS_MIN_BYTES) == JSON_GZIP
+    part = only_part(encode_artifact('results', {'a': 1}, [JSON_GZIP, JSON]))
+    assert isinstance(part, DataPart)
+
+
+def test_unknown_or_missing_accepted_modes_fall_back_to_text():
+    assert choose_mode(None) == TEXT
+    assert choose_mode(['application/xml'], size=10 ** 6) == TEXT
+
+
+def test_supported_modes_follow_installed_libraries(monkeypatch):
+    monkeypatch.setattr(codec, 'msgpack', None)
+    monkeypatch.setattr(codec, 'zstandard', None)
+    assert supported_modes() == [JSON_GZIP, JSON, TEXT]
+
+
+def test_artifact_encodings_narrows_modes_but_keeps_text(monkeypatch):
+    monkeypatch.setenv('ARTIFACT_ENCODINGS', f'{JSON_GZIP}, {MSGPACK}')
+    modes = supported_modes()
+    assert JSON_GZIP in modes and TEXT in modes
+    assert JSON not in modes
+    assert choose_mode([JSON], size=10) == TEXT
+
+
+def test_compression_bomb_is_rejected(monkeypatch):
+    monkeypatch.setattr(codec, 'MAX_DECODED_BYTES', 1024 * 1024)
+    bomb = gzip.compress(b' ' * (4 * 1024 * 1024))
+    part = FilePart(file=FileWithBytes(bytes=base64.b64encode(bomb).decode(), mimeType=JSON_GZIP))
+    with pytest.raises(ValueError, match='exceeds'):
+        decode_parts([Part(root=part)])
+
+
+def test_oversized_encoded_payload_is_rejected_before_decoding(monkeypatch):
+    monkeypatch.setattr(codec, 'MAX_DECODED_BYTES', 100)
+    part = FilePart(file=FileWithBytes(bytes=base64.b64encode(b'x' * 200).decode(), mimeType=JSON))
+    with pytest.raises(ValueError, match='Encoded'):
+        decode_parts([Part(root=part)])
+
+
+def test_encoding_this_process_cannot_read_is_an_error(monkeypatch):
+    monkeypatch.setattr(codec, 'zstandard', None)
+    part = FilePart(file=FileWithBytes(bytes=base64.b64encode(b'{}').decode(), mimeType=JSON_ZSTD))
+    with pytest.raises(ValueError, match='install'):
+        decode_parts([Part(root=part)])
+
+
+def test_decode_skips_parts_without_a_known_encoding():
+    parts = [
+        Part(root=TextPart(text='hello')),
+        Part(root=DataPart(data={'value': 1})),
+        Part(root=FilePart(file=FileWithBytes(bytes='aGk=', mimeType='image/png'))),
+        Part(root=DataPart(data={'value': 2}, metadata={codec.ENCODING_KEY: JSON})),
+    ]
+    assert decode_parts(parts) == 2
+    assert decode_parts(None) is None
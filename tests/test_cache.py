@@ -0,0 +1,136 @@
+import asyncio
+import types
+
+import pytest
+
+import utils.cache as cache_module
+from utils.cache import SqliteCacheStore, TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A controllable clock for utils.cache (monotonic and wall time)."""
+    now = [1000.0]
+    fake = types.SimpleNamespace(monotonic=lambda: now[0], time=lambda: now[0])
+    monkeypatch.setattr(cache_module, 'time', fake)
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = TTLCache('test', ttl=10)
+    cache.set('a', 1)
+    clock[0] += 9.9
+    assert cache.get('a') == 1
+    clock[0] += 0.2
+    assert cache.get('a') is None
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache('test', ttl=60, max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+
+
+def test_disabled_cache_stores_nothing():
+    cache = TTLCache('test', ttl=0)
+    cache.set('a', 1)
+    assert cache.get('a') is None
+    assert not cache.enabled
+
+
+def test_concurrent_callers_share_one_computation():
+    async def main():
+        cache = TTLCache('test', ttl=60)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'value'
+        results = await asyncio.gather(*(cache.get_or_compute('k', compute) for _ in range(5)))
+        assert results == ['value'] * 5
+        assert len(calls) == 1
+        assert await cache.get_or_compute('k', compute) == 'value'
+        assert len(calls) == 1
+    asyncio.run(main())
+
+
+def test_should_cache_and_failures_are_not_cached():
+    async def main():
+        cache = TTLCache('test', ttl=60)
+
+        async def empty():
+            return []
+        await cache.get_or_compute('empty', empty, should_cache=bool)
+        assert cache.get('empty') is None
+
+        async def fail():
+            raise RuntimeError('boom')
+        with pytest.raises(RuntimeError):
+            await cache.get_or_compute('fail', fail)
+        assert cache.get('fail') is None
+        assert not cache._inflight
+    asyncio.run(main())
+
+
+def test_one_cancelled_waiter_does_not_cancel_the_others():
+    async def main():
+        cache = TTLCache('test', ttl=60)
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return 'value'
+        first = asyncio.create_task(cache.get_or_compute('k', compute))
+        second = asyncio.create_task(cache.get_or_compute('k', compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        assert await second == 'value'
+        assert first.cancelled()
+        assert cache.get('k') == 'value'
+    asyncio.run(main())
+
+
+def test_lookup_of_a_disabled_cache_is_a_miss():
+    cache = TTLCache('test', ttl=0)
+    cache.set('a', 1)
+    assert cache.lookup('a') is None
+
+
+def test_store_round_trip_and_expiry(tmp_path, clock):
+    store = SqliteCacheStore(str(tmp_path / 'cache.sqlite'))
+    store.set('summaries', 'k', {'answer': 'ok', 'items': [1, 2]}, ttl=10)
+    assert store.get('summaries', 'k') == {'answer': 'ok', 'items': [1, 2]}
+    assert store.get('other', 'k') is None
+    clock[0] += 11
+    assert store.get('summaries', 'k') is None
+
+
+def test_memory_misses_are_answered_from_the_store(tmp_path, clock):
+    path = str(tmp_path / 'cache.sqlite')
+    TTLCache('summaries', ttl=60, store=SqliteCacheStore(path)).set('k', 'value')
+    # Another process (or a restart) sharing the file.
+    other = TTLCache('summaries', ttl=60, store=SqliteCacheStore(path))
+    assert other.lookup('k') == 'value'
+    assert 'k' in other._entries
+
+
+def test_store_keeps_at_most_max_entries_per_cache(tmp_path, clock):
+    store = SqliteCacheStore(str(tmp_path / 'cache.sqlite'), max_entries=3)
+    for i in range(101):
+        clock[0] += 1
+        store.set('summaries', f'k{i}', i, ttl=3600)
+    # Pruned on the 101st write: only the newest three remain.
+    assert [store.get('summaries', f'k{i}') for i in (97, 98, 99, 100)] == [None, 98, 99, 100]
+
+
+def test_from_env(monkeypatch, tmp_path):
+    monkeypatch.delenv('TEST_CACHE_DB', raising=False)
+    assert SqliteCacheStore.from_env('TEST_CACHE_DB') is None
+    monkeypatch.setenv('TEST_CACHE_DB', str(tmp_path / 'cache.sqlite'))
+    assert isinstance(SqliteCacheStore.from_env('TEST_CACHE_DB'), SqliteCacheStore)
@@ -0,0 +1,99 @@
+import json
+import os
+
+import pytest
+
+from mcp_servers.catalog import CityIndex, PlacesCatalog, RoutesCatalog
+
+CITIES = ['paris', 'rome', 'goa', 'new delhi', 'new york', 'san francisco', 'santiago']
+
+
+@pytest.fixture
+def index():
+    return CityIndex(CITIES)
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('Paris', 'paris'),
+    ('  NEW   york ', 'new york'),
+    ('Rom', 'rome'),
+    ('san f', 'san francisco'),
+    ('Paaris', 'paris'),
+    ('Sanfrancisco', 'san francisco'),
+    ('Santiagoo', 'santiago'),
+])
+def test_resolves_exact_prefix_and_misspelled_names(index, query, expected):
+    assert index.resolve(query) == expected
+
+
+@pytest.mark.parametrize('query', ['', '   ', 'Tokyo', 'xyz'])
+def test_unknown_names_resolve_to_none(index, query):
+    assert index.resolve(query) is None
+
+
+def test_prefix_match_is_the_first_name_in_order(index):
+    assert index.resolve('new') == 'new delhi'
+
+
+ROUTES = [
+    {'mode': 'flight', 'source': 'Paris', 'destination': 'Rome', 'departure': '09:00', 'price_usd': 120},
+    {'mode': 'flight', 'source': 'Paris', 'destination': 'Rome', 'departure': '18:00', 'price_usd': 80},
+    {'mode': 'bus', 'source': 'Paris', 'destination': 'Rome', 'departure': '07:00', 'price_usd': 40},
+    # Template: served for pairs the catalog does not list.
+    {'mode': 'flight', 'departure': '12:00', 'price_usd': 999},
+]
+
+
+def test_routes_for_a_listed_pair_cheapest_first():
+    catalog = RoutesCatalog(default_records=ROUTES)
+    assert [o['price_usd'] for o in catalog.routes('flight', 'Paris', 'Rome')] == [80, 120]
+    assert [o['departure'] for o in catalog.routes('flight', 'paris', 'ROME', sort_by='departure')] == ['09:00', '18:00']
+    assert [o['price_usd'] for o in catalog.routes('bus', 'Paris', 'Rome')] == [40]
+
+
+def test_routes_resolve_misspellings_and_report_the_match():
+    catalog = RoutesCatalog(default_records=ROUTES)
+    assert catalog.match('Paaris', 'Rom') == ('paris', 'rome')
+    assert [o['price_usd'] for o in catalog.routes('flight', 'Paaris', 'Rom')] == [80, 120]
+
+
+def test_unknown_pair_falls_back_to_templates():
+    catalog = RoutesCatalog(default_records=ROUTES)
+    assert catalog.match('Tokyo', 'Rome') == ('tokyo', 'rome')
+    assert [o['price_usd'] for o in catalog.routes('flight', 'Tokyo', 'Rome')] == [999]
+    assert catalog.routes('bus', 'Tokyo', 'Rome') == []
+
+
+def test_places_lookup_by_misspelled_city_and_category():
+    catalog = PlacesCatalog(default_records=[
+        {'city': 'Rome', 'name': 'Colosseum', 'category': 'History'},
+        {'city': 'Rome', 'name': 'Villa Borghese', 'category': 'Park'},
+    ])
+    city, places = catalog.lookup('Roome')
+    assert city == 'rome' and [p['name'] for p in places] == ['Colosseum', 'Villa Borghese']
+    assert [p['name'] for p in catalog.lookup('Rome', category='history')[1]] == ['Colosseum']
+    assert catalog.lookup('Tokyo') == (None, [])
+
+
+def test_failed_reload_keeps_the_index_and_is_retried_after_a_change(tmp_path):
+    path = tmp_path / 'places.json'
+    path.write_text(json.dumps([{'city': 'Rome', 'name': 'Colosseum'}]))
+    catalog = PlacesCatalog(path=str(path))
+    loaded_mtime = catalog._mtime
+
+    path.write_text('[{"city": ')
+    stat = path.stat()
+    broken_mtime = stat.st_mtime + 10
+    os.utime(path, (broken_mtime, broken_mtime))
+    with pytest.raises(ValueError):
+        catalog._load()
+    # The broken version was not recorded as loaded.
+    assert catalog._mtime == loaded_mtime
+    assert catalog._failed_mtime == broken_mtime
+    assert catalog.lookup('Rome')[1][0]['name'] == 'Colosseum'
+
+    path.write_text(json.dumps([{'city': 'Goa', 'name': 'Baga Beach'}]))
+    os.utime(path, (broken_mtime + 10, broken_mtime + 10))
+    catalog._index = catalog._load()
+    assert catalog._mtime == broken_mtime + 10
+    assert catalog.lookup('Goa')[1][0]['name'] == 'Baga Beach'
@@ -0,0 +1,50 @@
+import pytest
+
+from agents.entities import extract_trip, predict_tasks
+
+
+@pytest.mark.parametrize('text, source, destination', [
+    ('Plan a trip from Paris to Rome with sightseeing.', 'Paris', 'Rome'),
+    ('From New York to San Francisco, please', 'New York', 'San Francisco'),
+    ('FROM Paris TO Rome', 'Paris', 'Rome'),
+    ("I'm going from São Paulo to Kuala Lumpur next week", 'São Paulo', 'Kuala Lumpur'),
+    ('Take me to Goa.', None, 'Goa'),
+    ('Travel towards Milan!', None, 'Milan'),
+])
+def test_source_and_destination(text, source, destination):
+    trip = extract_trip(text)
+    assert (trip.source, trip.destination) == (source, destination)
+
+
+def test_cities_in_order_of_appearance_without_punctuation():
+    trip = extract_trip('Fly from Paris to Rome, then explore Florence. Stay in Rome.')
+    assert trip.cities == ['Paris', 'Rome', 'Florence']
+
+
+def test_lowercase_words_are_not_places():
+    trip = extract_trip('plan a trip from paris to rome')
+    assert trip.source is None and trip.destination is None and trip.cities == []
+
+
+def test_empty_text():
+    trip = extract_trip('')
+    assert (trip.source, trip.destination, trip.cities) == (None, None, [])
+
+
+def test_predicts_transport_and_sightseeing():
+    tasks = predict_tasks('Plan a trip from Paris to Rome by bus with sightseeing.')
+    assert [(t['mcp_server'], t['task']) for t in tasks] == [
+        ('TransportServer', 'Find flights from Paris to Rome'),
+        ('TransportServer', 'Find buses from Paris to Rome'),
+        ('SightseeingServer', 'Find sightseeing spots in Rome'),
+    ]
+    assert tasks[0]['params'] == {'source': 'Paris', 'destination': 'Rome'}
+    assert tasks[2]['params'] == {'query': 'Rome'}
+
+
+def test_predicts_sightseeing_only_without_a_route():
+    assert predict_tasks('What are the attractions in Lisbon?') == [{
+        'task': 'Find sightseeing spots in Lisbon', 'mcp_server': 'SightseeingServer',
+        'depends': [], 'params': {'query': 'Lisbon'},
+    }]
+    assert predict_tasks('hello there') == []
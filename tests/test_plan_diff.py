@@ -0,0 +1,58 @@
+from agents.plan_diff import diff_plans, rerun_keys, task_key
+
+
+def task(description: str, server: str = 'transport', **extra) -> dict:
+    return {'task': description, 'server': server, **extra}
+
+
+FLIGHT = task('Find flights from Paris to Rome')
+HOTEL = task('Find hotels in Rome', 'sightseeing')
+SIGHTS = task('Plan sightseeing in Rome', 'sightseeing', depends=['Find hotels in Rome'])
+BUDGET = task('Summarize the budget', 'employee', depends=[0, 1])
+
+
+def test_task_key_ignores_case_and_whitespace():
+    assert task_key({'task': '  Find  flights\nto ROME '}) == 'find flights to rome'
+    assert task_key({}) == ''
+
+
+def test_identical_plans_have_an_empty_diff():
+    diff = diff_plans([FLIGHT, HOTEL], [dict(HOTEL), dict(FLIGHT)])
+    assert diff.is_empty
+    assert diff.unchanged == [HOTEL, FLIGHT]
+    assert diff.summary() == '0 added, 0 changed, 0 removed, 2 unchanged'
+
+
+def test_tasks_are_added_changed_and_removed():
+    bus = task('find flights from paris to rome', 'transport', params={'mode': 'bus'})
+    new_task = task('Book a restaurant', 'sightseeing')
+    diff = diff_plans([FLIGHT, HOTEL, SIGHTS], [bus, HOTEL, new_task])
+    assert diff.to_dict() == {
+        'added': [new_task], 'changed': [bus], 'removed': [SIGHTS], 'unchanged': [HOTEL],
+    }
+    assert not diff.is_empty
+
+
+def test_changed_tasks_and_their_dependents_rerun():
+    hotel = task('Find hotels in Rome', 'sightseeing', params={'stars': 4})
+    plan = [FLIGHT, hotel, SIGHTS]
+    assert rerun_keys(diff_plans([FLIGHT, HOTEL, SIGHTS], plan), plan) == {task_key(hotel), task_key(SIGHTS)}
+
+
+def test_dependencies_by_index_rerun_transitively():
+    after_budget = task('Email the itinerary', 'employee', depends=['Summarize the budget'])
+    old = [FLIGHT, HOTEL, BUDGET, after_budget]
+    flight = task('Find flights from Paris to Rome', params={'class': 'business'})
+    new = [flight, HOTEL, BUDGET, after_budget]
+    assert rerun_keys(diff_plans(old, new), new) == {task_key(flight), task_key(BUDGET), task_key(after_budget)}
+
+
+def test_tasks_depending_on_a_removed_task_rerun():
+    old = [FLIGHT, HOTEL, SIGHTS]
+    new = [FLIGHT, SIGHTS]
+    assert rerun_keys(diff_plans(old, new), new) == {task_key(SIGHTS)}
+
+
+def test_unchanged_plan_reruns_nothing():
+    plan = [FLIGHT, HOTEL, SIGHTS, BUDGET]
+    assert rerun_keys(diff_plans(plan, plan), plan) == set()
@@ -0,0 +1,142 @@
+import asyncio
+
+import httpx
+import pytest
+from a2a.types import PushNotificationConfig, Task, TaskState, TaskStatus
+
+from utils.push import TOKEN_HEADER, QueuedPushNotifier, SqlitePushConfigStore
+
+URL = 'http://subscriber.test/webhook'
+
+
+def make_task(task_id: str, state: TaskState, text: str = '') -> Task:
+    return Task(id=task_id, contextId='ctx', status=TaskStatus(state=state), metadata={'text': text})
+
+
+class Webhook:
+    """Records the POSTs it receives; responses are taken from `statuses` (then 200) after `delay`."""
+    def __init__(self, delay: float = 0.0, statuses: tuple = ()):
+        self.delay = delay
+        self.statuses = list(statuses)
+        self.received: list[tuple[str, str, str]] = []
+        self.in_flight: dict[str, int] = {}
+        self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = Task.model_validate_json(request.content)
+        self.in_flight[body.id] = self.in_flight.get(body.id, 0) + 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight[body.id])
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight[body.id] -= 1
+        self.received.append((body.id, body.metadata['text'], request.headers.get(TOKEN_HEADER)))
+        return httpx.Response(self.statuses.pop(0) if self.statuses else 200)
+
+
+@pytest.fixture
+def notifier(tmp_path):
+    def build(webhook: Webhook, **kwargs) -> QueuedPushNotifier:
+        kwargs.setdefault('coalesce_window', 0.05)
+        kwargs.setdefault('backoff_base', 0.001)
+        n = QueuedPushNotifier('test', SqlitePushConfigStore(str(tmp_path / 'push.sqlite')), **kwargs)
+        n._client = httpx.AsyncClient(transport=httpx.MockTransport(webhook))
+        return n
+    return build
+
+
+async def drain(n: QueuedPushNotifier) -> None:
+    while n._pending or n._delivering:
+        await asyncio.sleep(0.01)
+    await n.aclose()
+
+
+def test_burst_of_updates_becomes_one_post_of_the_latest_state(notifier):
+    async def main():
+        webhook = Webhook()
+        n = notifier(webhook)
+        await n.set_info('t1', PushNotificationConfig(url=URL, token='secret'))
+        for i in range(5):
+            await n.send_notification(make_task('t1', TaskState.working, f'update {i}'))
+        await drain(n)
+        assert webhook.received == [('t1', 'update 4', 'secret')]
+    asyncio.run(main())
+
+
+def test_tasks_without_a_config_are_not_queued(notifier):
+    async def main():
+        webhook = Webhook()
+        n = notifier(webhook)
+        await n.send_notification(make_task('t1', TaskState.completed))
+        assert not n._pending
+        assert n._queue is None
+        await n.aclose()
+    asyncio.run(main())
+
+
+def test_update_during_delivery_is_sent_after_it(notifier):
+    async def main():
+        webhook = Webhook(delay=0.1)
+        n = notifier(webhook, workers=4, coalesce_window=0.0)
+        await n.set_info('t1', PushNotificationConfig(url=URL))
+        await n.send_notification(make_task('t1', TaskState.working, 'first'))
+        while not webhook.in_flight.get('t1'):
+            await asyncio.sleep(0.001)
+        # Idle workers must not pick these up while 'first' is still being posted.
+        await n.send_notification(make_task('t1', TaskState.working, 'second'))
+        await n.send_notification(make_task('t1', TaskState.completed, 'third'))
+        await drain(n)
+        assert [text for _, text, _ in webhook.received] == ['first', 'third']
+        assert webhook.max_in_flight == 1
+    asyncio.run(main())
+
+
+def test_tasks_are_delivered_in_queue_order(notifier):
+    async def main():
+        webhook = Webhook()
+        n = notifier(webhook, workers=1)
+        for task_id in ('a', 'b', 'c'):
+            await n.set_info(task_id, PushNotificationConfig(url=URL))
+            await n.send_notification(make_task(task_id, TaskState.completed))
+        await drain(n)
+        assert [task_id for task_id, _, _ in webhook.received] == ['a', 'b', 'c']
+    asyncio.run(main())
+
+
+def test_updates_for_new_tasks_are_dropped_when_the_queue_is_full(notifier):
+    async def main():
+        webhook = Webhook()
+        n = notifier(webhook, max_queue=2, coalesce_window=0.05)
+        for task_id in ('a', 'b', 'c'):
+            await n.set_info(task_id, PushNotificationConfig(url=URL))
+            await n.send_notification(make_task(task_id, TaskState.working, 'queued'))
+        # Already-queued tasks still take updates.
+        await n.send_notification(make_task('a', TaskState.working, 'newer'))
+        assert list(n._pending) == ['a', 'b']
+        await drain(n)
+        assert sorted(webhook.received) == [('a', 'newer', None), ('b', 'queued', None)]
+    asyncio.run(main())
+
+
+def test_server_errors_are_retried_and_rejections_are_not(notifier):
+    async def main():
+        webhook = Webhook(statuses=(503, 429, 200, 404))
+        n = notifier(webhook, workers=1)
+        await n.set_info('retried', PushNotificationConfig(url=URL))
+        await n.set_info('rejected', PushNotificationConfig(url=URL))
+        await n.send_notification(make_task('retried', TaskState.completed))
+        await n.send_notification(make_task('rejected', TaskState.completed))
+        await drain(n)
+        assert [task_id for task_id, _, _ in webhook.received] == ['retried'] * 3 + ['rejected']
+    asyncio.run(main())
+
+
+def test_configs_persist_across_stores(tmp_path):
+    async def main():
+        path = str(tmp_path / 'push.sqlite')
+        await SqlitePushConfigStore(path).set('t1', PushNotificationConfig(url=URL, token='x'))
+        other = SqlitePushConfigStore(path)
+        assert (await other.get('t1')).token == 'x'
+        await other.delete('t1')
+        assert await SqlitePushConfigStore(path).get('t1') is None
+    asyncio.run(main())
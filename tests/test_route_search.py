@@ -0,0 +1,103 @@
+import random
+
+import pytest
+
+from mcp_servers.route_search import MINUTES_PER_DAY, RouteNetwork
+
+CITIES = ['Paris', 'Rome', 'Goa', 'Delhi', 'Lyon', 'Milan', 'Oslo', 'Lima']
+
+
+def random_timetable(seed: int, legs: int = 150) -> list[dict]:
+    rng = random.Random(seed)
+    records = []
+    for _ in range(legs):
+        source, destination = rng.sample(CITIES, 2)
+        minute = rng.randrange(0, MINUTES_PER_DAY, 15)
+        records.append({
+            'mode': rng.choice(['flight', 'bus']),
+            'source': source,
+            'destination': destination,
+            'day': rng.randrange(2),
+            'departure': f'{minute // 60:02d}:{minute % 60:02d}',
+            'duration_min': rng.randrange(45, 600, 15),
+            'price_usd': rng.randrange(20, 400),
+        })
+    return records
+
+
+def brute_force_costs(network, source, destination, optimize, depart_after, min_connection,
+                      max_connection, max_legs, modes):
+    """Every itinerary the search may return, by exhaustive depth-first enumeration."""
+    origin, target = network.city_ids[source.casefold()], network.city_ids[destination.casefold()]
+    allowed = [leg for leg in range(len(network)) if not modes or network.records[leg]['mode'] in modes]
+    costs = []
+
+    def extend(path):
+        last = path[-1]
+        if network.dst[last] == target:
+            if optimize == 'price':
+                costs.append(sum(network.price[leg] for leg in path))
+            else:
+                costs.append(network.arr[last] - network.dep[path[0]])
+            return
+        if len(path) == max_legs:
+            return
+        visited = {network.src[leg] for leg in path}
+        for leg in allowed:
+            if (network.src[leg] == network.dst[last] and network.dst[leg] not in visited
+                    and network.arr[last] + min_connection <= network.dep[leg] <= network.arr[last] + max_connection):
+                extend(path + [leg])
+
+    for leg in allowed:
+        if (network.src[leg] == origin and network.dst[leg] != origin
+                and depart_after <= network.dep[leg] <= depart_after + MINUTES_PER_DAY):
+            extend([leg])
+    return sorted(costs)
+
+
+@pytest.mark.parametrize('seed', range(6))
+def test_k_best_matches_brute_force(seed):
+    network = RouteNetwork(random_timetable(seed))
+    rng = random.Random(1000 + seed)
+    for _ in range(25):
+        source, destination = rng.sample(CITIES, 2)
+        query = {
+            'optimize': rng.choice(['price', 'duration']),
+            'depart_after': rng.randrange(0, MINUTES_PER_DAY, 60),
+            'min_connection': rng.choice([30, 45, 90]),
+            'max_connection': rng.choice([240, 360, 720]),
+            'max_legs': rng.randint(1, 3),
+            'modes': rng.choice([None, {'flight'}, {'bus'}]),
+        }
+        k = rng.randint(1, 5)
+        paths = network.search(source, destination, k=k, **query)
+        found = [network.describe(path)['total_price_usd'] if query['optimize'] == 'price'
+                 else network.describe(path)['duration_min'] for path in paths]
+        assert found == brute_force_costs(network, source, destination, **query)[:k], (source, destination, query, k)
+
+
+def test_itineraries_respect_the_connection_window():
+    network = RouteNetwork(random_timetable(42))
+    for path in network.search('Paris', 'Goa', k=10, min_connection=60, max_connection=300, max_legs=3):
+        for first, second in zip(path, path[1:]):
+            assert network.src[second] == network.dst[first]
+            assert 60 <= network.dep[second] - network.arr[first] <= 300
+
+
+def test_describe_and_arrival_after_midnight():
+    network = RouteNetwork([
+        {'mode': 'bus', 'source': 'Paris', 'destination': 'Lyon', 'departure': '22:00', 'arrival': '02:00', 'price_usd': 30},
+        {'mode': 'flight', 'source': 'Lyon', 'destination': 'Rome', 'day': 1, 'departure': '04:00', 'arrival': '05:30', 'price_usd': 90},
+    ])
+    [path] = network.search('paris', 'Rome', k=3, min_connection=60)
+    itinerary = network.describe(path)
+    assert itinerary['connections'] == 1
+    assert itinerary['total_price_usd'] == 120
+    assert itinerary['duration_min'] == 7 * 60 + 30
+    assert [leg['arrival_day'] for leg in itinerary['legs']] == [1, 1]
+
+
+def test_unknown_or_same_city_finds_nothing():
+    network = RouteNetwork(random_timetable(1))
+    assert network.search('Tokyo', 'Rome') == []
+    assert network.search('Rome', 'Rome') == []
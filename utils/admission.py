@@ -0,0 +1,139 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from a2a.server.agent_execution import AgentExecutor, RequestContext
+from a2a.server.events import EventQueue
+from a2a.types import JSONRPCError
+from a2a.utils.errors import ServerError
+
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Server-defined JSON-RPC error code returned when an agent sheds load.
+OVERLOADED_ERROR_CODE = -32050
+
+_in_flight = REGISTRY.gauge('agent_admission_in_flight', 'Requests currently executing.')
+_queue_depth = REGISTRY.gauge('agent_admission_queue_depth', 'Requests waiting for an execution slot.')
+_wait_seconds = REGISTRY.histogram('agent_admission_wait_seconds', 'Time spent waiting for an execution slot.')
+_rejected = REGISTRY.counter('agent_admission_rejected_total', 'Requests rejected because the wait queue was full.')
+_admitted = REGISTRY.counter('agent_admission_admitted_total', 'Requests admitted for execution.')
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, agent: str, retry_after: float):
+        super().__init__(f'{agent} is overloaded, retry after {retry_after:.1f}s')
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    AdmissionController: Bounded concurrency with a bounded priority wait queue.
+    Higher priority waiters are admitted first (FIFO within a priority); when the
+    queue is full new requests are rejected immediately with a retry-after hint.
+    """
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, min_retry_after: float = 1.0):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.min_retry_after = min_retry_after
+        self._active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._avg_service_time = min_retry_after
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> float:
+        estimate = self._avg_service_time * (len(self._waiters) + 1) / self.max_concurrency
+        return round(max(self.min_retry_after, estimate), 1)
+
+    @asynccontextmanager
+    async def admit(self, priority: int = 0) -> AsyncIterator[None]:
+        await self._acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._avg_service_time = 0.9 * self._avg_service_time + 0.1 * elapsed
+            self._release()
+
+    async def _acquire(self, priority: int) -> None:
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            self._record_admitted(0.0)
+            return
+        if len(self._waiters) >= self.max_queue:
+            _rejected.inc(agent=self.name)
+            raise AdmissionRejected(self.name, self.retry_after())
+        future = asyncio.get_running_loop().create_future()
+        entry = (-priority, next(self._seq), future)
+        heapq.heappush(self._waiters, entry)
+        _queue_depth.set(len(self._waiters), agent=self.name)
+        enqueued = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed to us just as we were cancelled; pass it on.
+                self._release()
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                _queue_depth.set(len(self._waiters), agent=self.name)
+            raise
+        self._record_admitted(time.monotonic() - enqueued)
+
+    def _release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            _queue_depth.set(len(self._waiters), agent=self.name)
+            if not future.done():
+                # Hand the slot over directly; the active count is unchanged.
+                future.set_result(None)
+                return
+        self._active -= 1
+        _in_flight.set(self._active, agent=self.name)
+
+    def _record_admitted(self, waited: float) -> None:
+        _in_flight.set(self._active, agent=self.name)
+        _admitted.inc(agent=self.name)
+        _wait_seconds.observe(waited, agent=self.name)
+
+
+class AdmissionControlledExecutor(AgentExecutor):
+    """
+    AdmissionControlledExecutor: Runs the wrapped executor only once the controller admits
+    the request. The priority comes from the A2A message metadata ('priority', default 0).
+    """
+    def __init__(self, inner: AgentExecutor, controller: AdmissionController):
+        self.inner = inner
+        self.controller = controller
+
+    async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
+        metadata = context.message.metadata if context.message and context.message.metadata else {}
+        try:
+            priority = int(metadata.get('priority', 0))
+        except (TypeError, ValueError):
+            priority = 0
+        try:
+            async with self.controller.admit(priority):
+                await self.inner.execute(context, event_queue)
+        except AdmissionRejected as e:
+            logger.warning('%s', e)
+            raise ServerError(error=JSONRPCError(
+                code=OVERLOADED_ERROR_CODE,
+                message=str(e),
+                data={'retry_after': e.retry_after},
+            )) from e
+
+    async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
+        await self.inner.cancel(context, event_queue)
@@ -0,0 +1,176 @@
+import base64
+import gzip
+import io
+import json
+import logging
+import os
+import time
+from typing import Any, Iterable, Optional
+
+from a2a.types import DataPart, FilePart, FileWithBytes, Part, TextPart
+
+from utils.metrics import REGISTRY
+
+try:
+    import msgpack
+except ImportError:  # optional: pip install msgpack
+    msgpack = None
+try:
+    import zstandard
+except ImportError:  # optional: pip install zstandard
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+TEXT = 'text/plain'
+JSON = 'application/json'
+JSON_GZIP = 'application/json+gzip'
+JSON_ZSTD = 'application/json+zstd'
+MSGPACK = 'application/msgpack'
+MSGPACK_GZIP = 'application/msgpack+gzip'
+MSGPACK_ZSTD = 'application/msgpack+zstd'
+
+# Most preferred first. Text is always last: every A2A peer understands it.
+PREFERENCE = [MSGPACK_ZSTD, JSON_ZSTD, MSGPACK_GZIP, JSON_GZIP, MSGPACK, JSON, TEXT]
+COMPRESSED = {JSON_GZIP, JSON_ZSTD, MSGPACK_GZIP, MSGPACK_ZSTD}
+# Part metadata key naming the encoding of a DataPart (FileParts carry it as their mimeType).
+ENCODING_KEY = 'encoding'
+# Payloads smaller than this are not worth compressing (and base64-inflating).
+COMPRESS_MIN_BYTES = int(os.getenv('ARTIFACT_COMPRESS_MIN_BYTES', '2048'))
+# Decoded payloads larger than this are rejected: a small compressed part could otherwise expand
+# to gigabytes in the Reflector, which accepts encoded parts from any client.
+MAX_DECODED_BYTES = int(os.getenv('ARTIFACT_MAX_DECODED_BYTES', str(64 * 1024 * 1024)))
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+_CHUNK = 64 * 1024
+
+_BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+_CODEC_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+_serialized_bytes = REGISTRY.histogram(
+    'artifact_serialized_bytes', 'Artifact size after serialization, before compression.', buckets=_BYTE_BUCKETS,
+)
+_wire_bytes = REGISTRY.histogram(
+    'artifact_wire_bytes', 'Artifact size as sent in the A2A message (base64 included).', buckets=_BYTE_BUCKETS,
+)
+_codec_seconds = REGISTRY.histogram(
+    'artifact_codec_seconds', 'Time spent encoding or decoding artifacts.', buckets=_CODEC_BUCKETS,
+)
+
+
+def supported_modes() -> list[str]:
+    """
+    Encodings this process can read and write, most preferred first. ARTIFACT_ENCODINGS
+    (comma-separated MIME types) narrows them, e.g. to 'text/plain' to turn encoding off.
+    """
+    modes = [
+        mode for mode in PREFERENCE
+        if (msgpack is not None or not mode.startswith(MSGPACK))
+        and (zstandard is not None or not mode.endswith('+zstd'))
+    ]
+    allowed = os.getenv('ARTIFACT_ENCODINGS')
+    if allowed:
+        allowed_modes = {mode.strip() for mode in allowed.split(',')}
+        modes = [mode for mode in modes if mode in allowed_modes or mode == TEXT]
+    return modes
+
+
+def choose_mode(accepted: Optional[Iterable[str]], size: int = 0) -> str:
+    """The preferred encoding the peer accepts; compression only for payloads of at least COMPRESS_MIN_BYTES."""
+    accepted = set(accepted or ())
+    for mode in supported_modes():
+        if mode in accepted and (mode not in COMPRESSED or size >= COMPRESS_MIN_BYTES):
+            return mode
+    return TEXT
+
+
+def _serialize(value: Any, fmt: str) -> bytes:
+    if fmt == MSGPACK:
+        return msgpack.packb(value, default=str)
+    return json.dumps(value, separators=(',', ':'), default=str).encode()
+
+
+def _compress(data: bytes, mode: str) -> bytes:
+    if mode.endswith('+zstd'):
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if mode.endswith('+gzip'):
+        return gzip.compress(data, compresslevel=GZIP_LEVEL)
+    return data
+
+
+def _decompress(data: bytes, mode: str, limit: int) -> bytes:
+    """data decompressed chunk by chunk, raising ValueError as soon as it exceeds limit bytes."""
+    if mode.endswith('+zstd'):
+        reader = zstandard.ZstdDecompressor().stream_reader(data)
+    elif mode.endswith('+gzip'):
+        reader = gzip.GzipFile(fileobj=io.BytesIO(data))
+    else:
+        reader = io.BytesIO(data)
+    out = bytearray()
+    with reader:
+        while True:
+            chunk = reader.read(_CHUNK)
+            if not chunk:
+                return bytes(out)
+            out += chunk
+            if len(out) > limit:
+                raise ValueError(f'Decoded artifact exceeds {limit} bytes')
+
+
+def encode_artifact(name: str, value: Any, accepted: Optional[Iterable[str]]) -> list[Part]:
+    """
+    value as the parts of the artifact `name`, in the best encoding the peer accepts:
+    a DataPart for plain JSON, a base64 FilePart for MessagePack and compressed payloads, and
+    compact JSON text for peers that only accept text.
+    """
+    started = time.perf_counter()
+    accepted = set(accepted or ())
+    fmt = MSGPACK if choose_mode(accepted, COMPRESS_MIN_BYTES).startswith(MSGPACK) else JSON
+    serialized = _serialize(value, fmt)
+    mode = choose_mode(accepted, len(serialized))
+    if not mode.startswith(fmt) and mode != TEXT:
+        # The peer takes the other serialization only in compressed form (or vice versa).
+        fmt = MSGPACK if mode.startswith(MSGPACK) else JSON
+        serialized = _serialize(value, fmt)
+    if mode == TEXT:
+        part = TextPart(text=serialized.decode() if fmt == JSON else _serialize(value, JSON).decode())
+        wire = len(part.text)
+    elif mode == JSON:
+        part = DataPart(data={'value': json.loads(serialized)}, metadata={ENCODING_KEY: JSON})
+        wire = len(serialized)
+    else:
+        encoded = base64.b64encode(_compress(serialized, mode)).decode('ascii')
+        part = FilePart(file=FileWithBytes(bytes=encoded, mimeType=mode, name=name))
+        wire = len(encoded)
+    _codec_seconds.observe(time.perf_counter() - started, artifact=name, encoding=mode, op='encode')
+    _serialized_bytes.observe(len(serialized), artifact=name, encoding=mode)
+    _wire_bytes.observe(wire, artifact=name, encoding=mode)
+    logger.debug('Encoded %s as %s: %d bytes serialized, %d on the wire', name, mode, len(serialized), wire)
+    return [Part(root=part)]
+
+
+def decode_parts(parts: Optional[list], name: str = 'artifact') -> Optional[Any]:
+    """
+    The value of the first encoded part (DataPart or FilePart in a known encoding), or None
+    when there is none; text parts are left to the caller.
+    """
+    for part in parts or []:
+        root = getattr(part, 'root', part)
+        if isinstance(root, DataPart) and (root.metadata or {}).get(ENCODING_KEY) == JSON:
+            mode = JSON
+        elif isinstance(root, FilePart) and isinstance(root.file, FileWithBytes) and root.file.mimeType in PREFERENCE:
+            mode = root.file.mimeType
+        else:
+            continue
+        started = time.perf_counter()
+        if isinstance(root, DataPart):
+            value = root.data.get('value')
+        else:
+            if (mode.startswith(MSGPACK) and msgpack is None) or (mode.endswith('+zstd') and zstandard is None):
+                raise ValueError(f'Cannot decode {name} encoded as {mode}; install msgpack/zstandard.')
+            if len(root.file.bytes) * 3 // 4 > MAX_DECODED_BYTES:
+                raise ValueError(f'Encoded {name} exceeds {MAX_DECODED_BYTES} bytes')
+            data = _decompress(base64.b64decode(root.file.bytes), mode, MAX_DECODED_BYTES)
+            value = msgpack.unpackb(data) if mode.startswith(MSGPACK) else json.loads(data)
+        _codec_seconds.observe(time.perf_counter() - started, artifact=name, encoding=mode, op='decode')
+        return value
+    return None
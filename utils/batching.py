@@ -0,0 +1,196 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import PrivateAttr
+
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_batch_size = REGISTRY.histogram(
+    'llm_batch_size', 'Model calls sent together in one batch.', buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+_batch_wait = REGISTRY.histogram(
+    'llm_batch_wait_seconds', 'Time a model call waited for its batch to be sent (window and concurrency cap).',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+_in_flight = REGISTRY.gauge('llm_calls_in_flight', 'Model calls currently sent to the provider.')
+
+
+class _Slots:
+    """Counting semaphore that hands out several slots at once without deadlocking concurrent takers."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self._taking = asyncio.Lock()
+
+    @asynccontextmanager
+    async def hold(self, count: int) -> AsyncIterator[None]:
+        count = min(count, self.limit)
+        taken = 0
+        try:
+            # One taker at a time, so two batches never each hold part of what they need.
+            async with self._taking:
+                for _ in range(count):
+                    await self._semaphore.acquire()
+                    taken += 1
+            yield
+        finally:
+            for _ in range(taken):
+                self._semaphore.release()
+
+
+class MicroBatcher:
+    """
+    MicroBatcher: Collects calls to a runnable that arrive within `window` seconds of each other
+    (at most max_batch) and sends them as one runnable.abatch(). Batches are sent concurrently
+    as long as the shared slots allow; every call in a batch takes one slot. A failed call fails
+    only its own caller, and calls cancelled while waiting are left out of the batch.
+    """
+    def __init__(self, name: str, runnable: Runnable, slots: _Slots, window: float = 0.005, max_batch: int = 8):
+        self.name = name
+        self.runnable = runnable
+        self.slots = slots
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: list[tuple[Any, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches: set[asyncio.Task] = set()
+
+    async def submit(self, value: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((value, future, time.monotonic()))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = [item for item in self._pending if not item[1].done()]
+        self._pending = []
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _send(self, batch: list[tuple[Any, asyncio.Future, float]]) -> None:
+        try:
+            async with self.slots.hold(len(batch)):
+                now = time.monotonic()
+                for _, _, queued_at in batch:
+                    _batch_wait.observe(now - queued_at, model=self.name)
+                _batch_size.observe(len(batch), model=self.name)
+                _in_flight.inc(len(batch), model=self.name)
+                try:
+                    outputs = await self.runnable.abatch(
+                        [value for value, _, _ in batch], config={'max_concurrency': len(batch)}, return_exceptions=True,
+                    )
+                finally:
+                    _in_flight.dec(len(batch), model=self.name)
+        except Exception as e:
+            outputs = [e] * len(batch)
+        except BaseException:
+            for _, future, _ in batch:
+                future.cancel()
+            raise
+        for (_, future, _), output in zip(batch, outputs):
+            if future.done():
+                continue
+            if isinstance(output, BaseException):
+                future.set_exception(output)
+            else:
+                future.set_result(output)
+
+
+class BatchingChatModel(BaseChatModel):
+    """
+    BatchingChatModel: Chat model that sends the concurrent calls of its callers to `inner` in
+    micro-batches (see MicroBatcher), with at most max_concurrency calls in flight. Calls with
+    different bound arguments (tools, stop words, structured-output schema) are batched separately.
+    Streaming calls cannot be batched; they go straight to `inner` but still take a slot.
+    """
+    inner: BaseChatModel
+    label: str = 'llm'
+    window: float = 0.005
+    max_batch: int = 8
+    max_concurrency: int = 16
+    _slots: Optional[_Slots] = PrivateAttr(default=None)
+    _batchers: dict = PrivateAttr(default_factory=dict)
+
+    @property
+    def _llm_type(self) -> str:
+        return f'batching-{self.inner._llm_type}'
+
+    def _get_slots(self) -> _Slots:
+        if self._slots is None:
+            self._slots = _Slots(self.max_concurrency)
+        return self._slots
+
+    def _batcher(self, key: str, runnable: Runnable) -> MicroBatcher:
+        batcher = self._batchers.get(key)
+        if batcher is None:
+            batcher = self._batchers[key] = MicroBatcher(
+                self.label, runnable, self._get_slots(), self.window, min(self.max_batch, self.max_concurrency),
+            )
+        return batcher
+
+    def _generate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        key = json.dumps([stop, kwargs], sort_keys=True, default=str)
+        runnable = self.inner.bind(stop=stop, **kwargs) if stop or kwargs else self.inner
+        message = await self._batcher(key, runnable).submit(messages)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages: list[BaseMessage], stop: Optional[list[str]] = None,
+                       run_manager: Any = None, **kwargs: Any):
+        async with self._get_slots().hold(1):
+            _in_flight.inc(model=self.label)
+            try:
+                async for chunk in self.inner._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                    yield chunk
+            finally:
+                _in_flight.dec(model=self.label)
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> Runnable:
+        # Let the provider format the tools; its bound arguments then reach _agenerate as kwargs.
+        return self.bind(**self.inner.bind_tools(tools, **kwargs).kwargs)
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> Runnable:
+        structured = self.inner.with_structured_output(schema, **kwargs)
+        batcher = self._batcher(f'structured:{schema!r}:{json.dumps(kwargs, sort_keys=True, default=str)}', structured)
+        return RunnableLambda(structured.invoke, afunc=batcher.submit, name=f'{self.label}_structured_output')
+
+
+def batch_from_env(model: BaseChatModel, label: str) -> BaseChatModel:
+    """
+    model behind a BatchingChatModel when LLM_BATCHING is set; LLM_BATCH_WINDOW_MS (default 5),
+    LLM_BATCH_MAX (default 8) and LLM_BATCH_CONCURRENCY (default 16) tune it.
+    """
+    if os.getenv('LLM_BATCHING', '0').lower() not in ('1', 'true', 'yes'):
+        return model
+    return BatchingChatModel(
+        inner=model,
+        label=label,
+        window=float(os.getenv('LLM_BATCH_WINDOW_MS', '5')) / 1000,
+        max_batch=int(os.getenv('LLM_BATCH_MAX', '8')),
+        max_concurrency=int(os.getenv('LLM_BATCH_CONCURRENCY', '16')),
+    )
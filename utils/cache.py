@@ -0,0 +1,192 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_hits = REGISTRY.counter('cache_hits_total', 'Cache lookups answered from the cache.')
+_misses = REGISTRY.counter('cache_misses_total', 'Cache lookups that had to compute the value.')
+_joins = REGISTRY.counter('cache_inflight_joins_total', 'Cache lookups that waited for an identical in-flight computation.')
+_size = REGISTRY.gauge('cache_entries', 'Entries currently held by a cache.')
+_store_hits = REGISTRY.counter('cache_store_hits_total', 'Cache lookups missed in memory but answered from the persistent store.')
+
+
+class SqliteCacheStore:
+    """
+    SqliteCacheStore: Persistent second tier for a TTLCache, so entries survive restarts and are
+    shared by every process pointing at the same file. Keys are strings, values JSON-serializable;
+    expiry uses wall-clock time. Holds at most max_entries rows (oldest written are dropped first).
+    """
+    def __init__(self, path: str, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS cache_entries ('
+            'cache TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, '
+            'expires_at REAL NOT NULL, written_at REAL NOT NULL, PRIMARY KEY (cache, key))'
+        )
+        self._writes = 0
+
+    def get(self, cache: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._db.execute(
+                'SELECT value, expires_at FROM cache_entries WHERE cache = ? AND key = ?', (cache, key),
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, cache: str, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?)',
+                (cache, key, json.dumps(value), now + ttl, now),
+            )
+            self._writes += 1
+            # Pruning scans the table, so only do it every hundred writes.
+            if self._writes % 100 == 1:
+                self._db.execute('DELETE FROM cache_entries WHERE expires_at < ?', (now,))
+                self._db.execute(
+                    'DELETE FROM cache_entries WHERE cache = ? AND key NOT IN ('
+                    'SELECT key FROM cache_entries WHERE cache = ? ORDER BY written_at DESC LIMIT ?)',
+                    (cache, cache, self.max_entries),
+                )
+
+    @classmethod
+    def from_env(cls, var: str, max_entries: int = 10000) -> Optional['SqliteCacheStore']:
+        """The store at the path in environment variable `var`, or None when it is unset."""
+        path = os.getenv(var)
+        return cls(path, max_entries) if path else None
+
+
+class TTLCache:
+    """
+    TTLCache: In-process cache whose entries expire ttl seconds after they are stored, holding
+    at most max_entries (least recently used are evicted first). get_or_compute runs one
+    computation per key at a time; concurrent callers for the same key share its result.
+    With a store, entries are also written through to it and memory misses are looked up
+    there (keys must then be strings and values JSON-serializable).
+    """
+    def __init__(self, name: str, ttl: float, max_entries: int = 1024, store: Optional[SqliteCacheStore] = None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.store = store
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[Hashable, list] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            return self._from_store(key)
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _from_store(self, key: Hashable) -> Optional[Any]:
+        if self.store is None or not self.enabled:
+            return None
+        try:
+            value = self.store.get(self.name, key)
+        except sqlite3.Error:
+            logger.exception('Reading cache %s from its store failed', self.name)
+            return None
+        if value is not None:
+            _store_hits.inc(cache=self.name)
+            self._remember(key, value)
+        return value
+
+    def lookup(self, key: Hashable) -> Optional[Any]:
+        """get, counted in the cache's hit/miss metrics."""
+        if not self.enabled:
+            return None
+        value = self.get(key)
+        (_hits if value is not None else _misses).inc(cache=self.name)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        self._remember(key, value)
+        if self.store is not None:
+            try:
+                self.store.set(self.name, key, value, self.ttl)
+            except sqlite3.Error:
+                logger.exception('Writing cache %s to its store failed', self.name)
+
+    def _remember(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        _size.set(len(self._entries), cache=self.name)
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]],
+                             should_cache: Callable[[Any], bool] = lambda value: True) -> Any:
+        if not self.enabled:
+            return await compute()
+        value = self.get(key)
+        if value is not None:
+            _hits.inc(cache=self.name)
+            return value
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            _joins.inc(cache=self.name)
+        else:
+            _misses.inc(cache=self.name)
+            future = asyncio.ensure_future(compute())
+            # [computation, number of callers waiting for it]
+            inflight = self._inflight[key] = [future, 0]
+            future.add_done_callback(lambda done: self._finish(key, done, should_cache))
+        return await self._wait(inflight)
+
+    @staticmethod
+    async def _wait(inflight: list) -> Any:
+        future = inflight[0]
+        inflight[1] += 1
+        try:
+            # shield: one waiter being cancelled must not cancel the computation for the others.
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if inflight[1] == 1 and not future.done():
+                future.cancel()
+            raise
+        finally:
+            inflight[1] -= 1
+
+    def _finish(self, key: Hashable, future: asyncio.Future, should_cache: Callable[[Any], bool]) -> None:
+        self._inflight.pop(key, None)
+        if not future.cancelled() and future.exception() is None and should_cache(future.result()):
+            self.set(key, future.result())
+
+
+def conversation_cache(name: str) -> TTLCache:
+    """
+    Per-contextId state an agent keeps for follow-up turns of a conversation: CONVERSATION_TTL
+    seconds (default 3600) and CONVERSATION_CACHE_SIZE conversations (default 1024) in memory,
+    and in the SQLite file CONVERSATION_CACHE_DB (if set) to share it between replicas.
+    """
+    return TTLCache(
+        name,
+        ttl=float(os.getenv('CONVERSATION_TTL', '3600')),
+        max_entries=int(os.getenv('CONVERSATION_CACHE_SIZE', '1024')),
+        store=SqliteCacheStore.from_env('CONVERSATION_CACHE_DB'),
+    )
@@ -0,0 +1,182 @@
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from typing import Any, Optional
+
+# Attributes every LogRecord has; anything else was passed through `extra=`.
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _forget_listener() -> None:
+    # A forked child does not inherit the listener thread; let it configure its own. Until it
+    # does, records go straight to the listener's handlers instead of a queue nobody reads.
+    global _listener
+    if _listener is not None:
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, logging.handlers.QueueHandler):
+                root.removeHandler(handler)
+        for handler in _listener.handlers:
+            root.addHandler(handler)
+    _listener = None
+
+
+os.register_at_fork(after_in_child=_forget_listener)
+
+
+class Payload:
+    """
+    Payload: Lazy, bounded log representation of a potentially large object.
+    Nothing is rendered unless a handler actually formats the record; the rendered
+    text is truncated to max_chars, or replaced by a size + sha256 digest when
+    LOG_PAYLOAD_MODE=hash.
+    """
+    __slots__ = ('obj', 'max_chars')
+
+    def __init__(self, obj: Any, max_chars: Optional[int] = None):
+        self.obj = obj
+        self.max_chars = max_chars if max_chars is not None else int(os.getenv('LOG_PAYLOAD_MAX_CHARS', '512'))
+
+    def __str__(self) -> str:
+        text = self.obj if isinstance(self.obj, str) else repr(self.obj)
+        if os.getenv('LOG_PAYLOAD_MODE', 'truncate') == 'hash':
+            return f'<{len(text)} chars sha256={_digest(text)}>'
+        if len(text) <= self.max_chars:
+            return text
+        return f'{text[:self.max_chars]}...<+{len(text) - self.max_chars} chars sha256={_digest(text)}>'
+
+    __repr__ = __str__
+
+
+def payload(obj: Any, max_chars: Optional[int] = None) -> Payload:
+    return Payload(obj, max_chars)
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8', 'replace')).hexdigest()[:16]
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a record as a single JSON line, including `extra=` fields."""
+    def __init__(self, service: str = ''):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 6),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if self.service:
+            entry['service'] = self.service
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a random fraction of records below WARNING; warnings and errors always pass."""
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    NonBlockingQueueHandler: Hands records to a background listener thread.
+    The record is queued unformatted (formatting happens on the listener thread)
+    and dropped rather than blocking the event loop when the queue is full.
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._last_drop_report = 0.0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            now = time.monotonic()
+            if now - self._last_drop_report > 10.0:
+                self._last_drop_report = now
+                try:
+                    self.queue.put_nowait(logging.makeLogRecord({
+                        'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                        'msg': 'Log queue full, %d records dropped so far', 'args': (self.dropped,),
+                    }))
+                except queue.Full:
+                    pass
+
+
+def _parse_levels(spec: str) -> dict[str, str]:
+    levels = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(service: str = '') -> None:
+    """
+    Configure process-wide logging from the environment:
+    LOG_LEVEL (root level, default INFO), LOG_LEVELS (per-module overrides,
+    e.g. "agents.tool_agent=DEBUG,httpx=WARNING"), LOG_FORMAT (json or text),
+    LOG_SAMPLE_RATE (fraction of sub-WARNING records kept) and LOG_QUEUE_SIZE.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    root = logging.getLogger()
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    for name, level in _parse_levels(os.getenv('LOG_LEVELS', '')).items():
+        logging.getLogger(name).setLevel(level)
+
+    stream_handler = logging.StreamHandler()
+    if os.getenv('LOG_FORMAT', 'json').lower() == 'json':
+        stream_handler.setFormatter(JsonFormatter(service))
+    else:
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', '10000')))
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    sample_rate = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+    if sample_rate < 1.0:
+        queue_handler.addFilter(SamplingFilter(sample_rate))
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def flush_logging() -> None:
+    """Stop the listener thread once it has written every queued record; for processes leaving via os._exit."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    for handler in logging.getLogger().handlers:
+        handler.flush()
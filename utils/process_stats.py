@@ -0,0 +1,61 @@
+import asyncio
+import gc
+import os
+import resource
+import threading
+import time
+from typing import Callable, Optional
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+_STARTED = time.time()
+
+
+def rss_bytes(pid: str = 'self') -> Optional[int]:
+    """Current resident set size of a process, from /proc (Linux); None where unavailable."""
+    try:
+        with open(f'/proc/{pid}/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def open_fds(pid: str = 'self') -> Optional[int]:
+    try:
+        return len(os.listdir(f'/proc/{pid}/fd'))
+    except OSError:
+        return None
+
+
+def process_stats(task_store=None) -> dict:
+    """Gauges for spotting leaks in a long-running agent: memory, descriptors, tasks and stored A2A tasks."""
+    stats = {
+        'pid': os.getpid(),
+        'uptime_s': round(time.time() - _STARTED, 1),
+        'rss_bytes': rss_bytes(),
+        # Peak RSS; kilobytes on Linux.
+        'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'open_fds': open_fds(),
+        'threads': threading.active_count(),
+        'gc_counts': list(gc.get_count()),
+    }
+    try:
+        stats['asyncio_tasks'] = len(asyncio.all_tasks())
+    except RuntimeError:
+        stats['asyncio_tasks'] = None
+    if task_store is not None:
+        # InMemoryTaskStore keeps every task it has seen.
+        tasks = getattr(task_store, 'tasks', None)
+        stats['task_store_tasks'] = len(tasks) if tasks is not None else None
+    return stats
+
+
+def stats_endpoint(task_store=None) -> Callable:
+    """GET /debug/stats for an agent app; task_store is the app's A2A task store."""
+    async def endpoint(request: Request) -> JSONResponse:
+        return JSONResponse(process_stats(task_store))
+    return endpoint
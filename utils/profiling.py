@@ -0,0 +1,255 @@
+import gc
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from types import FrameType
+from typing import Any, Optional
+
+from a2a.server.agent_execution import AgentExecutor, RequestContext
+from a2a.server.events import EventQueue
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_DIR = os.path.join(tempfile.gettempdir(), 'a2a_profiles')
+PROFILE_SUFFIX = '.folded'
+_GENERATOR_WRAPPERS = ('async_generator_asend', 'async_generator_athrow')
+
+_profiles = REGISTRY.counter('agent_profiles_total', 'Requests profiled, by trigger.')
+_skipped = REGISTRY.counter('agent_profiles_skipped_total', 'Profiling requests skipped because enough were already running.')
+
+
+def _label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f'{getattr(code, "co_qualname", code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def _frame_of(awaitable: Any) -> Optional[FrameType]:
+    frame = getattr(awaitable, 'cr_frame', None) or getattr(awaitable, 'gi_frame', None) or getattr(awaitable, 'ag_frame', None)
+    if frame is None and type(awaitable).__name__ in _GENERATOR_WRAPPERS:
+        # `async for` awaits an asend wrapper, which only refers to its async generator internally.
+        for referent in gc.get_referents(awaitable):
+            if getattr(referent, 'ag_frame', None) is not None:
+                return referent.ag_frame
+    return frame
+
+
+def _awaited(awaitable: Any) -> Any:
+    for attr in ('cr_await', 'gi_yieldfrom', 'ag_await'):
+        inner = getattr(awaitable, attr, None)
+        if inner is not None:
+            return inner
+    if type(awaitable).__name__ in _GENERATOR_WRAPPERS:
+        for referent in gc.get_referents(awaitable):
+            if getattr(referent, 'ag_frame', None) is not None:
+                return referent.ag_await
+    return None
+
+
+def _await_chain(coro: Any) -> list[str]:
+    """Frames of a suspended coroutine and everything it awaits, outermost first."""
+    labels = []
+    while coro is not None:
+        frame = _frame_of(coro)
+        if frame is None:
+            labels.append(f'[await {type(coro).__name__}]')
+            break
+        labels.append(_label(frame))
+        coro = _awaited(coro)
+    return labels
+
+
+class _Profile:
+    """One profiled execute(): the coroutine being sampled and the stacks seen so far."""
+
+    def __init__(self, task_id: str, trigger: str, coro: Any):
+        self.task_id = task_id
+        self.trigger = trigger
+        self.coro = coro
+        self.root = coro.cr_frame
+        self.started = time.monotonic()
+        self.stacks: Counter = Counter()
+
+    def sample(self, thread_frame: Optional[FrameType]) -> None:
+        if self.root is None:
+            return
+        # On CPU: the loop thread is currently inside this coroutine's frames.
+        running = []
+        frame = thread_frame
+        while frame is not None and frame is not self.root:
+            running.append(_label(frame))
+            frame = frame.f_back
+        if frame is self.root:
+            self.stacks[';'.join([_label(self.root)] + running[::-1])] += 1
+        else:
+            self.stacks[';'.join(['[waiting]'] + _await_chain(self.coro))] += 1
+
+
+class RequestProfiler:
+    """
+    RequestProfiler: Async-aware sampling profiler for agent requests. Every interval seconds a
+    background thread records, for each profiled request, either the stack it is running on the
+    event loop thread or the chain of coroutines it is suspended in ('[waiting]'), so concurrent
+    requests on the same loop do not pollute each other's profile. Profiles are written in the
+    collapsed-stack format (flamegraph.pl, speedscope) as <time>-<task id>.folded in `directory`.
+
+    A request is profiled when its A2A metadata has 'profile': true, or, with `enabled`, with
+    probability sample_rate; at most max_active run at once and max_files are kept.
+    """
+    def __init__(self, name: str, directory: str = DEFAULT_PROFILE_DIR, enabled: bool = False,
+                 sample_rate: float = 0.01, interval: float = 0.005, max_active: int = 4, max_files: int = 200):
+        self.name = name
+        self.directory = directory
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_active = max_active
+        self.max_files = max_files
+        self._active: dict[str, _Profile] = {}
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+        self._loop_thread_id: Optional[int] = None
+
+    @classmethod
+    def from_env(cls, name: str) -> 'RequestProfiler':
+        """
+        Configured by PROFILE_REQUESTS (1 turns sampling on), PROFILE_SAMPLE_RATE (default 0.01),
+        PROFILE_DIR (one subdirectory per agent), PROFILE_INTERVAL_MS (default 5), PROFILE_MAX_ACTIVE
+        and PROFILE_MAX_FILES.
+        """
+        return cls(
+            name,
+            directory=os.path.join(os.getenv('PROFILE_DIR', DEFAULT_PROFILE_DIR), name.lower().replace(' ', '_')),
+            enabled=os.getenv('PROFILE_REQUESTS', '0').lower() in ('1', 'true', 'yes'),
+            sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0.01')),
+            interval=float(os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000,
+            max_active=int(os.getenv('PROFILE_MAX_ACTIVE', '4')),
+            max_files=int(os.getenv('PROFILE_MAX_FILES', '200')),
+        )
+
+    def trigger(self, metadata: dict) -> Optional[str]:
+        """Why this request should be profiled ('request' or 'sampled'), or None."""
+        if metadata.get('profile') in (True, 'true', '1', 1):
+            return 'request'
+        if self.enabled and random.random() < self.sample_rate:
+            return 'sampled'
+        return None
+
+    def start(self, task_id: str, trigger: str, coro: Any) -> Optional[_Profile]:
+        with self._lock:
+            if len(self._active) >= self.max_active:
+                _skipped.inc(agent=self.name)
+                return None
+            profile = self._active[task_id] = _Profile(task_id, trigger, coro)
+            self._loop_thread_id = threading.get_ident()
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name=f'profiler-{self.name}', daemon=True)
+                self._sampler.start()
+        _profiles.inc(agent=self.name, trigger=trigger)
+        return profile
+
+    def _sample(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._sampler = None
+                    return
+                frame = sys._current_frames().get(self._loop_thread_id)
+                for profile in self._active.values():
+                    profile.sample(frame)
+
+    def finish(self, profile: _Profile) -> Optional[str]:
+        with self._lock:
+            self._active.pop(profile.task_id, None)
+        elapsed = time.monotonic() - profile.started
+        if not profile.stacks:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{int(time.time() * 1000)}-{profile.task_id}{PROFILE_SUFFIX}')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(f'{stack} {count}\n' for stack, count in profile.stacks.most_common())
+        logger.info('Profiled task %s (%s, %.3fs, %d samples): %s', profile.task_id, profile.trigger,
+                    elapsed, sum(profile.stacks.values()), path)
+        self._prune()
+        return path
+
+    def _prune(self) -> None:
+        profiles = self.recent(limit=None)
+        for entry in profiles[self.max_files:]:
+            try:
+                os.remove(os.path.join(self.directory, entry['file']))
+            except OSError:
+                pass
+
+    def recent(self, limit: Optional[int] = 50) -> list[dict]:
+        """Profiles in the directory, newest first."""
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(PROFILE_SUFFIX)]
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in sorted(names, reverse=True)[:limit]:
+            created, _, task_id = name[:-len(PROFILE_SUFFIX)].partition('-')
+            try:
+                size = os.path.getsize(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append({'file': name, 'task_id': task_id, 'created_ms': int(created), 'bytes': size})
+        return entries
+
+    async def list_endpoint(self, request: Request) -> JSONResponse:
+        limit = int(request.query_params.get('limit', '50'))
+        return JSONResponse({'agent': self.name, 'profiles': self.recent(limit)})
+
+    async def file_endpoint(self, request: Request) -> Response:
+        name = request.path_params['name']
+        if os.path.basename(name) != name or not name.endswith(PROFILE_SUFFIX):
+            return PlainTextResponse('Not found', status_code=404)
+        try:
+            with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                return PlainTextResponse(f.read())
+        except FileNotFoundError:
+            return PlainTextResponse('Not found', status_code=404)
+
+    def routes(self) -> list[Route]:
+        return [Route('/profiles', self.list_endpoint), Route('/profiles/{name}', self.file_endpoint)]
+
+
+class ProfilingExecutor(AgentExecutor):
+    """
+    ProfilingExecutor: Runs the wrapped executor under the RequestProfiler when the request
+    opts in (metadata 'profile': true) or is picked by the profiler's sample rate.
+    """
+    def __init__(self, inner: AgentExecutor, profiler: RequestProfiler):
+        self.inner = inner
+        self.profiler = profiler
+
+    async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
+        metadata = context.message.metadata if context.message and context.message.metadata else {}
+        trigger = self.profiler.trigger(metadata)
+        if trigger is None:
+            await self.inner.execute(context, event_queue)
+            return
+        task_id = context.task_id or (context.current_task.id if context.current_task else None) or uuid.uuid4().hex
+        coro = self.inner.execute(context, event_queue)
+        profile = self.profiler.start(task_id, trigger, coro)
+        try:
+            await coro
+        finally:
+            if profile is not None:
+                # Writing the (small) profile file is quick; keep it on the loop so cancellation cannot lose it.
+                self.profiler.finish(profile)
+
+    async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
+        await self.inner.cancel(context, event_queue)
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+from a2a.server.tasks import PushNotifier
+from a2a.types import PushNotificationConfig, Task, TaskState
+
+from utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATES = {TaskState.completed, TaskState.canceled, TaskState.failed, TaskState.rejected}
+# Token header defined by the A2A push notification spec.
+TOKEN_HEADER = 'X-A2A-Notification-Token'
+
+_sent = REGISTRY.counter('push_notifications_sent_total', 'Push notifications delivered.')
+_failed = REGISTRY.counter('push_notifications_failed_total', 'Push notifications given up on after retries.')
+_retried = REGISTRY.counter('push_notifications_retried_total', 'Push notification delivery attempts that were retried.')
+_coalesced = REGISTRY.counter('push_notifications_coalesced_total', 'Task updates merged into a notification already queued.')
+_dropped = REGISTRY.counter('push_notifications_dropped_total', 'Task updates dropped because the delivery queue was full.')
+_queue_depth = REGISTRY.gauge('push_queue_depth', 'Tasks waiting for a push notification to be delivered.')
+_delivery_seconds = REGISTRY.histogram('push_delivery_seconds', 'Time from a task update to its webhook accepting it.')
+
+
+class SqlitePushConfigStore:
+    """
+    SqlitePushConfigStore: Push notification configs by task id, kept in SQLite so they survive
+    restarts and are shared by the replicas of an agent on one host. Lookups (including "no config",
+    the common case) are remembered for the cache_size most recently used tasks, so status updates
+    of tasks without a webhook never touch the database. Configs older than max_age seconds are
+    dropped when the store is opened.
+    """
+    def __init__(self, path: str, cache_size: int = 10000, max_age: float = 7 * 24 * 3600):
+        self.path = path
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS push_configs (task_id TEXT PRIMARY KEY, config TEXT NOT NULL, updated_at REAL NOT NULL)'
+        )
+        self._db.execute('DELETE FROM push_configs WHERE updated_at < ?', (time.time() - max_age,))
+        self._cache: OrderedDict[str, Optional[PushNotificationConfig]] = OrderedDict()
+
+    def _execute(self, sql: str, params: tuple) -> list:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def _remember(self, task_id: str, config: Optional[PushNotificationConfig]) -> None:
+        self._cache[task_id] = config
+        self._cache.move_to_end(task_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def set(self, task_id: str, config: PushNotificationConfig) -> None:
+        self._remember(task_id, config)
+        await asyncio.to_thread(
+            self._execute, 'INSERT OR REPLACE INTO push_configs VALUES (?, ?, ?)',
+            (task_id, config.model_dump_json(exclude_none=True), time.time()),
+        )
+
+    async def get(self, task_id: str) -> Optional[PushNotificationConfig]:
+        if task_id in self._cache:
+            self._cache.move_to_end(task_id)
+            return self._cache[task_id]
+        rows = await asyncio.to_thread(self._execute, 'SELECT config FROM push_configs WHERE task_id = ?', (task_id,))
+        config = PushNotificationConfig.model_validate_json(rows[0][0]) if rows else None
+        self._remember(task_id, config)
+        return config
+
+    async def delete(self, task_id: str) -> None:
+        self._remember(task_id, None)
+        await asyncio.to_thread(self._execute, 'DELETE FROM push_configs WHERE task_id = ?', (task_id,))
+
+
+class QueuedPushNotifier(PushNotifier):
+    """
+    QueuedPushNotifier: Delivers push notifications from background workers, off the task's hot path.
+    send_notification only records the latest task state and queues the task id; updates arriving
+    while the task is still queued are coalesced, and each delivery waits up to coalesce_window
+    seconds (unless the task reached a terminal state) so a burst of updates becomes one POST of the
+    latest state. Failed deliveries (connection errors, 429 and 5xx) are retried with jittered
+    exponential backoff; a newer state queued meanwhile supersedes the retry. A task is delivered
+    by one worker at a time: updates arriving while its delivery is in flight are held back until
+    it finishes, so the webhook never sees an older state after a newer one. When max_queue tasks
+    are waiting, further updates for new tasks are dropped.
+    """
+    def __init__(self, name: str, store: SqlitePushConfigStore, workers: int = 4, max_queue: int = 1000,
+                 coalesce_window: float = 0.25, max_attempts: int = 5, backoff_base: float = 0.5,
+                 backoff_max: float = 30.0, timeout: float = 10.0):
+        self.name = name
+        self.store = store
+        self.workers = workers
+        self.max_queue = max_queue
+        self.coalesce_window = coalesce_window
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        # task id → (latest task, when it was first queued); insertion order is delivery order.
+        self._pending: dict[str, tuple[Task, float]] = {}
+        # Tasks a worker is delivering (or waiting to coalesce); their new updates are queued afterwards.
+        self._delivering: set[str] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._workers: list[asyncio.Task] = []
+
+    @classmethod
+    def from_env(cls, name: str) -> 'QueuedPushNotifier':
+        """
+        Configured by PUSH_CONFIG_DB (default: one SQLite file per agent in the temp directory),
+        PUSH_WORKERS, PUSH_QUEUE_SIZE, PUSH_COALESCE_SECONDS, PUSH_MAX_ATTEMPTS and PUSH_TIMEOUT.
+        """
+        default_db = os.path.join(tempfile.gettempdir(), f"a2a_push_{name.lower().replace(' ', '_')}.sqlite")
+        return cls(
+            name,
+            SqlitePushConfigStore(os.getenv('PUSH_CONFIG_DB', default_db)),
+            workers=int(os.getenv('PUSH_WORKERS', '4')),
+            max_queue=int(os.getenv('PUSH_QUEUE_SIZE', '1000')),
+            coalesce_window=float(os.getenv('PUSH_COALESCE_SECONDS', '0.25')),
+            max_attempts=int(os.getenv('PUSH_MAX_ATTEMPTS', '5')),
+            timeout=float(os.getenv('PUSH_TIMEOUT', '10')),
+        )
+
+    async def set_info(self, task_id: str, notification_config: PushNotificationConfig) -> None:
+        await self.store.set(task_id, notification_config)
+
+    async def get_info(self, task_id: str) -> Optional[PushNotificationConfig]:
+        return await self.store.get(task_id)
+
+    async def delete_info(self, task_id: str) -> None:
+        await self.store.delete(task_id)
+
+    async def send_notification(self, task: Task) -> None:
+        if await self.store.get(task.id) is None:
+            return
+        if task.id in self._pending:
+            self._pending[task.id] = (task, self._pending[task.id][1])
+            _coalesced.inc(agent=self.name)
+            return
+        self._start()
+        if len(self._pending) >= self.max_queue:
+            _dropped.inc(agent=self.name)
+            logger.warning('Push queue of %s is full; dropping update of task %s', self.name, task.id)
+            return
+        self._pending[task.id] = (task, time.monotonic())
+        if task.id not in self._delivering:
+            # Otherwise the worker delivering it queues it again when done.
+            self._queue.put_nowait(task.id)
+        _queue_depth.set(len(self._pending), agent=self.name)
+
+    def _start(self) -> None:
+        if self._queue is not None:
+            return
+        # Unbounded: max_queue is enforced on _pending, which also counts held-back updates.
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._work(), name=f'push-{self.name}-{i}') for i in range(self.workers)]
+
+    async def _work(self) -> None:
+        while True:
+            task_id = await self._queue.get()
+            self._delivering.add(task_id)
+            try:
+                task, queued_at = self._pending[task_id]
+                if task.status.state not in TERMINAL_STATES:
+                    await asyncio.sleep(max(0.0, queued_at + self.coalesce_window - time.monotonic()))
+                # Later updates replaced the entry while we waited; send the newest one.
+                task, queued_at = self._pending.pop(task_id)
+                _queue_depth.set(len(self._pending), agent=self.name)
+                await self._deliver(task, queued_at)
+            except Exception:
+                logger.exception('Push delivery worker of %s failed on task %s', self.name, task_id)
+            finally:
+                self._delivering.discard(task_id)
+                if task_id in self._pending:
+                    # A newer state arrived during the delivery; it goes out only now, after it.
+                    self._queue.put_nowait(task_id)
+                self._queue.task_done()
+
+    async def _deliver(self, task: Task, queued_at: float) -> None:
+        config = await self.store.get(task.id)
+        if config is None:
+            return
+        if self._client is None:
+            # Built by the first delivery rather than in _start: loading the TLS context takes ~100ms.
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 5.0)),
+                limits=httpx.Limits(max_connections=self.workers * 4, max_keepalive_connections=self.workers * 2),
+            )
+        headers = {TOKEN_HEADER: config.token} if config.token else {}
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                response = await self._client.post(
+                    config.url, json=task.model_dump(mode='json', exclude_none=True), headers=headers,
+                )
+                if response.status_code != 429 and response.status_code < 500:
+                    response.raise_for_status()
+                    _sent.inc(agent=self.name)
+                    _delivery_seconds.observe(time.monotonic() - queued_at, agent=self.name)
+                    return
+                error = f'HTTP {response.status_code}'
+            except httpx.TransportError as e:
+                error = repr(e)
+            except httpx.HTTPStatusError as e:
+                # Other 4xx: the subscriber rejected it; retrying will not help.
+                logger.warning('Push notification for task %s rejected by %s: %s', task.id, config.url, e)
+                _failed.inc(agent=self.name)
+                return
+            if attempt == self.max_attempts or task.id in self._pending:
+                break
+            _retried.inc(agent=self.name)
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+            await asyncio.sleep(delay)
+            if task.id in self._pending:
+                # A newer state is queued and will be delivered instead.
+                return
+        if task.id not in self._pending:
+            logger.warning('Giving up on push notification for task %s to %s: %s', task.id, config.url, error)
+            _failed.inc(agent=self.name)
+
+    async def aclose(self) -> None:
+        """Stop the workers; notifications still queued are not delivered."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
@@ -0,0 +1,298 @@
+import asyncio
+import atexit
+import fcntl
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Optional
+
+import httpx
+from a2a.client import A2ACardResolver, A2AClient, A2AClientHTTPError
+from a2a.types import (
+    AgentCard, CancelTaskRequest, SendMessageRequest, SendMessageResponse, SendStreamingMessageRequest,
+    SendStreamingMessageResponse, Task, TaskArtifactUpdateEvent, TaskIdParams, TaskStatusUpdateEvent,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REGISTRY_FILE = os.path.join(tempfile.gettempdir(), 'a2a_travel_registry.json')
+
+
+class ServiceRegistry:
+    """
+    ServiceRegistry: Shared, file-based registry of service instances. Every process on the host
+    reads and writes the same JSON file under an flock; an instance stays listed while it keeps
+    refreshing its entry within ttl seconds.
+    File layout: {service: {instance_id: {url, capabilities, pid, expires_at}}}.
+    """
+    def __init__(self, path: str = DEFAULT_REGISTRY_FILE, ttl: float = 15.0):
+        self.path = path
+        self.ttl = ttl
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        with open(f'{self.path}.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write(self, data: dict) -> None:
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def register(self, service: str, url: str, capabilities: Optional[dict] = None,
+                 instance_id: Optional[str] = None) -> str:
+        """Add or refresh an instance; returns its instance id."""
+        instance_id = instance_id or uuid.uuid4().hex
+        now = time.time()
+        with self._locked(exclusive=True):
+            data = self._read()
+            for instances in data.values():
+                for stale in [i for i, entry in instances.items() if entry['expires_at'] < now]:
+                    del instances[stale]
+            data.setdefault(service, {})[instance_id] = {
+                'url': url,
+                'capabilities': capabilities or {},
+                'pid': os.getpid(),
+                'expires_at': now + self.ttl,
+            }
+            self._write({name: instances for name, instances in data.items() if instances})
+        return instance_id
+
+    def deregister(self, service: str, instance_id: str) -> None:
+        with self._locked(exclusive=True):
+            data = self._read()
+            if data.get(service, {}).pop(instance_id, None) is not None:
+                self._write({name: instances for name, instances in data.items() if instances})
+
+    def instances(self, service: str) -> list[dict]:
+        """Live instances of a service."""
+        now = time.time()
+        with self._locked(exclusive=False):
+            data = self._read()
+        return [entry for entry in data.get(service, {}).values() if entry['expires_at'] >= now]
+
+    def services(self, kind: Optional[str] = None) -> list[str]:
+        """Names of services with a live instance, optionally only those whose capabilities declare `kind`."""
+        now = time.time()
+        with self._locked(exclusive=False):
+            data = self._read()
+        return sorted(
+            name for name, instances in data.items()
+            if any(entry['expires_at'] >= now and (kind is None or entry['capabilities'].get('kind') == kind)
+                   for entry in instances.values())
+        )
+
+
+class Registration:
+    """Registration: Keeps one instance listed by refreshing it every ttl/3 seconds from a daemon thread."""
+
+    def __init__(self, registry: ServiceRegistry, service: str, url: str, capabilities: Optional[dict] = None):
+        self.registry = registry
+        self.service = service
+        self.url = url
+        self.capabilities = capabilities
+        self.instance_id = uuid.uuid4().hex
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'Registration':
+        self.registry.register(self.service, self.url, self.capabilities, self.instance_id)
+        self._thread = threading.Thread(target=self._heartbeat, name=f'registry-{self.service}', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        logger.info('Registered %s at %s', self.service, self.url)
+        return self
+
+    def _heartbeat(self) -> None:
+        while not self._stopped.wait(self.registry.ttl / 3):
+            try:
+                self.registry.register(self.service, self.url, self.capabilities, self.instance_id)
+            except OSError:
+                logger.exception('Refreshing registration of %s failed', self.service)
+
+    def stop(self) -> None:
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        try:
+            self.registry.deregister(self.service, self.instance_id)
+        except OSError:
+            logger.exception('Deregistering %s failed', self.service)
+
+
+class EndpointResolver:
+    """
+    EndpointResolver: Client-side view of the registry. Endpoint lists are cached for
+    cache_ttl seconds, and each call is sent to the endpoint with the fewest requests
+    outstanding from this process (ties broken at random). An endpoint that fails with
+    a transport error is skipped for `cooldown` seconds while others are available.
+    The registry file is read in a worker thread, never on the event loop: a stale
+    list is used while it is refreshed in the background, and only the first lookup of a
+    service waits for the read.
+    """
+    def __init__(self, registry: ServiceRegistry, cache_ttl: float = 5.0, cooldown: float = 10.0):
+        self.registry = registry
+        self.cache_ttl = cache_ttl
+        self.cooldown = cooldown
+        self._cache: dict[str, tuple[float, list[str]]] = {}
+        self._refreshing: dict[str, asyncio.Task] = {}
+        self._outstanding: dict[str, int] = {}
+        self._down_until: dict[str, float] = {}
+
+    def _stale(self, service: str) -> bool:
+        cached = self._cache.get(service)
+        return cached is None or time.monotonic() - cached[0] > self.cache_ttl
+
+    def _refresh(self, service: str) -> None:
+        """Re-read service's endpoints from the registry (blocking: takes the file lock)."""
+        cached = self._cache.get(service)
+        try:
+            urls = sorted({entry['url'] for entry in self.registry.instances(service)})
+        except OSError:
+            logger.exception('Reading the service registry failed')
+            urls = cached[1] if cached else []
+        self._cache[service] = (time.monotonic(), urls)
+
+    def _start_refresh(self, service: str) -> asyncio.Task:
+        """The running background refresh of service, started if there is none."""
+        refreshing = self._refreshing.get(service)
+        if refreshing is None:
+            refreshing = self._refreshing[service] = asyncio.create_task(asyncio.to_thread(self._refresh, service))
+            refreshing.add_done_callback(lambda _: self._refreshing.pop(service, None))
+        return refreshing
+
+    def _cached(self, service: str, default: Optional[str]) -> list[str]:
+        cached = self._cache.get(service)
+        if cached and cached[1]:
+            return cached[1]
+        return [default] if default else []
+
+    def _pick(self, service: str, urls: list[str]) -> str:
+        if not urls:
+            raise LookupError(f'No endpoint registered for {service}')
+        now = time.monotonic()
+        healthy = [url for url in urls if self._down_until.get(url, 0.0) <= now] or urls
+        fewest = min(self._outstanding.get(url, 0) for url in healthy)
+        return random.choice([url for url in healthy if self._outstanding.get(url, 0) == fewest])
+
+    @asynccontextmanager
+    async def lease(self, service: str, default: Optional[str] = None) -> AsyncIterator[str]:
+        """Pick an endpoint and count the caller's request against it until the block exits."""
+        if service not in self._cache:
+            await asyncio.shield(self._start_refresh(service))
+        elif self._stale(service):
+            self._start_refresh(service)
+        url = self._pick(service, self._cached(service, default))
+        self._outstanding[url] = self._outstanding.get(url, 0) + 1
+        try:
+            yield url
+        except (httpx.TransportError, A2AClientHTTPError) as e:
+            # A2AClient reports connection failures as HTTP 503.
+            if getattr(e, 'status_code', 503) >= 500:
+                self._down_until[url] = time.monotonic() + self.cooldown
+                # Re-read the registry on the next lease; the current list stays in use meanwhile.
+                if service in self._cache:
+                    self._cache[service] = (float('-inf'), self._cache[service][1])
+            raise
+        finally:
+            self._outstanding[url] -= 1
+
+
+class BalancedA2AClient:
+    """
+    BalancedA2AClient: Sends each request to the least loaded registered replica of an agent.
+    The agent card is fetched from one replica on first use; replicas share their card.
+    """
+
+    def __init__(self, httpx_client: httpx.AsyncClient, service: str, default_url: Optional[str] = None,
+                 resolver: Optional[EndpointResolver] = None):
+        self.httpx_client = httpx_client
+        self.service = service
+        self.default_url = default_url
+        self.resolver = resolver or get_resolver()
+        self._card: Optional[AgentCard] = None
+
+    async def agent_card(self) -> AgentCard:
+        if self._card is None:
+            async with self.resolver.lease(self.service, self.default_url) as url:
+                self._card = await A2ACardResolver(self.httpx_client, url).get_agent_card()
+        return self._card
+
+    async def send_message(self, request: SendMessageRequest) -> SendMessageResponse:
+        async with self.resolver.lease(self.service, self.default_url) as url:
+            return await A2AClient(httpx_client=self.httpx_client, url=url).send_message(request)
+
+    async def send_message_streaming(
+        self, request: SendStreamingMessageRequest,
+    ) -> AsyncIterator[SendStreamingMessageResponse]:
+        """
+        The task's events as the agent sends them; the replica's lease is held until the stream ends.
+        If the caller is cancelled mid-stream, the task is cancelled on that replica too: closing
+        the stream alone leaves it running.
+        """
+        async with self.resolver.lease(self.service, self.default_url) as url:
+            client = A2AClient(httpx_client=self.httpx_client, url=url)
+            task_id, final = None, False
+            try:
+                async for response in client.send_message_streaming(request):
+                    event = getattr(response.root, 'result', None)
+                    if isinstance(event, Task):
+                        task_id = event.id
+                    elif isinstance(event, (TaskStatusUpdateEvent, TaskArtifactUpdateEvent)):
+                        task_id = event.taskId
+                        final = final or (isinstance(event, TaskStatusUpdateEvent) and event.final)
+                    yield response
+            except asyncio.CancelledError:
+                if task_id is not None and not final:
+                    await asyncio.shield(self._cancel_task(client, task_id))
+                raise
+
+    async def _cancel_task(self, client: A2AClient, task_id: str) -> None:
+        try:
+            await asyncio.wait_for(
+                client.cancel_task(CancelTaskRequest(id=str(uuid.uuid4()), params=TaskIdParams(id=task_id))),
+                timeout=5.0,
+            )
+        except Exception as e:
+            logger.warning('Could not cancel %s task %s: %s', self.service, task_id, e)
+
+
+_resolver: Optional[EndpointResolver] = None
+
+
+def get_registry() -> ServiceRegistry:
+    """The registry named by SERVICE_REGISTRY_FILE (entries expire after SERVICE_REGISTRY_TTL seconds)."""
+    return ServiceRegistry(
+        os.getenv('SERVICE_REGISTRY_FILE', DEFAULT_REGISTRY_FILE),
+        ttl=float(os.getenv('SERVICE_REGISTRY_TTL', '15')),
+    )
+
+
+def get_resolver() -> EndpointResolver:
+    global _resolver
+    if _resolver is None:
+        _resolver = EndpointResolver(get_registry(), cache_ttl=float(os.getenv('SERVICE_REGISTRY_CACHE_TTL', '5')))
+    return _resolver
+
+
+def register_service(service: str, url: str, capabilities: Optional[dict] = None) -> Registration:
+    """Register this process as an instance of service until it exits."""
+    return Registration(get_registry(), service, url, capabilities).start()
@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, Sequence
+
+from opentelemetry import context as otel_context
+from opentelemetry import propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    SpanExporter,
+    SpanExportResult,
+)
+
+# Key under which the W3C trace context travels in A2A message metadata.
+TRACE_METADATA_KEY = 'trace_context'
+
+_initialized = False
+
+
+class JsonFileSpanExporter(SpanExporter):
+    """
+    JsonFileSpanExporter: Appends finished spans to a JSON-lines file.
+    Several agent processes may share one file; each write is a single line.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = ''.join(json.dumps(json.loads(span.to_json())) + '\n' for span in spans)
+        try:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+        except OSError:
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+
+def init_tracing(service_name: str) -> None:
+    """
+    Configure the global tracer provider for this process.
+    TRACE_EXPORTER selects the exporter: 'otlp' (OTEL_EXPORTER_OTLP_ENDPOINT, default
+    http://localhost:4318), 'file' (TRACE_FILE, default traces.jsonl) or 'none'.
+    """
+    global _initialized
+    if _initialized:
+        return
+    _initialized = True
+    exporter_name = os.getenv('TRACE_EXPORTER', 'none').lower()
+    if exporter_name == 'none':
+        return
+    provider = TracerProvider(resource=Resource.create({'service.name': service_name}))
+    if exporter_name == 'otlp':
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        endpoint = os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT', 'http://localhost:4318')
+        exporter = OTLPSpanExporter(endpoint=f"{endpoint.rstrip('/')}/v1/traces")
+    elif exporter_name == 'file':
+        exporter = JsonFileSpanExporter(os.getenv('TRACE_FILE', 'traces.jsonl'))
+    else:
+        raise ValueError(f'Unknown TRACE_EXPORTER: {exporter_name}')
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+
+def get_tracer(name: str) -> trace.Tracer:
+    return trace.get_tracer(name)
+
+
+def inject_trace_context(carrier: Optional[dict] = None) -> dict:
+    """Write the current trace context (traceparent/tracestate) into carrier."""
+    carrier = {} if carrier is None else carrier
+    propagate.inject(carrier)
+    return carrier
+
+
+def trace_metadata(metadata: Optional[dict] = None) -> dict:
+    """Return A2A message metadata carrying the current trace context."""
+    metadata = dict(metadata or {})
+    carrier = inject_trace_context()
+    if carrier:
+        metadata[TRACE_METADATA_KEY] = carrier
+    return metadata
+
+
+def extract_trace_context(metadata: Optional[dict]) -> otel_context.Context:
+    """Build a parent context from A2A message metadata or HTTP headers."""
+    if not metadata:
+        return otel_context.get_current()
+    carrier = metadata.get(TRACE_METADATA_KEY, metadata)
+    return propagate.extract(carrier)
+
+
+@contextmanager
+def start_span(
+    tracer: trace.Tracer,
+    name: str,
+    parent: Optional[dict] = None,
+    attributes: Optional[dict[str, Any]] = None,
+) -> Iterator[trace.Span]:
+    """
+    Start a span as the current span. parent is an optional carrier (A2A metadata
+    or HTTP headers) to continue a trace started in another process.
+    """
+    ctx = extract_trace_context(parent) if parent is not None else None
+    with tracer.start_as_current_span(name, context=ctx, attributes=attributes) as span:
+        yield span